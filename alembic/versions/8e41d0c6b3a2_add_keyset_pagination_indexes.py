@@ -0,0 +1,36 @@
+"""Add keyset pagination indexes
+
+Revision ID: 8e41d0c6b3a2
+Revises: 5b7c2e9a1f04
+Create Date: 2026-10-18 10:03:17.524906
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "8e41d0c6b3a2"
+down_revision: Union[str, None] = "5b7c2e9a1f04"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ("ix_lodgings_created_at_id", "lodgings", ["created_at", "id"]),
+    ("ix_lodgings_price_id", "lodgings", ["price_per_night", "id"]),
+    ("ix_bookings_created_at_id", "bookings", ["created_at", "id"]),
+    ("ix_bookings_check_in_id", "bookings", ["check_in_date", "id"]),
+    ("ix_bookings_check_out_id", "bookings", ["check_out_date", "id"]),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,42 @@
+"""Add lodging daily stats
+
+Revision ID: a6c1e8f3d240
+Revises: d7f2b4a8c951
+Create Date: 2026-10-18 12:52:09.671204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from backend.occupancy import rebuild_daily_stats
+
+# revision identifiers, used by Alembic.
+revision: str = "a6c1e8f3d240"
+down_revision: Union[str, None] = "d7f2b4a8c951"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "lodging_daily_stats",
+        sa.Column("lodging_id", sa.Integer(), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("occupied", sa.Integer(), nullable=False),
+        sa.Column("revenue", sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["lodging_id"], ["lodgings.id"], ondelete="CASCADE"
+        ),
+        sa.PrimaryKeyConstraint("lodging_id", "day"),
+    )
+    # Backfill from the bookings that already exist
+    rebuild_daily_stats(Session(bind=op.get_bind()))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("lodging_daily_stats")
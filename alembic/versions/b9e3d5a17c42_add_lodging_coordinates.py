@@ -0,0 +1,52 @@
+"""Add lodging coordinates and geohash index
+
+Revision ID: b9e3d5a17c42
+Revises: f4b8d2c6a173
+Create Date: 2026-10-18 16:02:11.482905
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from backend.geo import GEO_POSTGIS, POSTGIS_DDL
+
+# revision identifiers, used by Alembic.
+revision: str = "b9e3d5a17c42"
+down_revision: Union[str, None] = "f4b8d2c6a173"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # No lodging has coordinates yet, so there is no geohash to backfill
+    op.add_column("lodgings", sa.Column("latitude", sa.Float(),
+                                        nullable=True))
+    op.add_column("lodgings", sa.Column("longitude", sa.Float(),
+                                        nullable=True))
+    op.add_column("lodgings", sa.Column("geohash", sa.String(length=12),
+                                        nullable=True))
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_lodgings_geohash", "lodgings", ["geohash"], unique=False,
+            postgresql_concurrently=True,
+        )
+    if GEO_POSTGIS and op.get_bind().dialect.name == "postgresql":
+        for statement in POSTGIS_DDL:
+            op.execute(statement)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("DROP INDEX IF EXISTS ix_lodgings_geography")
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_lodgings_geohash", table_name="lodgings",
+            postgresql_concurrently=True,
+        )
+    op.drop_column("lodgings", "geohash")
+    op.drop_column("lodgings", "longitude")
+    op.drop_column("lodgings", "latitude")
@@ -0,0 +1,45 @@
+"""Add lodging location search index
+
+Revision ID: c3a9f6d2e817
+Revises: 8e41d0c6b3a2
+Create Date: 2026-10-18 11:26:05.913377
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+from backend.search import POSTGRES_DDL, SQLITE_DDL, SQLITE_FTS_TABLE
+
+# revision identifiers, used by Alembic.
+revision: str = "c3a9f6d2e817"
+down_revision: Union[str, None] = "8e41d0c6b3a2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    dialect = op.get_bind().dialect.name
+    if dialect == "postgresql":
+        for statement in POSTGRES_DDL:
+            op.execute(statement)
+    elif dialect == "sqlite":
+        for statement in SQLITE_DDL:
+            op.execute(statement)
+        # Index the rows that existed before the triggers
+        op.execute(
+            f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}) "
+            "VALUES ('rebuild')"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    dialect = op.get_bind().dialect.name
+    if dialect == "postgresql":
+        op.execute("DROP INDEX IF EXISTS ix_lodgings_location_trgm")
+    elif dialect == "sqlite":
+        for trigger in ("ai", "ad", "au"):
+            op.execute(f"DROP TRIGGER IF EXISTS lodgings_location_{trigger}")
+        op.execute(f"DROP TABLE IF EXISTS {SQLITE_FTS_TABLE}")
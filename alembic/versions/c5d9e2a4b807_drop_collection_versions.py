@@ -0,0 +1,36 @@
+"""Drop collection versions
+
+Revision ID: c5d9e2a4b807
+Revises: a8d3f1c7e592
+Create Date: 2026-10-18 21:05:37.640218
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "c5d9e2a4b807"
+down_revision: Union[str, None] = "a8d3f1c7e592"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # List ETags come from the rows on the page now; a shared counter
+    # bumped by every write serialized all writers on one row
+    op.drop_table("collection_versions")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    versions = op.create_table(
+        "collection_versions",
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("version", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("name"),
+    )
+    op.bulk_insert(versions, [{"name": "lodgings", "version": 0},
+                              {"name": "bookings", "version": 0}])
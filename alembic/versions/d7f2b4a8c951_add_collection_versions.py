@@ -0,0 +1,33 @@
+"""Add collection versions
+
+Revision ID: d7f2b4a8c951
+Revises: c3a9f6d2e817
+Create Date: 2026-10-18 12:14:42.308115
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "d7f2b4a8c951"
+down_revision: Union[str, None] = "c3a9f6d2e817"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    versions = op.create_table(
+        "collection_versions",
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("version", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("name"),
+    )
+    op.bulk_insert(versions, [{"name": "lodgings", "version": 0}])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("collection_versions")
@@ -0,0 +1,34 @@
+"""Add bookings collection version
+
+Revision ID: e2c7a9b4f816
+Revises: b9e3d5a17c42
+Create Date: 2026-10-18 16:48:30.117624
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "e2c7a9b4f816"
+down_revision: Union[str, None] = "b9e3d5a17c42"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+versions = sa.table(
+    "collection_versions",
+    sa.column("name", sa.String()),
+    sa.column("version", sa.Integer()),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Seeded so the first booking writes don't race to insert the row
+    op.bulk_insert(versions, [{"name": "bookings", "version": 0}])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute(versions.delete().where(versions.c.name == "bookings"))
@@ -0,0 +1,52 @@
+"""Add filter and sort indexes
+
+Revision ID: f4b8d2c6a173
+Revises: a6c1e8f3d240
+Create Date: 2026-10-18 13:31:47.205318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "f4b8d2c6a173"
+down_revision: Union[str, None] = "a6c1e8f3d240"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Filter column first, then the get_lodgings / get_bookings ordering
+INDEXES = [
+    ("ix_lodgings_availability_created_at_id", "lodgings",
+     ["availability", "created_at", "id"]),
+    ("ix_lodgings_availability_price_id", "lodgings",
+     ["availability", "price_per_night", "id"]),
+    ("ix_bookings_user_created_at_id", "bookings",
+     ["user_id", "created_at", "id"]),
+    ("ix_bookings_lodging_created_at_id", "bookings",
+     ["lodging_id", "created_at", "id"]),
+    ("ix_bookings_status_created_at_id", "bookings",
+     ["status", "created_at", "id"]),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction, and
+    # keeps Postgres tables writable while the index builds
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(
+                name, table, columns, unique=False,
+                postgresql_concurrently=True,
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(
+                name, table_name=table,
+                postgresql_concurrently=True,
+            )
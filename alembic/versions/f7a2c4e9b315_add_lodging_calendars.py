@@ -0,0 +1,41 @@
+"""Add lodging calendars
+
+Revision ID: f7a2c4e9b315
+Revises: e2c7a9b4f816
+Create Date: 2026-10-18 17:20:54.806311
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from backend.booking_calendar import rebuild_calendars
+
+# revision identifiers, used by Alembic.
+revision: str = "f7a2c4e9b315"
+down_revision: Union[str, None] = "e2c7a9b4f816"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "lodging_calendars",
+        sa.Column("lodging_id", sa.Integer(), nullable=False),
+        sa.Column("year", sa.Integer(), nullable=False),
+        sa.Column("nights", sa.LargeBinary(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["lodging_id"], ["lodgings.id"], ondelete="CASCADE"
+        ),
+        sa.PrimaryKeyConstraint("lodging_id", "year"),
+    )
+    # Backfill from the bookings that already exist
+    rebuild_calendars(Session(bind=op.get_bind()))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("lodging_calendars")
@@ -0,0 +1,35 @@
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+
+from backend.auth import CurrentUser, get_current_user
+from backend.slow_queries import slow_query_log
+
+router = APIRouter(prefix="/admin", tags=["Admin"])
+
+
+@router.get("/slow-queries", response_model=List[dict])
+async def slow_queries(
+    limit: int = Query(50, ge=1, le=1000),
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    """
+    Statements slower than SLOW_QUERY_MS, newest first, with the route
+    that issued them, redacted parameters and the captured plan. Empty
+    unless the recorder is enabled. Admin only.
+    """
+    if str(current_user.role) != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    return slow_query_log.entries()[:limit]
+
+
+@router.delete("/slow-queries", status_code=status.HTTP_204_NO_CONTENT)
+async def clear_slow_queries(
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    """Empty the slow-query buffer. Admin only."""
+    if str(current_user.role) != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    slow_query_log.clear()
@@ -1,22 +1,76 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.orm import Session, selectinload
 from sqlalchemy.sql import func
-from typing import List, Optional
+from typing import Dict, List, Optional, Set, Tuple
 
-from backend.database import get_db
-from backend.models import Booking, User  # Make sure Booking model is defined
-from backend.schemas import BookingCreate, BookingResponse  # or BookingUpdate
-from backend.auth import get_current_user
+from backend.database import get_session, run_db
+from backend.models import Booking, User
+from backend.schemas import (
+    BookingBatchCreate,
+    BookingBatchError,
+    BookingBatchResponse,
+    BookingCreate,
+    BookingExpandedResponse,
+    BookingResponse,
+    BookingStatusUpdate,
+    LodgingSummary,
+    UserResponse,
+)
+from backend.auth import CurrentUser, get_current_user, get_optional_user
+from backend.availability import (
+    INACTIVE_STATUSES,
+    ensure_available,
+    find_batch_conflicts,
+    find_overlaps_within,
+    lock_lodgings,
+    to_datetime,
+    total_price,
+)
+from backend.export import MEDIA_TYPES, stream_rows
+from backend.fieldsets import dump_fields, load_only_fields, parse_fields
+from backend.pagination import NEXT_CURSOR_HEADER, paginate
+from backend.serialization import dump_rows, json_response
 
 router = APIRouter(prefix="/bookings", tags=["Bookings"])
 
+# As in lodging_router.py, the async handlers dispatch their database
+# work to the sync helpers below through run_db.
+
+
+def _create_booking(
+    db: Session, booking_data: BookingCreate, user_id: int
+) -> Booking:
+    # Lock the lodging and reject overlapping date ranges (409)
+    lodging = ensure_available(
+        db,
+        booking_data.lodging_id,
+        booking_data.start_date,
+        booking_data.end_date,
+    )
+
+    new_booking = Booking(
+        lodging_id=booking_data.lodging_id,
+        user_id=user_id,
+        start_date=to_datetime(booking_data.start_date),
+        end_date=to_datetime(booking_data.end_date),
+        total_price=total_price(
+            lodging, booking_data.start_date, booking_data.end_date
+        ),
+    )
+    db.add(new_booking)
+    db.commit()
+    db.refresh(new_booking)
+    return new_booking
+
 
 @router.post("/", response_model=BookingResponse,
              status_code=status.HTTP_201_CREATED)
-def create_booking(
+async def create_booking(
     booking_data: BookingCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_session),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     """
     Create a new booking.
@@ -26,97 +80,386 @@ def create_booking(
     if str(current_user.role) != "admin":
         raise HTTPException(status_code=403, detail="Not authorized")
 
-    # Optional: Check lodging existence or overlap logic if needed:
-    # e.g. ensure no date overlap. For example:
-    # overlap = db.query(Booking).filter(
-    #     Booking.lodging_id == booking_data.lodging_id,
-    #     Booking.end_date > booking_data.start_date,
-    #     Booking.start_date < booking_data.end_date
-    # ).first()
-    # if overlap:
-    #     raise HTTPException(status_code=409, detail="Date range
-    # not available")
-
-    new_booking = Booking(**booking_data.model_dump())
-    db.add(new_booking)
+    return await run_db(db, _create_booking, booking_data, current_user.id)
+
+
+def _create_booking_batch(
+    db: Session, batch: BookingBatchCreate, default_user_id: int
+) -> dict:
+    items = batch.bookings
+    errors: Dict[int, str] = {}
+
+    for idx, item in enumerate(items):
+        if item.end_date <= item.start_date:
+            errors[idx] = "end_date must be after start_date"
+
+    # One locking query for every lodging and one lookup for every user
+    lodgings = lock_lodgings(db, [item.lodging_id for item in items])
+    user_ids = {item.user_id for item in items if item.user_id is not None}
+    known_users = set(
+        db.execute(select(User.id).where(User.id.in_(user_ids))).scalars()
+    ) if user_ids else set()
+    for idx, item in enumerate(items):
+        if idx in errors:
+            continue
+        if item.lodging_id not in lodgings:
+            errors[idx] = "Lodging not found"
+        elif item.user_id is not None and item.user_id not in known_users:
+            errors[idx] = "User not found"
+
+    # Conflicts with existing bookings (one query), then with each other
+    def pending():
+        return [
+            (idx, item.lodging_id, item.start_date, item.end_date)
+            for idx, item in enumerate(items) if idx not in errors
+        ]
+
+    for idx in find_batch_conflicts(db, pending()):
+        errors[idx] = "Date range not available"
+    for idx in find_overlaps_within(pending()):
+        errors[idx] = "Overlaps an earlier booking in this batch"
+
+    error_list = [
+        BookingBatchError(index=idx, detail=detail)
+        for idx, detail in sorted(errors.items())
+    ]
+    if errors and batch.mode == "all_or_nothing":
+        db.rollback()
+        raise HTTPException(
+            status_code=409,
+            detail={
+                "message": "Batch rejected, no bookings were created",
+                "errors": [error.model_dump() for error in error_list],
+            },
+        )
+
+    new_bookings = [
+        Booking(
+            lodging_id=item.lodging_id,
+            user_id=item.user_id or default_user_id,
+            start_date=to_datetime(item.start_date),
+            end_date=to_datetime(item.end_date),
+            total_price=total_price(
+                lodgings[item.lodging_id], item.start_date, item.end_date
+            ),
+        )
+        for idx, item in enumerate(items) if idx not in errors
+    ]
+    db.add_all(new_bookings)
+    db.flush()
+    # Snapshot before commit expires the rows; saves a refresh per booking
+    created = [
+        BookingResponse.model_validate(booking, from_attributes=True)
+        for booking in new_bookings
+    ]
     db.commit()
-    db.refresh(new_booking)
-    return new_booking
+    return {"created": created, "errors": error_list}
+
+
+@router.post("/batch", response_model=BookingBatchResponse,
+             status_code=status.HTTP_201_CREATED)
+async def create_booking_batch(
+    batch: BookingBatchCreate,
+    db: Session = Depends(get_session),
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    """
+    Create many bookings in a single transaction, e.g. for a whole crew.
+    Conflicts are checked set-wise against existing bookings and within
+    the batch. mode=all_or_nothing rejects the batch on any error (409);
+    mode=partial creates the valid bookings and reports the rest.
+    """
+    if str(current_user.role) != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    return await run_db(db, _create_booking_batch, batch, current_user.id)
 
 
-@router.get("/", response_model=List[BookingResponse])
-def get_bookings(
-    db: Session = Depends(get_db),
+def _booking_filters(
+    user_id: Optional[int],
+    lodging_id: Optional[int],
+    status: Optional[str],
+) -> list:
+    """Filter criteria shared by the list and export endpoints"""
+    criteria = []
+    if user_id is not None:
+        criteria.append(Booking.user_id == user_id)
+    if lodging_id is not None:
+        criteria.append(Booking.lodging_id == lodging_id)
+    if status is not None:
+        criteria.append(Booking.status == status)
+    return criteria
+
+
+# ?expand= relationships and the summary schema each one embeds
+EXPANSIONS = {
+    "lodging": LodgingSummary,
+    "user": UserResponse,
+}
+
+
+def _parse_expand(expand: Optional[str]) -> Set[str]:
+    fields = {field.strip() for field in (expand or "").split(",")}
+    fields.discard("")
+    unknown = fields - EXPANSIONS.keys()
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown expand field(s): {', '.join(sorted(unknown))}",
+        )
+    return fields
+
+
+def _expand_owner(expand: Set[str],
+                  current_user: Optional[CurrentUser]) -> Optional[int]:
+    """
+    Embedded users carry emails and roles, so ``expand=user`` needs a
+    login, and non-admins only get their own bookings. Returns the user
+    id the read is limited to, if any.
+    """
+    if "user" not in expand:
+        return None
+    if current_user is None:
+        raise HTTPException(
+            status_code=401,
+            detail="expand=user requires authentication",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    if str(current_user.role) == "admin":
+        return None
+    return current_user.id
+
+
+def _load_options(expand: Set[str], fields: Optional[Tuple[str, ...]],
+                  *required: str) -> list:
+    # One IN query per relationship for the whole page, never per row
+    options = [selectinload(getattr(Booking, field))
+               for field in sorted(expand)]
+    if fields:
+        # Expanded relationships need their foreign keys loaded
+        foreign_keys = {f"{field}_id" for field in expand}
+        options.append(load_only_fields(
+            Booking, {*fields, *foreign_keys, *required}
+        ))
+    return options
+
+
+def _expanded(bookings: List[Booking], expand: Set[str],
+              fields: Optional[Tuple[str, ...]] = None) -> List[dict]:
+    """
+    Serialize inside run_db. Returning the ORM rows instead would let
+    response validation read the relationships lazily, one query per
+    booking (and not at all once an AsyncSession's run_sync is over).
+    """
+    if fields:
+        rows = dump_fields(bookings, BookingResponse, fields)
+    else:
+        rows = dump_rows(bookings, BookingResponse)
+    for field in expand:
+        related = dump_rows(
+            [getattr(booking, field) for booking in bookings],
+            EXPANSIONS[field],
+        )
+        for row, item in zip(rows, related):
+            row[field] = item
+    return rows
+
+
+def _list_bookings(
+    db: Session,
+    user_id: Optional[int],
+    lodging_id: Optional[int],
+    status: Optional[str],
+    sort_by: Optional[str],
+    order: Optional[str],
+    limit: Optional[int],
+    offset: Optional[int],
+    cursor: Optional[str],
+    expand: Set[str] = frozenset(),
+    fields: Optional[Tuple[str, ...]] = None,
+):
+    # Apply sorting and pagination
+    if sort_by not in ["created_at", "start_date", "end_date"]:
+        sort_by = "id"
+
+    # Apply filters if provided
+    query = db.query(Booking).filter(
+        *_booking_filters(user_id, lodging_id, status)
+    ).options(*_load_options(expand, fields, sort_by))
+
+    bookings, next_cursor = paginate(
+        query, Booking, sort_by, order, limit, offset, cursor
+    )
+    return _expanded(bookings, expand, fields), next_cursor
+
+
+@router.get("/", response_model=List[BookingExpandedResponse])
+async def get_bookings(
+    db: Session = Depends(get_session),
     # Example optional filters
     user_id: Optional[int] = None,
     lodging_id: Optional[int] = None,
     status: Optional[str] = None,
     sort_by: Optional[str] = "created_at",
     order: Optional[str] = "desc",
-    limit: Optional[int] = 10,
+    limit: Optional[int] = Query(10, ge=0),
     offset: Optional[int] = 0,
+    cursor: Optional[str] = None,
+    expand: Optional[str] = None,
+    fields: Optional[str] = None,
+    current_user: Optional[CurrentUser] = Depends(get_optional_user),
 ):
     """
     Retrieve bookings with optional filters, sorting, and pagination.
-    Mirrors the style from lodging_router.py.
+    Mirrors the style from lodging_router.py, including keyset paging
+    through ``cursor`` / X-Next-Cursor.
+
+    ``expand=lodging,user`` embeds lodging and user summaries, loaded
+    with one extra query per relationship for the whole page. Expanding
+    ``user`` requires a login; non-admins then see only their own
+    bookings.
+    ``fields`` narrows the booking fields, as on GET /lodgings/.
     """
-    query = db.query(Booking)
+    field_names = parse_fields(fields, BookingResponse)
+    expand_fields = _parse_expand(expand)
+    owner_id = _expand_owner(expand_fields, current_user)
+    if owner_id is not None:
+        if user_id not in (None, owner_id):
+            raise HTTPException(status_code=403, detail="Not authorized")
+        user_id = owner_id
+    bookings, next_cursor = await run_db(
+        db, _list_bookings, user_id, lodging_id, status,
+        sort_by, order, limit, offset, cursor, expand_fields,
+        field_names,
+    )
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    return json_response(bookings, headers)
 
-    # Apply filters if provided
-    if user_id is not None:
-        query = query.filter(Booking.user_id == user_id)
-    if lodging_id is not None:
-        query = query.filter(Booking.lodging_id == lodging_id)
-    if status is not None:
-        query = query.filter(Booking.status == status)
 
-    # Apply sorting
-    if sort_by in ["created_at", "start_date", "end_date"]:
-        order_by_column = getattr(Booking, sort_by)
-        if order == "desc":
-            order_by_column = order_by_column.desc()
-        query = query.order_by(order_by_column)
+# Columns of an export row; dates use the API names
+EXPORT_COLUMNS = (
+    Booking.id,
+    Booking.lodging_id,
+    Booking.user_id,
+    Booking.check_in_date.label("start_date"),
+    Booking.check_out_date.label("end_date"),
+    Booking.total_price,
+    Booking.status,
+    Booking.created_at,
+    Booking.updated_at,
+)
+# Stored as DateTime, returned by the API as dates
+EXPORT_DATE_COLUMNS = ("start_date", "end_date")
+EXPORT_SORT_COLUMNS = {
+    "created_at": Booking.created_at,
+    "start_date": Booking.check_in_date,
+    "end_date": Booking.check_out_date,
+}
+
+
+# Declared before /{booking_id} so "export" isn't parsed as an id
+@router.get("/export")
+async def export_bookings(
+    fmt: str = Query("ndjson", alias="format"),
+    user_id: Optional[int] = None,
+    lodging_id: Optional[int] = None,
+    status: Optional[str] = None,
+    sort_by: Optional[str] = "created_at",
+    order: Optional[str] = "desc",
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    """
+    Stream every booking matching the get_bookings filters as NDJSON or
+    CSV. Rows come from a server-side cursor, so exports of any size run
+    in constant memory. Admin only.
+    """
+    if str(current_user.role) != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    if fmt not in MEDIA_TYPES:
+        raise HTTPException(status_code=400,
+                            detail="format must be 'ndjson' or 'csv'")
+
+    sort_column = EXPORT_SORT_COLUMNS.get(sort_by, Booking.id)
+    if order == "desc":
+        ordering = (sort_column.desc(), Booking.id.desc())
+    else:
+        ordering = (sort_column, Booking.id)
+    statement = (
+        select(*EXPORT_COLUMNS)
+        .where(*_booking_filters(user_id, lodging_id, status))
+        .order_by(*ordering)
+    )
+
+    return StreamingResponse(
+        stream_rows(statement, fmt, EXPORT_DATE_COLUMNS),
+        media_type=MEDIA_TYPES[fmt],
+        headers={
+            "Content-Disposition": f'attachment; filename="bookings.{fmt}"'
+        },
+    )
 
-    # Pagination
-    bookings = query.offset(offset).limit(limit).all()
-    return bookings
 
+def _get_booking(db: Session, booking_id: int,
+                 expand: Set[str] = frozenset(),
+                 fields: Optional[Tuple[str, ...]] = None,
+                 owner_id: Optional[int] = None):
+    query = db.query(Booking).filter(Booking.id == booking_id)
+    if owner_id is not None:
+        # Someone else's booking reads as missing, not as forbidden
+        query = query.filter(Booking.user_id == owner_id)
+    booking = query.options(*_load_options(expand, fields)).first()
+    return _expanded([booking], expand, fields)[0] if booking else None
 
-@router.get("/{booking_id}", response_model=BookingResponse)
-def get_booking(
+
+@router.get("/{booking_id}", response_model=BookingExpandedResponse)
+async def get_booking(
     booking_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_session),
+    expand: Optional[str] = None,
+    fields: Optional[str] = None,
+    current_user: Optional[CurrentUser] = Depends(get_optional_user),
 ):
     """
     Retrieve a single booking by ID (public access in this example).
+    Accepts the same ``expand`` and ``fields`` values as the list, with
+    the same login rules for ``expand=user``.
     """
-    booking = db.query(Booking).filter(Booking.id == booking_id).first()
+    field_names = parse_fields(fields, BookingResponse)
+    expand_fields = _parse_expand(expand)
+    booking = await run_db(db, _get_booking, booking_id, expand_fields,
+                           field_names,
+                           _expand_owner(expand_fields, current_user))
     if not booking:
         raise HTTPException(status_code=404, detail="Booking not found")
 
-    return booking
+    return json_response(booking)
 
 
-@router.put("/{booking_id}")
-def update_booking(
-    booking_id: int,
-    booking_data: BookingCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
-):
+def _update_booking(
+    db: Session, booking_id: int, booking_data: BookingCreate
+) -> Booking:
     # 1. Load the existing booking
     booking = db.query(Booking).filter(Booking.id == booking_id).first()
     if not booking:
         raise HTTPException(status_code=404, detail="Booking not found")
 
-    # 2. Optional: Overlap checks or other logic
-    # overlap = db.query(Booking)...
-    # if overlap: raise HTTPException(status_code=409,
-    # detail="Date range not available")
+    # 2. Overlap checks against the other bookings of the lodging
+    lodging = ensure_available(
+        db,
+        booking_data.lodging_id,
+        booking_data.start_date,
+        booking_data.end_date,
+        exclude_booking_id=booking.id,
+    )
 
     # 3. Convert your Pydantic data to a dict
     #    exclude_unset=True ensures only changed fields are included
     update_data = booking_data.model_dump(exclude_unset=True)
+    update_data["start_date"] = to_datetime(booking_data.start_date)
+    update_data["end_date"] = to_datetime(booking_data.end_date)
+    update_data["total_price"] = total_price(
+        lodging, booking_data.start_date, booking_data.end_date
+    )
 
     # If you have an updated_at column, update it:
     update_data["updated_at"] = func.now()
@@ -132,23 +475,77 @@ def update_booking(
     return booking
 
 
-@router.delete("/{booking_id}", status_code=204)
-def delete_booking(
+@router.put("/{booking_id}", response_model=BookingResponse)
+async def update_booking(
     booking_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    booking_data: BookingCreate,
+    db: Session = Depends(get_session),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
-    """
-    Delete a booking by ID.
-    Currently requires admin role to match lodging logic.
-    """
+    return await run_db(db, _update_booking, booking_id, booking_data)
+
+
+def _update_booking_status(
+    db: Session, booking_id: int, new_status: str
+) -> Booking:
+    booking = db.query(Booking).filter(Booking.id == booking_id).first()
+    if not booking:
+        raise HTTPException(status_code=404, detail="Booking not found")
+
+    # A canceled booking only comes back if its dates are still free
+    if (booking.status in INACTIVE_STATUSES
+            and new_status not in INACTIVE_STATUSES):
+        ensure_available(
+            db,
+            booking.lodging_id,
+            booking.start_date,
+            booking.end_date,
+            exclude_booking_id=booking.id,
+        )
+
+    booking.status = new_status
+    booking.updated_at = func.now()
+    db.commit()
+    db.refresh(booking)
+    return booking
+
+
+@router.patch("/{booking_id}/status", response_model=BookingResponse)
+async def update_booking_status(
+    booking_id: int,
+    status_data: BookingStatusUpdate,
+    db: Session = Depends(get_session),
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    """Confirm, cancel or reinstate a booking. Admin only."""
     if str(current_user.role) != "admin":
         raise HTTPException(status_code=403, detail="Not authorized")
 
+    return await run_db(db, _update_booking_status, booking_id,
+                        status_data.status)
+
+
+def _delete_booking(db: Session, booking_id: int):
     booking = db.query(Booking).filter(Booking.id == booking_id).first()
     if not booking:
         raise HTTPException(status_code=404, detail="Booking not found")
 
     db.delete(booking)
     db.commit()
+
+
+@router.delete("/{booking_id}", status_code=204)
+async def delete_booking(
+    booking_id: int,
+    db: Session = Depends(get_session),
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    """
+    Delete a booking by ID.
+    Currently requires admin role to match lodging logic.
+    """
+    if str(current_user.role) != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    await run_db(db, _delete_booking, booking_id)
     return {"message": "Booking deleted successfully"}
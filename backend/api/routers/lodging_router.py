@@ -1,117 +1,474 @@
-from fastapi import APIRouter, Depends, HTTPException
+from datetime import date, datetime
+from fastapi import (
+    APIRouter, Depends, Header, HTTPException, Query, Request, Response
+)
 from sqlalchemy.orm import Session
-from sqlalchemy.sql import func
-from backend.database import get_db
-from backend.models import Lodging, User
-from backend.schemas import LodgingResponse, LodgingCreate, LodgingUpdate
-from typing import List, Optional
-from backend.auth import get_current_user
+from backend.database import get_session, run_db
+from backend.models import Lodging
+from backend.schemas import (
+    LodgingCalendarResponse, LodgingResponse, LodgingCreate,
+    LodgingSearchResponse, LodgingUpdate,
+)
+from typing import List, Literal, Optional, Tuple, Union
+from backend.auth import CurrentUser, get_current_user
+from backend.availability import free_between
+from backend.booking_calendar import lodging_calendar
+from backend.bulk_import import (
+    DEFAULT_CHUNK_SIZE, MAX_CHUNK_SIZE, import_lodgings
+)
+from backend.facets import (
+    compute_facets, facet_cache, invalidate_facets, parse_facets
+)
+from backend.etag import etag_matches, make_etag
+from backend.fieldsets import dump_fields, load_only_fields, parse_fields
+from backend.geo import distance_km, nearest, within_radius
+from backend.pagination import NEXT_CURSOR_HEADER, paginate
+from backend.search import location_search
+from backend.serialization import dump_rows, json_response
 from fastapi import status
 
 router = APIRouter(prefix="/lodgings", tags=["Lodgings"])
 
 
+# Handlers are async; their database work lives in the sync helpers
+# below and is dispatched with run_db (run_sync or the threadpool).
+
+
+def _create_lodging(db: Session, lodging: LodgingCreate) -> Lodging:
+    new_lodging = Lodging(**lodging.model_dump())
+    db.add(new_lodging)
+    db.commit()
+    invalidate_facets()
+    db.refresh(new_lodging)
+    return new_lodging
+
+
 @router.post("/", response_model=LodgingResponse,
              status_code=status.HTTP_201_CREATED)
-def create_lodging(
+async def create_lodging(
     lodging: LodgingCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),  # Require authentication
+    db: Session = Depends(get_session),
+    # Require authentication
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     # Ensure only admins can create lodgings
     if str(current_user.role) != "admin":
         raise HTTPException(status_code=403, detail="Not authorized")
 
-    new_lodging = Lodging(**lodging.model_dump())
-    db.add(new_lodging)
-    db.commit()
-    db.refresh(new_lodging)
-    return new_lodging
+    return await run_db(db, _create_lodging, lodging)
 
 
-@router.get("/", response_model=List[LodgingResponse])
-def get_lodgings(
-    db: Session = Depends(get_db),
-    location: Optional[str] = None,
-    min_price: Optional[float] = None,
-    max_price: Optional[float] = None,
-    availability: Optional[bool] = None,
-    sort_by: Optional[str] = "created_at",
-    order: Optional[str] = "desc",
-    limit: Optional[int] = 10,
-    offset: Optional[int] = 0
+@router.post("/import")
+async def bulk_import_lodgings(
+    request: Request,
+    fmt: Optional[str] = Query(None, alias="format"),
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    db: Session = Depends(get_session),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     """
-    Retrieve lodgings with optional filters, sorting, and pagination.
+    Bulk-create lodgings from an NDJSON or CSV (header row first) body.
+    The body is streamed and inserted in chunks; rows that fail validation
+    are skipped and listed in the per-row error report.
     """
-    query = db.query(Lodging)
+    if str(current_user.role) != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    if fmt is None:
+        content_type = request.headers.get("content-type", "")
+        fmt = "csv" if "csv" in content_type else "ndjson"
+    if fmt not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400,
+                            detail="format must be 'ndjson' or 'csv'")
+
+    chunk_size = max(1, min(chunk_size, MAX_CHUNK_SIZE))
+    return await import_lodgings(db, request.stream(), fmt, chunk_size)
 
-    # Apply filters
+
+def _filter_lodgings(
+    db: Session,
+    location: Optional[str],
+    min_price: Optional[float],
+    max_price: Optional[float],
+    availability: Optional[bool],
+    near: Optional[Tuple[float, float]] = None,
+    radius_km: Optional[float] = None,
+    stay: Optional[Tuple[date, date]] = None,
+):
+    """The filtered, unordered lodging query and the relevance score"""
+    query = db.query(Lodging)
+    relevance = None
     if location:
-        query = query.filter(Lodging.location.ilike(f"%{location}%"))
+        location_filter, relevance = location_search(db, location)
+        query = query.filter(location_filter)
     if min_price is not None:
         query = query.filter(Lodging.price_per_night >= min_price)
     if max_price is not None:
         query = query.filter(Lodging.price_per_night <= max_price)
     if availability is not None:
         query = query.filter(Lodging.availability == availability)
+    if stay is not None:
+        query = query.filter(free_between(*stay))
+    if near is not None and radius_km is not None:
+        query = query.filter(within_radius(db, *near, radius_km))
+    return query, relevance
+
+
+def _list_lodgings(
+    db: Session,
+    location: Optional[str],
+    min_price: Optional[float],
+    max_price: Optional[float],
+    availability: Optional[bool],
+    sort_by: Optional[str],
+    order: Optional[str],
+    limit: Optional[int],
+    offset: Optional[int],
+    cursor: Optional[str],
+    fields: Optional[Tuple[str, ...]] = None,
+    near: Optional[Tuple[float, float]] = None,
+    radius_km: Optional[float] = None,
+    stay: Optional[Tuple[date, date]] = None,
+    if_none_match: Optional[str] = None,
+    etag_parts: tuple = (),
+):
+    """
+    The serialized page, its next cursor and its ETag; the page is None
+    when ``if_none_match`` already matches that ETag.
+    """
+    query, relevance = _filter_lodgings(
+        db, location, min_price, max_price, availability, near, radius_km,
+        stay,
+    )
+    keyset = True
+
+    if relevance is not None and sort_by == "relevance":
+        query = query.order_by(relevance.desc())
+        keyset = False
+
+    # Distance ordering, after the filters so nearest-k honours them
+    if near is not None:
+        if radius_km is None:
+            query = nearest(db, query, *near, (offset or 0) + limit)
+        elif sort_by == "distance":
+            query = query.order_by(distance_km(db, *near))
+        if sort_by == "distance":
+            keyset = False
+
+    # Apply sorting and pagination
+    if sort_by not in ["price_per_night", "created_at"]:
+        sort_by = "id"
+    if fields:
+        # The sort column feeds the next cursor and updated_at the ETag,
+        # so they're loaded too
+        query = query.options(
+            load_only_fields(Lodging, {*fields, sort_by, "updated_at"})
+        )
+    lodgings, next_cursor = paginate(
+        query, Lodging, sort_by, order, limit, offset, cursor, keyset
+    )
+    etag = _page_etag(lodgings, *etag_parts)
+    if etag_matches(if_none_match, etag):
+        return None, next_cursor, etag
+    # Serialized within the same run_db call: in the threadpool with a
+    # sync session, but on the event loop (run_sync) in DATABASE_ASYNC
+    # mode
+    if fields:
+        content = dump_fields(lodgings, LodgingResponse, fields)
+    else:
+        content = dump_rows(lodgings, LodgingResponse)
+    return content, next_cursor, etag
+
+
+def _page_etag(lodgings: List[Lodging], *parts) -> str:
+    # Rows only change along with their updated_at, so ids and
+    # timestamps pin down the page without a collection-wide counter
+    return make_etag(
+        "lodgings", *parts,
+        *((lodging.id, lodging.updated_at) for lodging in lodgings),
+    )
+
+
+def _lodging_facets(
+    db: Session,
+    filters: tuple,
+    names: Tuple[str, ...],
+    approximate: bool,
+) -> dict:
+    query, _ = _filter_lodgings(db, *filters)
+    return compute_facets(db, query, names, approximate)
+
+
+def _parse_near(
+    near_lat: Optional[float],
+    near_lon: Optional[float],
+    radius_km: Optional[float],
+    sort_by: Optional[str],
+) -> Optional[Tuple[float, float]]:
+    if (near_lat is None) != (near_lon is None):
+        raise HTTPException(
+            status_code=400,
+            detail="near_lat and near_lon must be given together",
+        )
+    if near_lat is None:
+        if radius_km is not None or sort_by == "distance":
+            raise HTTPException(
+                status_code=400,
+                detail="radius_km and sort_by=distance need near_lat "
+                       "and near_lon",
+            )
+        return None
+    if radius_km is None and sort_by not in (None, "distance"):
+        raise HTTPException(
+            status_code=400,
+            detail="A nearest search is sorted by distance; pass "
+                   "radius_km to sort by something else",
+        )
+    return near_lat, near_lon
+
+
+def _parse_stay(
+    check_in: Optional[date], check_out: Optional[date]
+) -> Optional[Tuple[date, date]]:
+    if (check_in is None) != (check_out is None):
+        raise HTTPException(
+            status_code=400,
+            detail="check_in and check_out must be given together",
+        )
+    if check_in is None:
+        return None
+    if check_out <= check_in:
+        raise HTTPException(
+            status_code=400, detail="check_out must be after check_in"
+        )
+    return check_in, check_out
+
+
+@router.get(
+    "/", response_model=Union[List[LodgingResponse], LodgingSearchResponse]
+)
+async def get_lodgings(
+    request: Request,
+    db: Session = Depends(get_session),
+    location: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    availability: Optional[bool] = None,
+    near_lat: Optional[float] = Query(None, ge=-90, le=90),
+    near_lon: Optional[float] = Query(None, ge=-180, le=180),
+    radius_km: Optional[float] = Query(None, gt=0),
+    check_in: Optional[date] = None,
+    check_out: Optional[date] = None,
+    sort_by: Optional[str] = None,
+    order: Optional[str] = "desc",
+    limit: Optional[int] = Query(10, ge=0),
+    offset: Optional[int] = 0,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    facets: Optional[str] = None,
+    count: Literal["exact", "approximate"] = "exact",
+    if_none_match: Optional[str] = Header(None),
+):
+    """
+    Retrieve lodgings with optional filters, sorting, and pagination.
+    Pass the X-Next-Cursor header of a page as ``cursor`` to fetch the
+    next one with a keyset seek instead of an offset.
 
-    # Apply sorting
-    if sort_by in ["price_per_night", "created_at"]:
-        order_by_column = getattr(Lodging, sort_by)
-        if order == "desc":
-            order_by_column = order_by_column.desc()
-        query = query.order_by(order_by_column)
+    ``location`` is an indexed, typo-tolerant search; combine it with
+    ``sort_by=relevance`` to get the closest matches first.
 
-    # Apply pagination
-    lodgings = query.offset(offset).limit(limit).all()
-    return lodgings
+    Responses carry an ETag built from the ids and ``updated_at`` of the
+    page's rows (and the facets); send it back in If-None-Match to get a
+    304 while they're unchanged. The query still runs, but the page is
+    neither serialized nor sent.
+
+    ``fields=id,name,...`` returns only those LodgingResponse fields and
+    SELECTs only their columns.
+
+    ``near_lat``/``near_lon`` with ``radius_km`` keep the lodgings within
+    that many km of the point; without ``radius_km`` they return the
+    ``limit`` nearest ones. Both are sorted by distance unless another
+    ``sort_by`` is given (radius searches only), combine with the other
+    filters, and skip lodgings without coordinates.
+
+    ``check_in``/``check_out`` keep only the lodgings with no active
+    booking overlapping those nights, checked for the whole page in the
+    same query.
+
+    ``facets=location,price,availability`` wraps the page in an object
+    with the total number of matches and their counts per location,
+    price bucket and availability, all from one grouped query. They are
+    cached per worker (see backend/facets.py), except with check_in and
+    check_out, whose facets move with every booking.
+    ``count=approximate`` caps the work on large result sets; the total
+    is then an estimate (``total_is_estimate``).
+    """
+    field_names = parse_fields(fields, LodgingResponse)
+    near = _parse_near(near_lat, near_lon, radius_km, sort_by)
+    stay = _parse_stay(check_in, check_out)
+    facet_names = parse_facets(facets)
+    if facet_names and near and radius_km is None:
+        raise HTTPException(
+            status_code=400,
+            detail="facets need radius_km with near_lat and near_lon",
+        )
+    if sort_by is None:
+        sort_by = "distance" if near else "created_at"
+
+    aggregations = None
+    if facet_names:
+        filters = (location, min_price, max_price, availability, near,
+                   radius_km, stay)
+        key = (filters, facet_names, count)
+        if stay is None:
+            aggregations = facet_cache.get(key)
+        if aggregations is None:
+            aggregations = await run_db(db, _lodging_facets, filters,
+                                        facet_names, count == "approximate")
+            if stay is None:
+                facet_cache.set(key, aggregations)
+
+    lodgings, next_cursor, etag = await run_db(
+        db, _list_lodgings, location, min_price, max_price, availability,
+        sort_by, order, limit, offset, cursor, field_names, near, radius_km,
+        stay, if_none_match, (request.url.query, aggregations),
+    )
+    headers = {"ETag": etag}
+    if lodgings is None:
+        return Response(status_code=304, headers=headers)
+    if next_cursor:
+        headers[NEXT_CURSOR_HEADER] = next_cursor
+    if not facet_names:
+        return json_response(lodgings, headers)
+    return json_response({"results": lodgings, **aggregations}, headers)
+
+
+def _lodging_etag(lodging_id: int, updated_at: datetime,
+                  fields: Optional[Tuple[str, ...]] = None) -> str:
+    # Each fieldset is its own representation, with its own ETag
+    return make_etag("lodging", lodging_id, updated_at.isoformat(), fields)
+
+
+def _get_lodging_version(db: Session, lodging_id: int) -> Optional[datetime]:
+    # Only the timestamp: a revalidation never loads the full row
+    row = db.query(Lodging.updated_at).filter(Lodging.id == lodging_id).first()
+    return row.updated_at if row else None
+
+
+def _get_lodging(
+    db: Session, lodging_id: int, fields: Optional[Tuple[str, ...]] = None
+) -> Optional[Lodging]:
+    query = db.query(Lodging).filter(Lodging.id == lodging_id)
+    if fields:
+        query = query.options(
+            load_only_fields(Lodging, {*fields, "updated_at"})
+        )
+    return query.first()
 
 
 @router.get("/{lodging_id}", response_model=LodgingResponse)
-def get_lodging(
+async def get_lodging(
     lodging_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_session),
+    fields: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
 ):
     """
     Retrieve a single lodging by ID (public access).
+    Supports conditional GET through ETag / If-None-Match, and the same
+    ``fields`` selection as the list endpoint.
     """
-    lodging = db.query(Lodging).filter(Lodging.id == lodging_id).first()
+    field_names = parse_fields(fields, LodgingResponse)
+    if if_none_match:
+        updated_at = await run_db(db, _get_lodging_version, lodging_id)
+        if updated_at is None:
+            raise HTTPException(status_code=404, detail="Lodging not found")
+        etag = _lodging_etag(lodging_id, updated_at, field_names)
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+
+    lodging = await run_db(db, _get_lodging, lodging_id, field_names)
+
+    if not lodging:
+        raise HTTPException(status_code=404, detail="Lodging not found")
+
+    etag = _lodging_etag(lodging.id, lodging.updated_at, field_names)
+    if field_names:
+        content = dump_fields([lodging], LodgingResponse, field_names)
+    else:
+        content = dump_rows([lodging], LodgingResponse)
+    return json_response(content[0], {"ETag": etag})
 
+
+@router.get("/{lodging_id}/calendar", response_model=LodgingCalendarResponse)
+async def get_lodging_calendar(
+    lodging_id: int,
+    year: int = Query(..., ge=1, le=9998),
+    month: Optional[int] = Query(None, ge=1, le=12),
+    db: Session = Depends(get_session),
+):
+    """
+    Booked and free nights of a lodging for ``year``, or one ``month`` of
+    it, as a night-by-night string and booked ranges (public access).
+    Served from the lodging's calendar bitmap, not from bookings.
+    """
+    return await run_db(db, lodging_calendar, lodging_id, year, month)
+
+
+def _update_lodging(
+    db: Session, lodging_id: int, lodging_data: LodgingUpdate
+) -> dict:
+    lodging = db.query(Lodging).filter(Lodging.id == lodging_id).first()
     if not lodging:
         raise HTTPException(status_code=404, detail="Lodging not found")
 
-    return lodging
+    # Update the row already loaded instead of a bulk UPDATE plus a
+    # second SELECT to read it back
+    for key, value in lodging_data.model_dump(exclude_unset=True).items():
+        setattr(lodging, key, value)
+    # updated_at comes from the column's onupdate, the database's now()
+    # like on insert
+    db.flush()
+
+    # Snapshot before commit expires the row; saves a refresh
+    updated = dump_rows([lodging], LodgingResponse)[0]
+    db.commit()
+    invalidate_facets()
+    return updated
 
 
 @router.put("/{lodging_id}", response_model=LodgingResponse)
-def update_lodging(
+async def update_lodging(
     lodging_id: int,
     lodging_data: LodgingUpdate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),  # Require authentication
+    db: Session = Depends(get_session),
+    # Require authentication
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     """Allow only admins to update a lodging"""
     if str(current_user.role) != "admin":
         raise HTTPException(status_code=403, detail="Not authorized")
 
+    return await run_db(db, _update_lodging, lodging_id, lodging_data)
+
+
+def _delete_lodging(db: Session, lodging_id: int):
     lodging = db.query(Lodging).filter(Lodging.id == lodging_id).first()
+
     if not lodging:
         raise HTTPException(status_code=404, detail="Lodging not found")
 
-    db.query(Lodging).filter(Lodging.id == lodging_id).update(
-        {**lodging_data.dict(exclude_unset=True), "updated_at": func.now()}
-    )
+    db.delete(lodging)
     db.commit()
-
-    return db.query(Lodging).filter(Lodging.id == lodging_id).first()
+    invalidate_facets()
 
 
 @router.delete("/{lodging_id}", status_code=204)
-def delete_lodging(
+async def delete_lodging(
     lodging_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)  # Ensure authentication
+    db: Session = Depends(get_session),
+    # Ensure authentication
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """Allow only admins to delete a lodging"""
 
@@ -122,12 +479,6 @@ def delete_lodging(
     if str(current_user.role) != "admin":
         raise HTTPException(status_code=403, detail="Not authorized")
 
-    lodging = db.query(Lodging).filter(Lodging.id == lodging_id).first()
-
-    if not lodging:
-        raise HTTPException(status_code=404, detail="Lodging not found")
-
-    db.delete(lodging)
-    db.commit()
+    await run_db(db, _delete_lodging, lodging_id)
 
     return {"message": "Lodging deleted successfully"}
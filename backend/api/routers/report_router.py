@@ -0,0 +1,52 @@
+from datetime import date
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+
+from backend.auth import CurrentUser, get_current_user
+from backend.database import get_session, run_db
+from backend.occupancy import occupancy_report
+from backend.schemas import OccupancyReport
+
+router = APIRouter(prefix="/reports", tags=["Reports"])
+
+# Reports read lodging_daily_stats, which backend/occupancy.py keeps up to
+# date on every booking write; nothing here scans bookings.
+
+
+@router.get("/lodgings/{lodging_id}", response_model=OccupancyReport)
+async def lodging_occupancy(
+    lodging_id: int,
+    start_date: date,
+    end_date: date,
+    db: Session = Depends(get_session),
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    """
+    Occupancy and revenue of one lodging for the nights from start_date
+    up to (not including) end_date, with a per-day breakdown. Admin only.
+    """
+    if str(current_user.role) != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    return await run_db(db, occupancy_report, start_date, end_date,
+                        lodging_id=lodging_id)
+
+
+@router.get("/locations", response_model=OccupancyReport)
+async def location_occupancy(
+    location: str,
+    start_date: date,
+    end_date: date,
+    db: Session = Depends(get_session),
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    """
+    Occupancy and revenue summed over every lodging at ``location``
+    (exact match) for the same date range semantics. Admin only.
+    """
+    if str(current_user.role) != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    return await run_db(db, occupancy_report, start_date, end_date,
+                        location=location)
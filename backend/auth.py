@@ -1,26 +1,124 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
+from sqlalchemy import event, inspect
 from sqlalchemy.orm import Session
-from backend.database import get_db
+from backend.cache import TTLCache
+import backend.settings  # noqa: F401 (reads .env before os.getenv below)
+from backend.database import get_session, run_db
 from backend.models import User
 from jose import JWTError, jwt
 import os
-from dotenv import load_dotenv
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
 from fastapi.security import OAuth2PasswordBearer
-from typing import Optional
+from typing import Iterable, Optional
 
-load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY", "supersecretkey")
 ALGORITHM = "HS256"
 
+# Decoded tokens and user records are cached per process; a role change
+# or deletion reaches other workers after at most USER_CACHE_TTL_SECONDS.
+# User records are keyed by (uid, sub): ids can be reused once a user is
+# deleted, so a token only resolves to a user whose email it names.
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+
+# bcrypt cost factor; hashes made with any other cost are upgraded (or
+# downgraded) transparently on the next successful login.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+# Password hashing runs on its own pool so a login storm can't starve the
+# threadpool that serves every other sync endpoint. Requests beyond
+# workers + queue limit are turned away with 503 instead of piling up.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", "64"))
+PASSWORD_HASH_RETRY_AFTER = os.getenv("PASSWORD_HASH_RETRY_AFTER", "1")
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
+# Same, for public routes that only use the user when there is one
+optional_oauth2_scheme = OAuth2PasswordBearer(
+    tokenUrl="auth/login", auto_error=False
+)
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_desired_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_desired_rounds=BCRYPT_ROUNDS,
+)
+
+password_executor = ThreadPoolExecutor(
+    max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash"
+)
+_password_slots = threading.BoundedSemaphore(
+    PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE_LIMIT
+)
+
+token_cache = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL_SECONDS)
+user_cache = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL_SECONDS)
+
+
+@dataclass(frozen=True)
+class CurrentUser:
+    """Snapshot of the authenticated user, safe to share across requests"""
+    id: int
+    email: str
+    role: str
+
+
+def create_access_token(
+    data: dict, expires_delta: Optional[timedelta] = None
+):
+    to_encode = data.copy()
+    expire = datetime.now(timezone.utc) + (
+        expires_delta or timedelta(minutes=15)
+    )
+    to_encode.update({"exp": expire})
+    return jwt.encode(
+        to_encode,
+        SECRET_KEY,
+        algorithm=ALGORITHM
+    )
+
+
+def token_claims(user: User) -> dict:
+    """Claims that let requests resolve the user without a lookup"""
+    return {"sub": user.email, "uid": user.id, "role": str(user.role)}
+
+
+def decode_token(token: str) -> dict:
+    """Verified claims of ``token``; raises JWTError if it isn't valid"""
+    claims = token_cache.get(token)
+    if claims is None:
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        # Never serve a token from cache past its own expiry
+        remaining = claims.get("exp", 0) - time.time()
+        token_cache.set(token, claims, ttl=remaining)
+    return claims
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+def _load_user(db: Session, claims: dict) -> Optional[CurrentUser]:
+    user_id = claims.get("uid")
+    if user_id is not None:
+        user = db.query(User).filter(User.id == user_id).first()
+    else:
+        # Tokens issued before ids were part of the claims
+        user = db.query(User).filter(User.email == claims["sub"]).first()
 
-def get_current_user(
-    token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
-) -> User:
+    if user is None or user.email != claims["sub"]:
+        # Gone, or the id now belongs to someone else
+        return None
+    return CurrentUser(id=user.id, email=user.email, role=str(user.role))
+
+
+async def get_current_user(
+    token: str = Depends(oauth2_scheme), db: Session = Depends(get_session)
+) -> CurrentUser:
     """Retrieve the current user from the JWT token"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -29,50 +127,75 @@ def get_current_user(
     )
 
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: Optional[str] = payload.get("sub")
-        if email is None:
-            raise credentials_exception
+        claims = decode_token(token)
+    except JWTError:
+        raise credentials_exception
+
+    if claims.get("sub") is None:
+        raise credentials_exception
 
-        user = db.query(User).filter(User.email == email).first()
+    cache_key = (claims.get("uid"), claims["sub"])
+    user = user_cache.get(cache_key)
+    if user is None:
+        user = await run_db(db, _load_user, claims)
         if user is None:
             raise credentials_exception
+        user_cache.set(cache_key, user)
 
-        return user
+    return user
 
-    except JWTError:
-        raise credentials_exception
+
+async def get_optional_user(
+    token: Optional[str] = Depends(optional_oauth2_scheme),
+    db: Session = Depends(get_session),
+) -> Optional[CurrentUser]:
+    """get_current_user for public routes: None without a token"""
+    if token is None:
+        return None
+    return await get_current_user(token, db)
 
 
 def get_current_user_role(required_role: str):
-    def role_checker(
-        token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
-    ):
-        credentials_exception = HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-        try:
-            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-            email: Optional[str] = payload.get("sub")
+    async def role_checker(
+        current_user: CurrentUser = Depends(get_current_user),
+    ) -> CurrentUser:
+        if current_user.role != required_role:
+            raise HTTPException(status_code=403,
+                                detail="Not enough permissions")
+        return current_user
+
+    return role_checker
 
-            if email is None:
-                raise credentials_exception
 
-            user = db.query(User).filter(User.email == email).first()
-            if user is None:
-                raise credentials_exception
+def invalidate_user(user_id: Optional[int] = None,
+                    emails: Iterable[str] = ()):
+    """Drop cached records for one user (under each of ``emails``), or
+    for everyone"""
+    if user_id is None:
+        user_cache.clear()
+        return
+    for email in emails:
+        user_cache.pop((user_id, email))
+        # Tokens issued before ids were part of the claims
+        user_cache.pop((None, email))
 
-            if str(user.role) != required_role:
-                raise HTTPException(status_code=403,
-                                    detail="Not enough permissions")
 
-            return user
-        except JWTError:
-            raise credentials_exception
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _user_changed(mapper, connection, target):
+    # The old email too, if this update changed it
+    history = inspect(target).attrs.email.history
+    invalidate_user(target.id, {email for email in history.sum() if email})
 
-    return role_checker
+
+@event.listens_for(Session, "do_orm_execute")
+def _users_bulk_changed(orm_execute_state):
+    # Bulk UPDATE/DELETE statements don't say which rows they touch
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.class_ is User:
+        invalidate_user()
 
 
 def hash_password(password: str):
@@ -81,3 +204,31 @@ def hash_password(password: str):
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
+
+
+async def _run_password_job(func, *args):
+    if not _password_slots.acquire(blocking=False):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many concurrent logins, try again shortly",
+            headers={"Retry-After": PASSWORD_HASH_RETRY_AFTER},
+        )
+    future = password_executor.submit(func, *args)
+    future.add_done_callback(lambda _: _password_slots.release())
+    return await asyncio.wrap_future(future)
+
+
+async def hash_password_async(password: str) -> str:
+    """hash_password on the dedicated password pool"""
+    return await _run_password_job(pwd_context.hash, password)
+
+
+async def verify_password_async(plain_password, hashed_password):
+    """
+    Verify on the dedicated password pool.
+    Returns (valid, new_hash); new_hash is set when the stored hash uses
+    an outdated scheme or cost factor and should be replaced.
+    """
+    return await _run_password_job(
+        pwd_context.verify_and_update, plain_password, hashed_password
+    )
@@ -1,107 +1,75 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
-from backend.database import SessionLocal
+from backend.database import get_session, run_db
 from backend.schemas import UserCreate, UserResponse, Token, TokenData
 from backend.models import User
-from backend.auth import hash_password, verify_password
-from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from datetime import datetime, timedelta, timezone
-from jose import JWTError, jwt
-import os
-from dotenv import load_dotenv
-from backend.auth import get_current_user_role
-from typing import Optional
+from backend.auth import hash_password_async, verify_password_async
+from fastapi.security import OAuth2PasswordRequestForm
+from datetime import timedelta
+from backend.auth import (
+    CurrentUser,
+    create_access_token,
+    get_current_user,
+    get_current_user_role,
+    oauth2_scheme,
+    token_claims,
+)
 
-
-load_dotenv()
-
-SECRET_KEY = os.getenv("SECRET_KEY", "supersecretkey")
-ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
-
-
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
-def create_access_token(
-    data: dict, expires_delta: Optional[timedelta] = None
-):
-    to_encode = data.copy()
-    expire = datetime.now(timezone.utc) + (
-        expires_delta or timedelta(minutes=15)
-    )
-    to_encode.update({"exp": expire})
-    return jwt.encode(
-        to_encode,
-        SECRET_KEY,
-        algorithm=ALGORITHM
-    )
-
-
-def get_current_user(
-    token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
-):
-    credentials_exception = HTTPException(
-        status_code=401,
-        detail="Invalid token",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: Optional[str] = payload.get("sub")
-        if email is None:
-            raise credentials_exception
 
-        user = db.query(User).filter(User.email == email).first()
-        if user is None:
-            raise credentials_exception
+def _get_user_by_email(db: Session, email: str):
+    return db.query(User).filter(User.email == email).first()
 
-        return user
 
-    except JWTError:
-        raise credentials_exception
+def _save_user(db: Session, user: User):
+    db.add(user)
+    db.commit()
+    db.refresh(user)
 
 
+# Signup and login hash on the password pool; their database calls go
+# through run_db like every other route.
 @router.post("/signup", response_model=UserResponse)
-def create_user(user: UserCreate, db: Session = Depends(get_db)):
+async def create_user(user: UserCreate, db: Session = Depends(get_session)):
     """Endpoint for user signup"""
-    existing_user = db.query(User).filter(User.email == user.email).first()
+    existing_user = await run_db(db, _get_user_by_email, user.email)
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
 
     new_user = User(
         email=user.email,
-        hashed_password=hash_password(user.password),
+        hashed_password=await hash_password_async(user.password),
         role=user.role
     )
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await run_db(db, _save_user, new_user)
     return new_user
 
 
 @router.post("/login", response_model=Token)
-def login_user(
+async def login_user(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_session)
 ):
     """Endpoint for user login"""
-    user = db.query(User).filter(User.email == form_data.username).first()
-    if not user or not verify_password(form_data.password,
-                                       user.hashed_password):
+    user = await run_db(db, _get_user_by_email, form_data.username)
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+
+    valid, new_hash = await verify_password_async(form_data.password,
+                                                  user.hashed_password)
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
+    # Cost factor changed since this hash was made: store the upgrade
+    if new_hash:
+        user.hashed_password = new_hash
+        await run_db(db, _save_user, user)
+
     access_token = create_access_token(
-        data={"sub": user.email},
+        data=token_claims(user),
         expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
     )
 
@@ -109,40 +77,41 @@ def login_user(
 
 
 @router.get("/users/me", response_model=TokenData)
-def read_users_me(current_user: TokenData = Depends(get_current_user)):
+async def read_users_me(current_user: TokenData = Depends(get_current_user)):
     """Returns current user information"""
     return current_user
 
 
 @router.get("/protected-route")
-def protected_route(token: str = Depends(oauth2_scheme)):
+async def protected_route(token: str = Depends(oauth2_scheme)):
     """Example protected route"""
     return {"message": "You have access!", "token": token}
 
 
 @router.get("/admin-only")
-def admin_only(
-    required_role: str = "admin",
-    current_user_role: str = Depends(get_current_user_role),
+async def admin_only(
+    current_user: CurrentUser = Depends(get_current_user_role("admin")),
 ):
     """Admin-only route"""
-    if current_user_role != required_role:
-        raise HTTPException(status_code=403, detail="Access forbidden")
     return {"message": "Welcome, admin!"}
 
 
+def _delete_test_users(db: Session):
+    db.query(User).filter(User.email.like("%testuser%")
+                          ).delete(synchronize_session=False)
+    db.commit()
+
+
 @router.delete("/delete-test-users",
                status_code=status.HTTP_204_NO_CONTENT)
-def delete_test_users(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+async def delete_test_users(
+    db: Session = Depends(get_session),
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """Admin-only endpoint to delete test users"""
 
     if str(current_user.role) != "admin":
         raise HTTPException(status_code=403, detail="Not authorized")
 
-    db.query(User).filter(User.email.like("%testuser%")
-                          ).delete(synchronize_session=False)
-    db.commit()
+    await run_db(db, _delete_test_users)
     return {"message": "Test users deleted"}
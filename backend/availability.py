@@ -0,0 +1,277 @@
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import date, datetime, time
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import (
+    DateTime, Integer, and_, bindparam, column, func, select, text, update,
+    values
+)
+from sqlalchemy.orm import Session
+
+from backend.models import Booking, Lodging
+
+# Bookings in these states never hold a lodging
+INACTIVE_STATUSES = ("canceled",)
+
+
+def to_datetime(value: date) -> datetime:
+    """Normalize a booking date to the DateTime stored in the table"""
+    if isinstance(value, datetime):
+        return value
+    return datetime.combine(value, time.min)
+
+
+def validate_date_range(check_in: date, check_out: date):
+    if check_out <= check_in:
+        raise HTTPException(
+            status_code=400,
+            detail="end_date must be after start_date",
+        )
+
+
+def _write_lock(db: Session, lodging_ids) -> int:
+    """
+    Update the lodging rows to themselves; returns how many exist.
+
+    That write locks the rows on PostgreSQL and, on SQLite, takes the
+    database write lock. SQLite has no FOR UPDATE, and a deferred
+    transaction only takes that lock at its first write, so without
+    this the availability check and the insert of two requests could
+    interleave.
+    """
+    return db.execute(
+        update(Lodging)
+        .where(Lodging.id.in_(lodging_ids))
+        # updated_at too, so the no-op doesn't count as a change
+        .values(id=Lodging.id, updated_at=Lodging.updated_at)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def lock_lodging(db: Session, lodging_id: int) -> Lodging:
+    """
+    Write lock the lodging so concurrent bookings for it serialize,
+    and load it.
+    """
+    if not _write_lock(db, [lodging_id]):
+        raise HTTPException(status_code=404, detail="Lodging not found")
+    return db.query(Lodging).filter(Lodging.id == lodging_id).one()
+
+
+def find_conflict(
+    db: Session,
+    lodging_id: int,
+    check_in: date,
+    check_out: date,
+    exclude_booking_id: Optional[int] = None,
+) -> Optional[Booking]:
+    """
+    Return an active booking overlapping [check_in, check_out), if any.
+
+    Active bookings of a lodging never overlap each other (this check runs
+    before every insert/update), so sorted by check-in their check-outs are
+    sorted too. The only candidate is therefore the last booking starting
+    before ``check_out``: a single descending seek on
+    ix_bookings_lodging_dates instead of a range scan.
+    """
+    query = db.query(Booking).filter(
+        Booking.lodging_id == lodging_id,
+        Booking.check_in_date < to_datetime(check_out),
+        Booking.status.notin_(INACTIVE_STATUSES),
+    )
+    if exclude_booking_id is not None:
+        query = query.filter(Booking.id != exclude_booking_id)
+
+    candidate = query.order_by(Booking.check_in_date.desc()).first()
+    if candidate and candidate.check_out_date > to_datetime(check_in):
+        return candidate
+    return None
+
+
+def find_overlapping_bookings(db, limit: int = 20) -> List[Tuple[int, int]]:
+    """
+    (lodging_id, booking_id) of active bookings that overlap an earlier
+    active booking of the same lodging. find_conflict and free_between
+    are only correct while this is empty; ``db`` may be a Session or a
+    Connection (migrations).
+    """
+    active = (
+        select(
+            Booking.id,
+            Booking.lodging_id,
+            Booking.check_in_date,
+            # Latest check-out among the bookings starting before this one
+            func.max(Booking.check_out_date).over(
+                partition_by=Booking.lodging_id,
+                order_by=(Booking.check_in_date, Booking.id),
+                rows=(None, -1),
+            ).label("previous_check_out"),
+        )
+        .where(Booking.status.notin_(INACTIVE_STATUSES))
+        .subquery()
+    )
+    return [tuple(row) for row in db.execute(
+        select(active.c.lodging_id, active.c.id)
+        .where(active.c.previous_check_out > active.c.check_in_date)
+        .order_by(active.c.lodging_id, active.c.id)
+        .limit(limit)
+    )]
+
+
+def ensure_available(
+    db: Session,
+    lodging_id: int,
+    check_in: date,
+    check_out: date,
+    exclude_booking_id: Optional[int] = None,
+) -> Lodging:
+    """
+    Validate the range, lock the lodging and raise 409 on overlap.
+    Returns the locked lodging for pricing.
+    """
+    validate_date_range(check_in, check_out)
+    lodging = lock_lodging(db, lodging_id)
+    if find_conflict(db, lodging_id, check_in, check_out,
+                     exclude_booking_id):
+        raise HTTPException(status_code=409,
+                            detail="Date range not available")
+    return lodging
+
+
+def free_between(check_in: date, check_out: date):
+    """
+    Filter for lodgings with no active booking overlapping
+    [check_in, check_out), for a whole lodging query at once.
+
+    Same reasoning as find_conflict: per lodging, only the last active
+    booking starting before ``check_out`` can overlap, so the correlated
+    subquery is one descending seek on ix_bookings_lodging_dates,
+    however long the lodging's booking history is.
+    """
+    last_check_out = (
+        select(Booking.check_out_date)
+        .where(
+            Booking.lodging_id == Lodging.id,
+            Booking.check_in_date < to_datetime(check_out),
+            Booking.status.notin_(INACTIVE_STATUSES),
+        )
+        .order_by(Booking.check_in_date.desc())
+        .limit(1)
+        .correlate(Lodging)
+        .scalar_subquery()
+    )
+    start = to_datetime(check_in)
+    return func.coalesce(last_check_out, start) <= start
+
+
+def total_price(lodging: Lodging, check_in: date, check_out: date) -> float:
+    nights = (to_datetime(check_out) - to_datetime(check_in)).days
+    return nights * lodging.price_per_night
+
+
+# (batch index, lodging_id, check_in, check_out) of a requested booking
+Request = Tuple[int, int, date, date]
+
+
+def lock_lodgings(
+    db: Session, lodging_ids: Sequence[int]
+) -> Dict[int, Lodging]:
+    """lock_lodging for a whole batch, in id order"""
+    lodging_ids = set(lodging_ids)
+    # FOR UPDATE first, so PostgreSQL takes the row locks in id order
+    lodgings = (
+        db.query(Lodging)
+        .filter(Lodging.id.in_(lodging_ids))
+        .order_by(Lodging.id)
+        .with_for_update()
+        .all()
+    )
+    _write_lock(db, lodging_ids)
+    return {lodging.id: lodging for lodging in lodgings}
+
+
+def _requested_table(db: Session, requests: List[Request]):
+    """Send the batch as an inline VALUES table (one row per request)"""
+    types = (Integer, Integer, DateTime, DateTime)
+    names = ("idx", "lodging_id", "check_in", "check_out")
+    rows = [
+        (idx, lodging_id, to_datetime(check_in), to_datetime(check_out))
+        for idx, lodging_id, check_in, check_out in requests
+    ]
+
+    if db.get_bind().dialect.name == "postgresql":
+        return values(
+            *(column(name, type_) for name, type_ in zip(names, types)),
+            name="requested",
+        ).data(rows)
+
+    # SQLite can't alias the columns of a derived VALUES table, so use
+    # the default column1..column4 names and relabel them
+    placeholders = ", ".join(
+        "(" + ", ".join(f":v{n}_{i}" for i in range(4)) + ")"
+        for n in range(len(rows))
+    )
+    raw = (
+        text(f"VALUES {placeholders}")
+        .bindparams(*(
+            bindparam(f"v{n}_{i}", value, type_=types[i])
+            for n, row in enumerate(rows) for i, value in enumerate(row)
+        ))
+        .columns(*(column(f"column{i + 1}", types[i]) for i in range(4)))
+        .subquery("raw")
+    )
+    return select(*(
+        raw.c[f"column{i + 1}"].label(name) for i, name in enumerate(names)
+    )).subquery("requested")
+
+
+def find_batch_conflicts(db: Session, requests: List[Request]) -> Set[int]:
+    """
+    Batch indexes of ``requests`` overlapping an existing active booking.
+
+    All requests are checked in one statement: they are sent as a VALUES
+    list and joined to bookings, each row probing
+    ix_bookings_lodging_dates.
+    """
+    if not requests:
+        return set()
+
+    requested = _requested_table(db, requests)
+    statement = (
+        select(requested.c.idx)
+        .join(Booking, and_(
+            Booking.lodging_id == requested.c.lodging_id,
+            Booking.check_in_date < requested.c.check_out,
+            Booking.check_out_date > requested.c.check_in,
+            Booking.status.notin_(INACTIVE_STATUSES),
+        ))
+        .distinct()
+    )
+    return set(db.execute(statement).scalars())
+
+
+def find_overlaps_within(requests: List[Request]) -> Set[int]:
+    """
+    Batch indexes of ``requests`` overlapping an earlier request of the
+    same batch. Earlier entries win; no database access needed.
+    """
+    # Per lodging: sorted check-ins and matching check-outs of the
+    # requests accepted so far (they never overlap each other)
+    starts: Dict[int, list] = defaultdict(list)
+    ends: Dict[int, list] = defaultdict(list)
+    conflicts = set()
+
+    for idx, lodging_id, check_in, check_out in requests:
+        lodging_starts, lodging_ends = starts[lodging_id], ends[lodging_id]
+        pos = bisect_left(lodging_starts, check_in)
+        overlaps_previous = pos > 0 and lodging_ends[pos - 1] > check_in
+        overlaps_next = (pos < len(lodging_starts)
+                         and lodging_starts[pos] < check_out)
+        if overlaps_previous or overlaps_next:
+            conflicts.add(idx)
+            continue
+        lodging_starts.insert(pos, check_in)
+        lodging_ends.insert(pos, check_out)
+    return conflicts
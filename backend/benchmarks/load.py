@@ -0,0 +1,295 @@
+"""
+In-process load test for the API.
+
+Seeds a scratch database, then drives each route through the ASGI app
+with concurrent requests (no server, no network) and reports throughput
+and p50/p95/p99 latency per route as JSON:
+
+    python -m backend.benchmarks.load [--url URL] [--requests 200]
+        [--concurrency 16] [--baseline base.json] [--save-baseline out]
+
+Without ``--url`` a temporary SQLite file is used. A given database must
+be a disposable one: it is seeded with synthetic rows. With
+``--baseline`` the run is compared against an earlier report and exits
+with status 1 when a route's p95 or throughput regressed by more than
+``--tolerance``.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import date, timedelta
+from typing import Callable, Dict, List, Optional
+
+DEFAULT_LODGINGS = 2000
+DEFAULT_BOOKINGS = 20000
+DEFAULT_USERS = 200
+DEFAULT_REQUESTS = 200
+DEFAULT_CONCURRENCY = 16
+DEFAULT_TOLERANCE = 0.2
+
+ADMIN_EMAIL = "bench-admin@example.com"
+ADMIN_PASSWORD = "bench-password"
+
+
+def routes(rng: random.Random, lodgings: int, bookings: int,
+           users: int) -> Dict[str, dict]:
+    """
+    Route name -> request factory. ``scale`` shrinks the request count
+    of expensive routes (bcrypt on login) relative to the others.
+    """
+    def lodging_id():
+        return rng.randrange(lodgings) + 1
+
+    def booking_dates():
+        start = date(2040, 1, 1) + timedelta(days=rng.randrange(3650))
+        return start, start + timedelta(days=rng.randrange(1, 7))
+
+    def new_booking():
+        start, end = booking_dates()
+        return {"lodging_id": lodging_id(), "start_date": str(start),
+                "end_date": str(end)}
+
+    return {
+        "GET /lodgings/": {
+            "request": lambda: ("GET", "/lodgings/?limit=20", None),
+        },
+        "GET /lodgings/ (filtered)": {
+            "request": lambda: (
+                "GET", "/lodgings/?availability=true"
+                "&sort_by=price_per_night&order=asc&limit=20", None),
+        },
+        "GET /lodgings/ (location search)": {
+            "request": lambda: ("GET", "/lodgings/?location=Williston",
+                                None),
+        },
+        "GET /lodgings/{id}": {
+            "request": lambda: ("GET", f"/lodgings/{lodging_id()}", None),
+        },
+        "GET /lodgings/{id}/calendar": {
+            "request": lambda: (
+                "GET", f"/lodgings/{lodging_id()}/calendar?year=2030", None),
+        },
+        "GET /bookings/": {
+            "request": lambda: ("GET", "/bookings/?limit=20", None),
+        },
+        "GET /bookings/ (expanded)": {
+            "request": lambda: (
+                "GET", f"/bookings/?user_id={rng.randrange(users) + 1}"
+                "&expand=lodging,user", None),
+        },
+        "GET /bookings/{id}": {
+            "request": lambda: (
+                "GET", f"/bookings/{rng.randrange(bookings) + 1}", None),
+        },
+        "GET /reports/lodgings/{id}": {
+            "request": lambda: (
+                "GET", f"/reports/lodgings/{lodging_id()}"
+                "?start_date=2030-01-01&end_date=2031-01-01", None),
+        },
+        "POST /bookings/": {
+            "request": lambda: ("POST", "/bookings/", new_booking()),
+        },
+        "POST /auth/login": {
+            "request": lambda: ("POST", "/auth/login", {
+                "username": ADMIN_EMAIL, "password": ADMIN_PASSWORD,
+            }),
+            "scale": 0.1,
+        },
+    }
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, round(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(latencies: List[float], statuses: Counter, elapsed: float,
+              concurrency: int) -> dict:
+    ordered = sorted(latencies)
+    return {
+        "requests": len(ordered),
+        "concurrency": concurrency,
+        "throughput_rps": round(len(ordered) / elapsed, 1) if elapsed else 0,
+        "mean_ms": round(statistics.fmean(ordered), 3) if ordered else 0,
+        "p50_ms": round(percentile(ordered, 50), 3),
+        "p95_ms": round(percentile(ordered, 95), 3),
+        "p99_ms": round(percentile(ordered, 99), 3),
+        "max_ms": round(ordered[-1], 3) if ordered else 0,
+        "status_codes": {str(code): n for code, n in sorted(statuses.items())},
+        "errors": sum(n for code, n in statuses.items() if code >= 500),
+    }
+
+
+async def drive(client, make_request: Callable, total: int,
+                concurrency: int, headers: dict) -> dict:
+    """Send ``total`` requests from ``concurrency`` concurrent workers"""
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    remaining = total
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            method, path, body = make_request()
+            kwargs = {"headers": headers}
+            if path == "/auth/login":
+                kwargs["data"] = body
+            elif body is not None:
+                kwargs["json"] = body
+            started = time.perf_counter()
+            response = await client.request(method, path, **kwargs)
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses[response.status_code] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, statuses, time.perf_counter() - started,
+                     concurrency)
+
+
+def seed_database(lodgings: int, bookings: int, users: int,
+                  rng: random.Random) -> str:
+    """Create and fill the tables; returns an admin bearer token"""
+    from backend.auth import create_access_token, hash_password, token_claims
+    from backend.benchmarks.query_plans import seed
+    from backend.booking_calendar import rebuild_calendars
+    from backend.database import Base, SessionLocal, engine
+    from backend.models import User
+    from backend.occupancy import rebuild_daily_stats
+
+    Base.metadata.create_all(bind=engine)
+    seed(engine, lodgings, bookings, users, rng)
+    with SessionLocal() as db:
+        rebuild_daily_stats(db)
+        rebuild_calendars(db)
+        admin = User(email=ADMIN_EMAIL, role="admin",
+                     hashed_password=hash_password(ADMIN_PASSWORD))
+        db.add(admin)
+        db.commit()
+        return create_access_token(token_claims(admin),
+                                   timedelta(hours=2))
+
+
+async def run(lodgings: int = DEFAULT_LODGINGS,
+              bookings: int = DEFAULT_BOOKINGS,
+              users: int = DEFAULT_USERS,
+              requests: int = DEFAULT_REQUESTS,
+              concurrency: int = DEFAULT_CONCURRENCY,
+              only: Optional[List[str]] = None,
+              seed_value: int = 0) -> dict:
+    """Seed the configured database and load-test every route"""
+    import httpx
+
+    from backend.database import DATABASE_ASYNC, async_engine, engine
+    from backend.main import app
+
+    rng = random.Random(seed_value)
+    token = seed_database(lodgings, bookings, users, rng)
+    headers = {"Authorization": f"Bearer {token}"}
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport,
+                                 base_url="http://bench") as client:
+        for name, route in routes(rng, lodgings, bookings, users).items():
+            if only and name not in only:
+                continue
+            total = max(1, int(requests * route.get("scale", 1)))
+            results[name] = await drive(client, route["request"], total,
+                                        concurrency, headers)
+    if async_engine is not None:
+        # aiosqlite connections hold threads that would block exit
+        await async_engine.dispose()
+    return {
+        "dialect": engine.dialect.name,
+        "async_engine": DATABASE_ASYNC,
+        "volumes": {"lodgings": lodgings, "bookings": bookings,
+                    "users": users},
+        "routes": results,
+    }
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> List[dict]:
+    """Routes whose p95 or throughput regressed beyond ``tolerance``"""
+    regressions = []
+    for name, current in report["routes"].items():
+        previous = baseline.get("routes", {}).get(name)
+        if not previous:
+            continue
+        if current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            regressions.append({"route": name, "metric": "p95_ms",
+                                "baseline": previous["p95_ms"],
+                                "current": current["p95_ms"]})
+        if (current["throughput_rps"]
+                < previous["throughput_rps"] * (1 - tolerance)):
+            regressions.append({"route": name, "metric": "throughput_rps",
+                                "baseline": previous["throughput_rps"],
+                                "current": current["throughput_rps"]})
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", help="disposable database URL "
+                        "(default: temporary SQLite file)")
+    parser.add_argument("--lodgings", type=int, default=DEFAULT_LODGINGS)
+    parser.add_argument("--bookings", type=int, default=DEFAULT_BOOKINGS)
+    parser.add_argument("--users", type=int, default=DEFAULT_USERS)
+    parser.add_argument("--requests", type=int, default=DEFAULT_REQUESTS,
+                        help="requests per route")
+    parser.add_argument("--concurrency", type=int,
+                        default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--route", action="append", dest="only",
+                        help="only run this route (repeatable)")
+    parser.add_argument("--baseline", help="report to compare against")
+    parser.add_argument("--tolerance", type=float,
+                        default=DEFAULT_TOLERANCE)
+    parser.add_argument("--save-baseline", help="write the report here")
+    args = parser.parse_args(argv)
+
+    # The engine is built when backend.database is imported, so the URL
+    # has to be in place first
+    scratch = None
+    if args.url:
+        os.environ["DATABASE_URL"] = args.url
+    else:
+        handle, scratch = tempfile.mkstemp(suffix=".db")
+        os.close(handle)
+        os.environ["DATABASE_URL"] = f"sqlite:///{scratch}"
+
+    try:
+        report = asyncio.run(run(
+            args.lodgings, args.bookings, args.users, args.requests,
+            args.concurrency, args.only,
+        ))
+    finally:
+        if scratch:
+            os.remove(scratch)
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as handle:
+            report["regressions"] = compare(report, json.load(handle),
+                                            args.tolerance)
+        status = 1 if report["regressions"] else 0
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as handle:
+            json.dump(report, handle, indent=2)
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,301 @@
+"""
+Query-plan regression benchmark for the list endpoints.
+
+Seeds a scratch database, runs every get_lodgings / get_bookings access
+path through the router helpers, and checks that
+
+* EXPLAIN shows no full scan of ``lodgings`` or ``bookings``, and
+* the median latency of each query stays under the budget.
+
+    python -m backend.benchmarks.query_plans [--url URL] [--budget-ms 50]
+
+Without ``--url`` a temporary SQLite file is used. A given database must
+be an empty one: the tables are created, seeded and dropped again, so a
+database that already has tables is refused.
+Exits with status 1 if any query misses its index or its budget.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import create_engine, event, insert, inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from backend.api.routers.booking_router import _list_bookings
+from backend.api.routers.lodging_router import _list_lodgings
+from backend.database import Base
+from backend.geo import lodging_geohash
+from backend.models import Booking, Lodging, User
+
+DEFAULT_LODGINGS = 20000
+DEFAULT_BOOKINGS = 200000
+DEFAULT_USERS = 500
+DEFAULT_BUDGET_MS = 50.0
+DEFAULT_REPEATS = 5
+
+TOWNS = [
+    "Williston, ND", "Watford City, ND", "Dickinson, ND", "Minot, ND",
+    "Tioga, ND", "Killdeer, ND", "Midland, TX", "Odessa, TX", "Pecos, TX",
+    "Carlsbad, NM", "Hobbs, NM", "Gillette, WY", "Casper, WY",
+    "Vernal, UT", "Sidney, MT", "Glendive, MT",
+]
+# Lodgings are scattered over this (lat, lon) box around the basins
+REGION = ((31.0, 49.0), (-110.0, -100.0))
+# A job site near Williston, ND
+JOB_SITE = (48.15, -103.62)
+STATUSES = ("pending", "confirmed", "canceled")
+SCANNED_TABLES = ("lodgings", "bookings")
+
+# A full table scan in SQLite's EXPLAIN QUERY PLAN output
+SQLITE_FULL_SCAN = re.compile(
+    r"^SCAN (TABLE )?(?P<table>\w+)( AS \w+)?$"
+)
+
+
+def seed(engine: Engine, lodgings: int, bookings: int, users: int,
+         rng: random.Random):
+    """Insert synthetic users, lodgings and bookings with executemany"""
+    start = datetime(2030, 1, 1)
+    with engine.begin() as connection:
+        connection.execute(insert(User), [
+            {"email": f"bench{n}@example.com", "hashed_password": "x",
+             "role": "user"}
+            for n in range(users)
+        ])
+        rows = []
+        for n in range(lodgings):
+            latitude = round(rng.uniform(*REGION[0]), 5)
+            longitude = round(rng.uniform(*REGION[1]), 5)
+            rows.append({
+                "name": f"Camp {n}",
+                "location": rng.choice(TOWNS),
+                "price_per_night": round(rng.uniform(40, 400), 2),
+                "availability": rng.random() < 0.7,
+                "description": "Crew housing",
+                "latitude": latitude,
+                "longitude": longitude,
+                "geohash": lodging_geohash(latitude, longitude),
+                "created_at": start + timedelta(minutes=n),
+                "updated_at": start + timedelta(minutes=n),
+            })
+        connection.execute(insert(Lodging), rows)
+        batch = []
+        for n in range(bookings):
+            check_in = start + timedelta(days=rng.randrange(1000))
+            batch.append({
+                "user_id": rng.randrange(users) + 1,
+                "lodging_id": rng.randrange(lodgings) + 1,
+                "check_in_date": check_in,
+                "check_out_date": check_in + timedelta(
+                    days=rng.randrange(1, 14)),
+                "total_price": round(rng.uniform(100, 4000), 2),
+                "status": rng.choice(STATUSES),
+                "created_at": start + timedelta(seconds=n),
+                "updated_at": start + timedelta(seconds=n),
+            })
+            if len(batch) == 10000:
+                connection.execute(insert(Booking), batch)
+                batch = []
+        if batch:
+            connection.execute(insert(Booking), batch)
+        # Give the planner real statistics
+        connection.execute(text("ANALYZE"))
+
+
+def scenarios(lodging_id: int, user_id: int) -> Dict[str, Callable]:
+    """Router access paths, each a callable taking a Session"""
+
+    def lodgings(**filters):
+        params = dict(location=None, min_price=None, max_price=None,
+                      availability=None, sort_by="created_at",
+                      order="desc", limit=10, offset=0, cursor=None)
+        params.update(filters)
+        return lambda db: _list_lodgings(db, **params)
+
+    def bookings(**filters):
+        params = dict(user_id=None, lodging_id=None, status=None,
+                      sort_by="created_at", order="desc", limit=10,
+                      offset=0, cursor=None)
+        params.update(filters)
+        return lambda db: _list_bookings(db, **params)
+
+    def two_pages(db):
+        # The second page is a keyset seek from the first page's cursor
+        _, cursor, _ = lodgings()(db)
+        return lodgings(cursor=cursor)(db)
+
+    return {
+        "lodgings: newest": lodgings(),
+        "lodgings: available, newest": lodgings(availability=True),
+        "lodgings: available, cheapest": lodgings(
+            availability=True, sort_by="price_per_night", order="asc"),
+        "lodgings: price range": lodgings(
+            min_price=100, max_price=150, sort_by="price_per_night",
+            order="asc"),
+        "lodgings: first two pages": two_pages,
+        "lodgings: location search": lodgings(location="Kildeer"),
+        "lodgings: within 50 km": lodgings(
+            near=JOB_SITE, radius_km=50, sort_by="distance"),
+        "lodgings: available within 50 km, cheapest": lodgings(
+            near=JOB_SITE, radius_km=50, availability=True,
+            sort_by="price_per_night", order="asc"),
+        "lodgings: nearest": lodgings(near=JOB_SITE, sort_by="distance"),
+        "lodgings: free for two weeks": lodgings(
+            stay=(date(2031, 3, 3), date(2031, 3, 17))),
+        "lodgings: available and free, cheapest": lodgings(
+            availability=True, stay=(date(2031, 3, 3), date(2031, 3, 17)),
+            sort_by="price_per_night", order="asc"),
+        "bookings: newest": bookings(),
+        "bookings: by user": bookings(user_id=user_id),
+        "bookings: by lodging": bookings(lodging_id=lodging_id),
+        "bookings: by status": bookings(status="confirmed"),
+        "bookings: by check-in": bookings(sort_by="start_date",
+                                          order="asc"),
+    }
+
+
+@contextmanager
+def capture_statements(engine: Engine):
+    """Collect the (SQL, parameters) pairs sent while the block runs"""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if not statement.lstrip().upper().startswith("EXPLAIN"):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+def full_scans(db: Session, statement: str, parameters) -> List[str]:
+    """Tables of SCANNED_TABLES that ``statement`` reads without an index"""
+    connection = db.connection()
+    if connection.dialect.name == "postgresql":
+        plan = connection.exec_driver_sql(
+            "EXPLAIN (FORMAT JSON) " + statement, parameters
+        ).scalar()
+        nodes, scans = [plan[0]["Plan"]], []
+        while nodes:
+            node = nodes.pop()
+            nodes.extend(node.get("Plans", []))
+            if (node["Node Type"] == "Seq Scan"
+                    and node.get("Relation Name") in SCANNED_TABLES):
+                scans.append(node["Relation Name"])
+        return scans
+
+    scans = []
+    for row in connection.exec_driver_sql(
+        "EXPLAIN QUERY PLAN " + statement, parameters
+    ):
+        match = SQLITE_FULL_SCAN.match(row[-1])
+        if match and match.group("table") in SCANNED_TABLES:
+            scans.append(match.group("table"))
+    return scans
+
+
+def run(url: Optional[str] = None,
+        lodgings: int = DEFAULT_LODGINGS,
+        bookings: int = DEFAULT_BOOKINGS,
+        users: int = DEFAULT_USERS,
+        budget_ms: float = DEFAULT_BUDGET_MS,
+        repeats: int = DEFAULT_REPEATS,
+        seed_value: int = 0) -> dict:
+    """Seed, measure and explain every scenario; returns the report"""
+    scratch = None
+    if url is None:
+        handle, scratch = tempfile.mkstemp(suffix=".db")
+        os.close(handle)
+        url = f"sqlite:///{scratch}"
+
+    engine = create_engine(url)
+    if scratch is None:
+        existing = inspect(engine).get_table_names()
+        if existing:
+            engine.dispose()
+            raise ValueError(
+                f"{engine.url!r} already has tables ({', '.join(existing)});"
+                " the benchmark drops its tables when done, so it needs an "
+                "empty database"
+            )
+    try:
+        Base.metadata.create_all(bind=engine)
+        rng = random.Random(seed_value)
+        seed(engine, lodgings, bookings, users, rng)
+
+        results = {}
+        make_session = sessionmaker(bind=engine)
+        for name, query in scenarios(rng.randrange(lodgings) + 1,
+                                     rng.randrange(users) + 1).items():
+            with make_session() as db:
+                query(db)  # warm up caches and the statement cache
+                timings = []
+                for _ in range(repeats):
+                    with capture_statements(engine) as statements:
+                        started = time.perf_counter()
+                        query(db)
+                        timings.append(
+                            (time.perf_counter() - started) * 1000
+                        )
+                scans = sorted({
+                    table
+                    for statement, parameters in statements
+                    for table in full_scans(db, statement, parameters)
+                })
+            median = statistics.median(timings)
+            results[name] = {
+                "median_ms": round(median, 3),
+                "full_scans": scans,
+                "ok": not scans and median <= budget_ms,
+            }
+        return {
+            "dialect": engine.dialect.name,
+            "lodgings": lodgings,
+            "bookings": bookings,
+            "budget_ms": budget_ms,
+            "results": results,
+            "ok": all(result["ok"] for result in results.values()),
+        }
+    finally:
+        Base.metadata.drop_all(bind=engine)
+        engine.dispose()
+        if scratch:
+            os.remove(scratch)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", help="empty, disposable database URL "
+                        "(default: temporary SQLite file)")
+    parser.add_argument("--lodgings", type=int, default=DEFAULT_LODGINGS)
+    parser.add_argument("--bookings", type=int, default=DEFAULT_BOOKINGS)
+    parser.add_argument("--users", type=int, default=DEFAULT_USERS)
+    parser.add_argument("--budget-ms", type=float,
+                        default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS)
+    args = parser.parse_args(argv)
+
+    try:
+        report = run(args.url, args.lodgings, args.bookings, args.users,
+                     args.budget_ms, args.repeats)
+    except ValueError as exc:
+        parser.error(str(exc))
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    return 0 if report["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+"""
+Serialization benchmark for one list page.
+
+Compares the default FastAPI path (response_model validation,
+jsonable_encoder, json.dumps) with dump_rows + orjson, validated and
+trusted, on in-memory lodgings:
+
+    python -m backend.benchmarks.serialization [--rows 500]
+"""
+import argparse
+import json
+import sys
+import timeit
+from datetime import datetime
+from typing import List
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from backend.models import Lodging
+from backend.schemas import LodgingResponse
+from backend.serialization import dump_rows
+
+
+def make_rows(count: int) -> List[Lodging]:
+    stamp = datetime(2030, 1, 1, 12, 30)
+    return [
+        Lodging(id=n, name=f"Camp {n}", location="Williston, ND",
+                price_per_night=100.0 + n, availability=True,
+                description="Crew housing " * 20, created_at=stamp,
+                updated_at=stamp)
+        for n in range(count)
+    ]
+
+
+def run(rows: int = 500, repeats: int = 20) -> dict:
+    page = make_rows(rows)
+    adapter = TypeAdapter(List[LodgingResponse])
+
+    def fastapi_default():
+        # What serialize_response + JSONResponse do per request
+        validated = adapter.validate_python(page, from_attributes=True)
+        json.dumps(jsonable_encoder(adapter.dump_python(validated)))
+
+    candidates = {
+        "fastapi_default": fastapi_default,
+        "validated_orjson": lambda: orjson.dumps(
+            dump_rows(page, LodgingResponse, trusted=False)),
+        "trusted_orjson": lambda: orjson.dumps(
+            dump_rows(page, LodgingResponse, trusted=True)),
+    }
+    results = {
+        name: round(min(timeit.repeat(fn, number=1, repeat=repeats)) * 1000,
+                    3)
+        for name, fn in candidates.items()
+    }
+    return {"rows": rows, "best_ms": results}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=500)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args(argv)
+    json.dump(run(args.rows, args.repeats), sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
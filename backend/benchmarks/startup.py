@@ -0,0 +1,129 @@
+"""
+Cold-start benchmark: how long a fresh worker takes to be ready.
+
+Each run is a new interpreter that times
+
+* importing ``backend.main``,
+* building another app with ``create_app()``, and
+* the lifespan startup,
+
+and counts the database connections opened along the way, which should
+be none: the schema is Alembic's job and the pools connect lazily.
+
+    python -m backend.benchmarks.startup [--runs 5] [--budget-ms 3000]
+
+Without ``--url`` the app points at a SQLite file that must still not
+exist afterwards. Exits with status 1 if a run opened a connection or
+the median time to ready exceeds the budget.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+DEFAULT_RUNS = 5
+DEFAULT_BUDGET_MS = 3000.0
+
+PHASES = ("import_ms", "create_app_ms", "startup_ms", "ready_ms")
+
+
+def probe() -> dict:
+    """One cold start, measured from inside the fresh interpreter"""
+    started = time.perf_counter()
+    from sqlalchemy import event
+    from sqlalchemy.pool import Pool
+
+    connections = []
+    event.listen(Pool, "connect", lambda *args: connections.append(1))
+
+    import backend.main
+    imported = time.perf_counter()
+    app = backend.main.create_app()
+    created = time.perf_counter()
+
+    async def start():
+        async with app.router.lifespan_context(app):
+            return time.perf_counter()
+
+    ready = asyncio.run(start())
+    # A worker imports the module (which builds ``app``) and starts it;
+    # the extra create_app() call is not on that path
+    return {
+        "import_ms": (imported - started) * 1000,
+        "create_app_ms": (created - imported) * 1000,
+        "startup_ms": (ready - created) * 1000,
+        "ready_ms": (imported - started + ready - created) * 1000,
+        "connections_opened": len(connections),
+    }
+
+
+def run(url: str = None, runs: int = DEFAULT_RUNS,
+        budget_ms: float = DEFAULT_BUDGET_MS) -> dict:
+    scratch = None
+    if url is None:
+        scratch = os.path.join(tempfile.mkdtemp(), "never-created.db")
+        url = f"sqlite:///{scratch}"
+    env = dict(os.environ, DATABASE_URL=url)
+
+    samples = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-m", "backend.benchmarks.startup", "--probe"],
+            capture_output=True, text=True, env=env, check=True,
+        )
+        samples.append(json.loads(result.stdout))
+
+    report = {
+        phase: {
+            "median": round(statistics.median(s[phase] for s in samples), 3),
+            "max": round(max(s[phase] for s in samples), 3),
+        }
+        for phase in PHASES
+    }
+    report["runs"] = runs
+    report["budget_ms"] = budget_ms
+    report["connections_opened"] = sum(
+        s["connections_opened"] for s in samples
+    )
+    if scratch:
+        report["database_created"] = os.path.exists(scratch)
+        if report["database_created"]:
+            os.remove(scratch)
+        os.rmdir(os.path.dirname(scratch))
+    report["ok"] = (
+        report["connections_opened"] == 0
+        and not report.get("database_created")
+        and report["ready_ms"]["median"] <= budget_ms
+    )
+    return report
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", help="database URL the app is configured "
+                        "with (default: a SQLite path that should stay "
+                        "unused)")
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS)
+    parser.add_argument("--budget-ms", type=float,
+                        default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--probe", action="store_true",
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.probe:
+        json.dump(probe(), sys.stdout)
+        return 0
+
+    report = run(args.url, args.runs, args.budget_ms)
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    return 0 if report["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
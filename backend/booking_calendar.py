@@ -0,0 +1,170 @@
+import re
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import bindparam, delete, insert, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from backend.availability import INACTIVE_STATUSES
+from backend.models import Booking, Lodging, LodgingCalendar
+from backend.schemas import CalendarRange, LodgingCalendarResponse
+
+# One bit per day of the year, leap day included: 46 bytes a year
+BITMAP_BYTES = (366 + 7) // 8
+
+INSERTS = {"postgresql": postgresql_insert, "sqlite": sqlite_insert}
+
+# (lodging_id, year) -> bitmap of booked nights
+Bitmaps = Dict[Tuple[int, int], bytearray]
+
+
+def _day(value) -> date:
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _bit(day: date) -> int:
+    return day.timetuple().tm_yday - 1
+
+
+def _set_bit(bitmap: bytearray, day: date, booked: bool):
+    bit = _bit(day)
+    if booked:
+        bitmap[bit >> 3] |= 1 << (bit & 7)
+    else:
+        bitmap[bit >> 3] &= ~(1 << (bit & 7)) & 0xFF
+
+
+def set_nights(bitmaps: Bitmaps, lodging_id: int, check_in, check_out,
+               booked: bool = True):
+    """Set (or clear) the bits of the nights [check_in, check_out)"""
+    day, last = _day(check_in), _day(check_out)
+    while day < last:
+        bitmap = bitmaps.get((lodging_id, day.year))
+        if bitmap is None:
+            bitmap = bitmaps[(lodging_id, day.year)] = bytearray(BITMAP_BYTES)
+        _set_bit(bitmap, day, booked)
+        day += timedelta(days=1)
+
+
+def apply_night_changes(connection, changes: Dict[Tuple[int, date], int]):
+    """
+    Flip the calendar bits of nights whose booked count changed: set on
+    a net gain, cleared on a net loss. Active bookings of a lodging never
+    overlap, so a night is held by at most one of them.
+
+    The affected (lodging, year) rows are created if missing and then
+    read FOR UPDATE, so concurrent writers can't lose each other's bits.
+    Both happen in (lodging_id, year) order, so writers touching several
+    rows (batches, stays across new year) can't deadlock each other.
+    """
+    booked: Dict[Tuple[int, int], List[Tuple[date, bool]]] = defaultdict(
+        list
+    )
+    for (lodging_id, day), change in changes.items():
+        if change:
+            booked[(lodging_id, day.year)].append((day, change > 0))
+    if not booked:
+        return
+
+    keys = sorted(booked)
+    table = LodgingCalendar.__table__
+    connection.execute(
+        INSERTS[connection.dialect.name](table).on_conflict_do_nothing(),
+        [{"lodging_id": lodging_id, "year": year,
+          "nights": bytes(BITMAP_BYTES)}
+         for lodging_id, year in keys],
+    )
+    rows = connection.execute(
+        select(table.c.lodging_id, table.c.year, table.c.nights)
+        .where(tuple_(table.c.lodging_id, table.c.year).in_(keys))
+        .order_by(table.c.lodging_id, table.c.year)
+        .with_for_update()
+    )
+    updated = []
+    for lodging_id, year, nights in rows:
+        bitmap = bytearray(nights)
+        for day, is_set in booked[(lodging_id, year)]:
+            _set_bit(bitmap, day, is_set)
+        updated.append({"key_lodging_id": lodging_id, "key_year": year,
+                        "nights": bytes(bitmap)})
+    connection.execute(
+        update(table)
+        .where(table.c.lodging_id == bindparam("key_lodging_id"),
+               table.c.year == bindparam("key_year"))
+        .values(nights=bindparam("nights")),
+        updated,
+    )
+
+
+def rebuild_calendars(db: Session, batch_size: int = 1000):
+    """Recompute lodging_calendars from the bookings (backfills, repairs)"""
+    db.execute(delete(LodgingCalendar))
+    bitmaps: Bitmaps = {}
+    rows = db.execute(
+        select(Booking.lodging_id, Booking.check_in_date,
+               Booking.check_out_date)
+        .where(Booking.status.notin_(INACTIVE_STATUSES))
+        .execution_options(yield_per=batch_size)
+    )
+    for lodging_id, check_in, check_out in rows:
+        set_nights(bitmaps, lodging_id, check_in, check_out)
+    if bitmaps:
+        db.execute(insert(LodgingCalendar), [
+            {"lodging_id": lodging_id, "year": year, "nights": bytes(bitmap)}
+            for (lodging_id, year), bitmap in bitmaps.items()
+        ])
+    db.commit()
+
+
+def _nights(bitmap: Optional[bytes], start: date, count: int) -> str:
+    """``count`` nights from ``start`` (same year) as "0"/"1" characters"""
+    if bitmap is None:
+        return "0" * count
+    first = _bit(start)
+    return "".join(
+        "1" if bitmap[bit >> 3] & (1 << (bit & 7)) else "0"
+        for bit in range(first, first + count)
+    )
+
+
+def lodging_calendar(db: Session, lodging_id: int, year: int,
+                     month: Optional[int] = None) -> LodgingCalendarResponse:
+    """
+    Booked and free nights of a lodging for a month or a whole year,
+    read from its calendar bitmap; the bookings table isn't touched.
+    """
+    if not db.query(Lodging.id).filter(Lodging.id == lodging_id).count():
+        raise HTTPException(status_code=404, detail="Lodging not found")
+
+    if month is None:
+        start, end = date(year, 1, 1), date(year + 1, 1, 1)
+    else:
+        start = date(year, month, 1)
+        end = date(year + month // 12, month % 12 + 1, 1)
+    bitmap = db.execute(
+        select(LodgingCalendar.nights).where(
+            LodgingCalendar.lodging_id == lodging_id,
+            LodgingCalendar.year == year,
+        )
+    ).scalar()
+
+    nights = _nights(bitmap, start, (end - start).days)
+    booked_nights = nights.count("1")
+    return LodgingCalendarResponse(
+        lodging_id=lodging_id,
+        start_date=start,
+        end_date=end,
+        booked_nights=booked_nights,
+        free_nights=len(nights) - booked_nights,
+        nights=nights,
+        # Runs of booked nights as [start_date, end_date) ranges
+        booked=[
+            CalendarRange(start_date=start + timedelta(days=run.start()),
+                          end_date=start + timedelta(days=run.end()))
+            for run in re.finditer("1+", nights)
+        ],
+    )
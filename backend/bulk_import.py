@@ -0,0 +1,187 @@
+import csv
+import io
+import json
+from typing import AsyncIterator, Dict, List, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import func, insert, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from backend.database import run_db
+from backend.facets import invalidate_facets
+from backend.geo import lodging_geohash
+from backend.models import Lodging
+from backend.schemas import LodgingCreate
+
+DEFAULT_CHUNK_SIZE = 1000
+MAX_CHUNK_SIZE = 10000
+
+COPY_COLUMNS = (
+    "name", "location", "price_per_night", "availability", "description",
+    "latitude", "longitude", "geohash", "created_at", "updated_at",
+)
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Split a streamed body into text lines without reading it all"""
+    pending = b""
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8").rstrip("\r")
+    if pending:
+        yield pending.decode("utf-8").rstrip("\r")
+
+
+async def iter_records(
+    lines: AsyncIterator[str], fmt: str
+) -> AsyncIterator[Tuple[int, object]]:
+    """
+    Yield (row number, raw record) pairs. Rows are numbered from 1 and
+    exclude the CSV header; CSV records must fit on one line.
+    """
+    header = None
+    row = 0
+    async for line in lines:
+        if not line.strip():
+            continue
+        if fmt == "csv":
+            values = next(csv.reader([line]))
+            if header is None:
+                header = [name.strip() for name in values]
+                continue
+            row += 1
+            # CSV can't say null; a blank cell means "not given"
+            yield row, {name: value if value != "" else None
+                        for name, value in zip(header, values)}
+        else:
+            row += 1
+            try:
+                yield row, json.loads(line)
+            except ValueError as exc:
+                yield row, exc
+
+
+def validate_chunk(
+    records: List[Tuple[int, object]]
+) -> Tuple[List[Tuple[int, dict]], List[dict]]:
+    """Validate raw records with LodgingCreate; returns (rows, errors)"""
+    valid, errors = [], []
+    for row, record in records:
+        if isinstance(record, ValueError):
+            errors.append({"row": row, "errors": [f"Invalid JSON: {record}"]})
+            continue
+        try:
+            lodging = LodgingCreate.model_validate(record)
+        except ValidationError as exc:
+            errors.append({
+                "row": row,
+                "errors": [
+                    f"{'.'.join(str(p) for p in err['loc']) or 'row'}: "
+                    f"{err['msg']}"
+                    for err in exc.errors()
+                ],
+            })
+            continue
+        valid.append((row, lodging.model_dump()))
+    return valid, errors
+
+
+# COPY's NULL marker. It only counts unquoted, and every string is
+# written quoted, so "" and even "\\N" stay strings.
+COPY_NULL = "\\N"
+
+
+def _copy_value(value) -> str:
+    if value is None:
+        return COPY_NULL
+    if isinstance(value, str):
+        return '"' + value.replace('"', '""') + '"'
+    return str(value)
+
+
+def _copy_rows(db: Session, rows: List[Dict]):
+    """Postgres COPY ... FROM STDIN through psycopg2"""
+    buffer = io.StringIO()
+    for values in rows:
+        buffer.write(",".join(
+            _copy_value(values[column]) for column in COPY_COLUMNS
+        ))
+        buffer.write("\n")
+    buffer.seek(0)
+
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY lodgings ({', '.join(COPY_COLUMNS)}) "
+            f"FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')",
+            buffer,
+        )
+    finally:
+        cursor.close()
+
+
+def insert_chunk(db: Session, rows: List[Tuple[int, dict]]) -> List[dict]:
+    """
+    Insert one validated chunk in a single transaction. Uses COPY on
+    psycopg2 and a single executemany INSERT everywhere else. Returns the
+    per-row errors if the chunk had to be rolled back.
+    """
+    if not rows:
+        return []
+
+    dialect = db.get_bind().dialect
+    # created_at/updated_at defaults and the geohash are ORM-side, so
+    # COPY and the Core INSERT need them set; the timestamps from the
+    # database's clock, as for rows created one at a time
+    now = db.execute(select(func.now())).scalar()
+    values = [{**data, "created_at": now, "updated_at": now,
+               "geohash": lodging_geohash(data["latitude"],
+                                          data["longitude"])}
+              for _, data in rows]
+
+    try:
+        if dialect.driver == "psycopg2":
+            _copy_rows(db, values)
+        else:
+            db.execute(insert(Lodging), values)
+        db.commit()
+    except (SQLAlchemyError, dialect.loaded_dbapi.Error) as exc:
+        db.rollback()
+        message = f"Database error: {exc.__class__.__name__}"
+        return [{"row": row, "errors": [message]} for row, _ in rows]
+    invalidate_facets()
+    return []
+
+
+async def import_lodgings(
+    db, body: AsyncIterator[bytes], fmt: str, chunk_size: int
+) -> dict:
+    """
+    Stream ``body`` into lodgings, ``chunk_size`` rows at a time, so only
+    one chunk is ever held in memory. Returns counts and per-row errors.
+    """
+    inserted = 0
+    errors: List[dict] = []
+
+    async def flush(records):
+        nonlocal inserted
+        valid, invalid = validate_chunk(records)
+        errors.extend(invalid)
+        failed = await run_db(db, insert_chunk, valid)
+        errors.extend(failed)
+        inserted += len(valid) - len(failed)
+
+    chunk = []
+    async for record in iter_records(iter_lines(body), fmt):
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            await flush(chunk)
+            chunk = []
+    if chunk:
+        await flush(chunk)
+
+    errors.sort(key=lambda error: error["row"])
+    return {"inserted": inserted, "failed": len(errors), "errors": errors}
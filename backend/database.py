@@ -1,10 +1,21 @@
 import os
-from sqlalchemy import create_engine
+import sqlite3
+from typing import Callable, Dict, Tuple
+from sqlalchemy import create_engine, event, make_url
+from sqlalchemy.dialects.sqlite.aiosqlite import (
+    AsyncAdapt_aiosqlite_connection
+)
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import (
+    AsyncSession, async_sessionmaker, create_async_engine
+)
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import sessionmaker, declarative_base
-from dotenv import load_dotenv
-
-# ✅ Load environment variables
-load_dotenv()
+from sqlalchemy.sql.functions import now
+from fastapi.concurrency import run_in_threadpool
+from backend.settings import env_bool
+from backend.pooling import pool_options, pool_stats
+from backend.slow_queries import SLOW_QUERY_MS, slow_query_log
 
 # ✅ Get database URL from environment or use default
 DATABASE_URL = os.getenv(
@@ -15,13 +26,80 @@ DATABASE_URL = os.getenv(
     )
 )
 
+# ✅ DATABASE_ASYNC=true serves requests from an async engine (asyncpg /
+# aiosqlite), so concurrency is bounded by the pool, not the threadpool
+DATABASE_ASYNC = env_bool("DATABASE_ASYNC")
+
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def async_database_url(url: str) -> str:
+    """Swap the sync DBAPI of ``url`` for its async counterpart"""
+    url = make_url(url)
+    drivername = ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername)
+    return url.set(drivername=drivername).render_as_string(
+        hide_password=False
+    )
+
 
-# ✅ Create database engine
-engine = create_engine(DATABASE_URL)
+# ✅ Create database engine (pool settings come from DB_POOL_* env vars)
+engine = create_engine(DATABASE_URL, **pool_options(DATABASE_URL))
 
 # ✅ Create a configured "Session" class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# ✅ Async engine and sessions, only built in async mode
+async_engine = (
+    create_async_engine(
+        async_database_url(DATABASE_URL),
+        **pool_options(DATABASE_URL, is_async=True),
+    )
+    if DATABASE_ASYNC else None
+)
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False
+)
+
+# ✅ Opt-in slow-query log (SLOW_QUERY_MS), see backend/slow_queries.py
+if SLOW_QUERY_MS:
+    slow_query_log.install(engine)
+    if async_engine is not None:
+        slow_query_log.install(async_engine.sync_engine)
+
+
+# ✅ SQLite's CURRENT_TIMESTAMP has whole seconds only; updated_at feeds
+# ETags, so func.now() keeps the milliseconds there (in the same
+# six-digit layout SQLAlchemy stores bound datetimes in)
+@compiles(now, "sqlite")
+def _sqlite_now(element, compiler, **kw):
+    return "STRFTIME('%Y-%m-%d %H:%M:%f000', 'now')"
+
+
+# ✅ Python functions SQLite queries can call (PostgreSQL has native
+# equivalents): name -> (number of arguments, function)
+SQLITE_FUNCTIONS: Dict[str, Tuple[int, Callable]] = {}
+
+
+def sqlite_function(name: str, arity: int):
+    """Register the decorated function on every SQLite connection"""
+    def register(fn: Callable) -> Callable:
+        SQLITE_FUNCTIONS[name] = (arity, fn)
+        return fn
+    return register
+
+
+@event.listens_for(Engine, "connect")
+def _register_sqlite_functions(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, (sqlite3.Connection,
+                                     AsyncAdapt_aiosqlite_connection)):
+        for name, (arity, fn) in SQLITE_FUNCTIONS.items():
+            dbapi_connection.create_function(name, arity, fn,
+                                             deterministic=True)
+
+
 # ✅ Base class for SQLAlchemy models
 Base = declarative_base()
 
@@ -34,3 +112,32 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# ✅ Request-scoped session for the configured engine mode
+get_session = get_async_db if DATABASE_ASYNC else get_db
+
+
+async def run_db(db, fn, *args, **kwargs):
+    """
+    Call ``fn(session, *args, **kwargs)`` with ordinary sync ORM code.
+
+    On an AsyncSession it runs through ``run_sync`` on the event loop;
+    on a sync Session it runs in the threadpool, as sync routes did.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
+
+
+def pool_status() -> dict:
+    """Connection pool statistics of every engine in use"""
+    status = {"sync": pool_stats(engine.pool)}
+    if async_engine is not None:
+        status["async"] = pool_stats(async_engine.pool)
+    return status
@@ -0,0 +1,161 @@
+import os
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Query, Session
+
+from backend.cache import TTLCache
+from backend.models import Lodging
+
+FACETS = ("location", "price", "availability")
+
+# Lower bounds of the price buckets; the last one is open-ended
+PRICE_BUCKETS = (0, 50, 100, 150, 200, 300)
+
+# Locations beyond the most frequent ones are left out of the facet
+FACET_LOCATION_LIMIT = 50
+
+# count=approximate aggregates at most this many matching rows and, on
+# Postgres, scales the counts to the planner's row estimate
+FACET_SAMPLE_ROWS = int(os.getenv("FACET_SAMPLE_ROWS", "10000"))
+
+# Facets per filters. A lodging write clears the cache of the worker
+# that made it; other workers catch up within FACET_CACHE_TTL_SECONDS.
+FACET_CACHE_SIZE = int(os.getenv("FACET_CACHE_SIZE", "1000"))
+FACET_CACHE_TTL_SECONDS = float(os.getenv("FACET_CACHE_TTL_SECONDS", "30"))
+
+facet_cache = TTLCache(FACET_CACHE_SIZE, FACET_CACHE_TTL_SECONDS)
+
+
+def invalidate_facets():
+    """Call after committing a lodging write"""
+    facet_cache.clear()
+
+
+def parse_facets(facets: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """Validate ``?facets=a,b``; returns the names in FACETS order"""
+    if facets is None:
+        return None
+    wanted = {name.strip() for name in facets.split(",")} - {""}
+    unknown = wanted - set(FACETS)
+    if unknown or not wanted:
+        raise HTTPException(
+            status_code=400,
+            detail=(f"Unknown facet(s): {', '.join(sorted(unknown))}"
+                    if unknown else "facets must not be empty"),
+        )
+    return tuple(name for name in FACETS if name in wanted)
+
+
+def _price_bucket():
+    """Index into PRICE_BUCKETS of each lodging's price"""
+    return case(
+        *(
+            (Lodging.price_per_night >= bound, index)
+            for index, bound in reversed(list(enumerate(PRICE_BUCKETS)))
+            if index
+        ),
+        else_=0,
+    )
+
+
+COLUMNS = {
+    "location": lambda: Lodging.location,
+    "price": _price_bucket,
+    "availability": lambda: Lodging.availability,
+}
+
+
+def _grouped(db: Session, query: Query, names: Tuple[str, ...],
+             limit: Optional[int] = None) -> List[tuple]:
+    """(facet values..., count) rows of one GROUP BY over the matches"""
+    matches = query.order_by(None).with_entities(
+        *(COLUMNS[name]().label(name) for name in names)
+    )
+    if limit is not None:
+        matches = matches.limit(limit)
+    matches = matches.subquery()
+    columns = [matches.c[name] for name in names]
+    return db.execute(
+        select(*columns, func.count()).group_by(*columns)
+    ).all()
+
+
+def estimated_rows(db: Session, query: Query) -> Optional[int]:
+    """The planner's row estimate for ``query`` (Postgres only)"""
+    connection = db.connection()
+    if connection.dialect.name != "postgresql":
+        return None
+    compiled = query.order_by(None).statement.compile(
+        dialect=connection.dialect
+    )
+    parameters = compiled.params
+    if compiled.positional:
+        parameters = tuple(parameters[name] for name in compiled.positiontup)
+    plan = connection.exec_driver_sql(
+        "EXPLAIN (FORMAT JSON) " + str(compiled), parameters
+    ).scalar()
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def compute_facets(db: Session, query: Query, names: Tuple[str, ...],
+                   approximate: bool = False) -> dict:
+    """
+    Total and per-facet counts of the rows ``query`` matches, all from
+    one grouped query over the requested facet columns.
+
+    With ``approximate`` the aggregate stops after FACET_SAMPLE_ROWS
+    rows; when there are more, Postgres' row estimate stands in for the
+    total and the counts are scaled to it. Other databases have no
+    estimate and fall back to the exact query.
+    """
+    rows = None
+    scale, estimated = 1.0, False
+    if approximate:
+        rows = _grouped(db, query, names, FACET_SAMPLE_ROWS)
+        sampled = sum(row[-1] for row in rows)
+        if sampled >= FACET_SAMPLE_ROWS:
+            total = estimated_rows(db, query)
+            if total is None:
+                rows = None
+            else:
+                scale, estimated = max(total, sampled) / sampled, True
+    if rows is None:
+        rows = _grouped(db, query, names)
+
+    counts: Dict[str, Dict] = {name: {} for name in names}
+    for row in rows:
+        count = row[-1] * scale
+        for name, value in zip(names, row):
+            counts[name][value] = counts[name].get(value, 0) + count
+
+    facets = {}
+    if "location" in counts:
+        top = sorted(counts["location"].items(),
+                     key=lambda item: (-item[1], item[0]))
+        facets["location"] = [
+            {"value": value, "count": round(count)}
+            for value, count in top[:FACET_LOCATION_LIMIT]
+        ]
+    if "price" in counts:
+        facets["price"] = [
+            {
+                "min": bound,
+                "max": (PRICE_BUCKETS[index + 1]
+                        if index + 1 < len(PRICE_BUCKETS) else None),
+                "count": round(counts["price"].get(index, 0)),
+            }
+            for index, bound in enumerate(PRICE_BUCKETS)
+        ]
+    if "availability" in counts:
+        facets["availability"] = [
+            {"value": value, "count": round(count)}
+            for value, count in sorted(counts["availability"].items(),
+                                       key=lambda item: item[0] is not True)
+        ]
+    return {
+        "total": round(sum(row[-1] for row in rows) * scale),
+        "total_is_estimate": estimated,
+        "facets": facets,
+    }
@@ -0,0 +1,66 @@
+from functools import lru_cache
+from typing import Iterable, List, Optional, Sequence, Tuple, Type
+
+from fastapi import HTTPException
+from pydantic import BaseModel, create_model
+from sqlalchemy import inspect
+from sqlalchemy.orm import load_only
+from sqlalchemy.orm.descriptor_props import SynonymProperty
+
+
+def parse_fields(fields: Optional[str],
+                 schema: Type[BaseModel]) -> Optional[Tuple[str, ...]]:
+    """
+    Validate a ``?fields=a,b`` list against ``schema``. Returns the names
+    in schema order, or None when every field is wanted.
+    """
+    if fields is None:
+        return None
+    wanted = {name.strip() for name in fields.split(",")} - {""}
+    unknown = wanted - schema.model_fields.keys()
+    if unknown or not wanted:
+        raise HTTPException(
+            status_code=400,
+            detail=(f"Unknown field(s): {', '.join(sorted(unknown))}"
+                    if unknown else "fields must not be empty"),
+        )
+    return tuple(name for name in schema.model_fields if name in wanted)
+
+
+def _column(model, name: str):
+    """Mapped column attribute for ``name``, following synonyms"""
+    prop = inspect(model).attrs[name]
+    if isinstance(prop, SynonymProperty):
+        prop = inspect(model).attrs[prop.name]
+    return getattr(model, prop.key)
+
+
+def load_only_fields(model, fields: Iterable[str]):
+    """A load_only() option that SELECTs just ``fields`` (plus the PK)"""
+    return load_only(*(_column(model, name) for name in fields))
+
+
+@lru_cache(maxsize=128)
+def partial_model(schema: Type[BaseModel],
+                  fields: Tuple[str, ...]) -> Type[BaseModel]:
+    """``schema`` cut down to ``fields``, keeping their types"""
+    return create_model(
+        f"{schema.__name__}Fields",
+        **{name: (schema.model_fields[name].annotation, ...)
+           for name in fields},
+    )
+
+
+def dump_fields(rows: Sequence, schema: Type[BaseModel],
+                fields: Tuple[str, ...]) -> List[dict]:
+    """
+    JSON-ready dicts of ``fields`` only. Values go through the schema's
+    own types, so they render exactly as in the full response.
+    """
+    partial = partial_model(schema, fields)
+    return [
+        partial.model_validate(
+            {name: getattr(row, name) for name in fields}
+        ).model_dump(mode="json")
+        for row in rows
+    ]
@@ -0,0 +1,253 @@
+import math
+from typing import List, Optional, Tuple
+
+from sqlalchemy import DDL, and_, event, func, literal_column, or_
+from sqlalchemy.orm import Query, Session
+
+from backend.database import sqlite_function
+from backend.models import Lodging
+from backend.settings import env_bool
+
+# GEO_POSTGIS=true: radius and nearest searches on Postgres use PostGIS
+# and a GiST index (the extension must be installable). Otherwise, and
+# on SQLite, they use the geohash column and its B-tree index.
+GEO_POSTGIS = env_bool("GEO_POSTGIS")
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Stored precision: 9 characters is a cell of about 5 x 5 m
+GEOHASH_PRECISION = 9
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# A radius search covers its circle with at most this many cells; fewer,
+# larger cells mean fewer index ranges but more rows to check exactly
+MAX_COVER_CELLS = 64
+
+# Nearest-k searches without PostGIS widen the radius from here, by
+# NEAREST_GROWTH each step, until enough lodgings fall inside
+NEAREST_START_KM = 10.0
+NEAREST_GROWTH = 4.0
+
+# Postgres + PostGIS: the geography of each lodging, indexed with GiST.
+# The SRID is inlined so the query expression matches the index one.
+POSTGIS_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS postgis",
+    """
+    CREATE INDEX IF NOT EXISTS ix_lodgings_geography ON lodgings
+    USING gist ((geography(ST_SetSRID(ST_MakePoint(longitude, latitude),
+                                      4326))))
+    """,
+]
+
+for statement in POSTGIS_DDL:
+    event.listen(
+        Lodging.__table__, "after_create",
+        DDL(statement).execute_if(
+            dialect="postgresql", callable_=lambda *args, **kw: GEO_POSTGIS
+        ),
+    )
+
+
+def encode_geohash(latitude: float, longitude: float,
+                   precision: int = GEOHASH_PRECISION) -> str:
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        # Bits alternate between longitude (first) and latitude
+        span, coordinate = (lon_range, longitude) if even else (
+            lat_range, latitude
+        )
+        middle = (span[0] + span[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            span[0] = middle
+        else:
+            span[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits, value = 0, 0
+    return "".join(chars)
+
+
+def lodging_geohash(latitude: Optional[float],
+                    longitude: Optional[float]) -> Optional[str]:
+    if latitude is None or longitude is None:
+        return None
+    return encode_geohash(latitude, longitude)
+
+
+@event.listens_for(Lodging, "before_insert")
+@event.listens_for(Lodging, "before_update")
+def _set_geohash(mapper, connection, target):
+    target.geohash = lodging_geohash(target.latitude, target.longitude)
+
+
+@sqlite_function("haversine_km", 4)
+def haversine_km(lat1: Optional[float], lon1: Optional[float],
+                 lat2: Optional[float], lon2: Optional[float]
+                 ) -> Optional[float]:
+    """Great-circle distance; NULL if either point is missing"""
+    if None in (lat1, lon1, lat2, lon2):
+        return None
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2)
+         * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _cell_size(precision: int) -> Tuple[float, float]:
+    """(height, width) in degrees of a geohash cell"""
+    bits = 5 * precision
+    return 180.0 / 2 ** (bits // 2), 360.0 / 2 ** ((bits + 1) // 2)
+
+
+def _bounding_box(latitude: float, longitude: float,
+                  radius_km: float) -> Tuple[float, float, float, float]:
+    """(min lat, max lat, min lon, max lon) around the circle"""
+    delta = radius_km / EARTH_RADIUS_KM
+    phi = math.radians(latitude)
+    min_lat = math.degrees(phi - delta)
+    max_lat = math.degrees(phi + delta)
+    if min_lat <= -90 or max_lat >= 90:
+        # The circle contains a pole: every longitude
+        return max(min_lat, -90.0), min(max_lat, 90.0), -180.0, 180.0
+    spread = math.degrees(math.asin(math.sin(delta) / math.cos(phi)))
+    return min_lat, max_lat, longitude - spread, longitude + spread
+
+
+def covering_cells(latitude: float, longitude: float,
+                   radius_km: float) -> List[str]:
+    """
+    Geohash prefixes whose cells together cover the circle, at the
+    finest precision that needs at most MAX_COVER_CELLS of them. An
+    empty list means the circle is too large to be worth narrowing.
+    """
+    min_lat, max_lat, min_lon, max_lon = _bounding_box(
+        latitude, longitude, radius_km
+    )
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = _cell_size(precision)
+        rows = range(int((min_lat + 90) // height),
+                     int(min((max_lat + 90) // height,
+                             180 / height - 1)) + 1)
+        columns = int(360 / width)
+        first = int((min_lon + 180) // width)
+        count = min(int((max_lon + 180) // width) - first + 1, columns)
+        if len(rows) * count > MAX_COVER_CELLS:
+            continue
+        return sorted({
+            encode_geohash(
+                (row + 0.5) * height - 90,
+                ((first + column) % columns + 0.5) * width - 180,
+                precision,
+            )
+            for row in rows for column in range(count)
+        })
+    return []
+
+
+def _prefix_end(prefix: str) -> Optional[str]:
+    """Smallest string after every string starting with ``prefix``"""
+    while prefix:
+        position = GEOHASH_ALPHABET.index(prefix[-1])
+        if position + 1 < len(GEOHASH_ALPHABET):
+            return prefix[:-1] + GEOHASH_ALPHABET[position + 1]
+        prefix = prefix[:-1]
+    return None
+
+
+def geohash_ranges(cells: List[str]) -> List[Tuple[str, Optional[str]]]:
+    """[start, end) ranges of the sorted cells, adjacent ones merged"""
+    ranges: List[Tuple[str, Optional[str]]] = []
+    for cell in sorted(cells):
+        end = _prefix_end(cell)
+        if ranges and ranges[-1][1] == cell:
+            ranges[-1] = (ranges[-1][0], end)
+        else:
+            ranges.append((cell, end))
+    return ranges
+
+
+def _postgis_point(latitude: float, longitude: float):
+    return func.geography(func.ST_SetSRID(
+        func.ST_MakePoint(longitude, latitude), literal_column("4326")
+    ))
+
+
+def _uses_postgis(db: Session) -> bool:
+    return GEO_POSTGIS and db.get_bind().dialect.name == "postgresql"
+
+
+def distance_km(db: Session, latitude: float, longitude: float):
+    """SQL expression: km from each lodging to the given point"""
+    if _uses_postgis(db):
+        return func.ST_Distance(
+            _postgis_point(Lodging.latitude, Lodging.longitude),
+            _postgis_point(latitude, longitude),
+        ) / 1000.0
+    if db.get_bind().dialect.name == "sqlite":
+        return func.haversine_km(
+            Lodging.latitude, Lodging.longitude, latitude, longitude
+        )
+    phi1, phi2 = func.radians(Lodging.latitude), math.radians(latitude)
+    a = (func.power(func.sin((phi2 - phi1) / 2), 2)
+         + func.cos(phi1) * math.cos(phi2)
+         * func.power(func.sin(
+             func.radians(longitude - Lodging.longitude) / 2), 2))
+    return 2 * EARTH_RADIUS_KM * func.asin(func.sqrt(a))
+
+
+def within_radius(db: Session, latitude: float, longitude: float,
+                  radius_km: float):
+    """
+    Filter for lodgings within ``radius_km`` of the point: an index
+    range scan per group of covering cells, then the exact distance.
+    """
+    if _uses_postgis(db):
+        return func.ST_DWithin(
+            _postgis_point(Lodging.latitude, Lodging.longitude),
+            _postgis_point(latitude, longitude),
+            radius_km * 1000.0,
+        )
+    ranges = [
+        Lodging.geohash >= start if end is None
+        else and_(Lodging.geohash >= start, Lodging.geohash < end)
+        for start, end in geohash_ranges(
+            covering_cells(latitude, longitude, radius_km)
+        )
+    ]
+    cells = or_(*ranges) if ranges else Lodging.geohash.isnot(None)
+    return and_(cells, distance_km(db, latitude, longitude) <= radius_km)
+
+
+def nearest(db: Session, query: Query, latitude: float, longitude: float,
+            wanted: int) -> Query:
+    """
+    Restrict ``query`` to a neighbourhood of the point holding at least
+    ``wanted`` of its lodgings (or all of them); order by distance.
+
+    PostGIS orders by the GiST index's KNN distance directly. Otherwise
+    the radius grows until enough lodgings fall inside, each probe a
+    bounded COUNT over the geohash ranges.
+    """
+    if _uses_postgis(db):
+        knn = _postgis_point(Lodging.latitude, Lodging.longitude).op("<->")(
+            _postgis_point(latitude, longitude)
+        )
+        return query.filter(Lodging.geohash.isnot(None)).order_by(knn)
+
+    radius_km = NEAREST_START_KM
+    while radius_km < math.pi * EARTH_RADIUS_KM:
+        criterion = within_radius(db, latitude, longitude, radius_km)
+        if query.filter(criterion).limit(wanted).count() >= wanted:
+            break
+        radius_km *= NEAREST_GROWTH
+    else:
+        criterion = Lodging.geohash.isnot(None)
+    return query.filter(criterion).order_by(
+        distance_km(db, latitude, longitude)
+    )
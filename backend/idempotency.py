@@ -0,0 +1,342 @@
+import asyncio
+import hashlib
+import itertools
+import os
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Union
+
+import orjson
+from jose import JWTError
+from sqlalchemy import delete, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from backend.auth import decode_token
+from backend.cache import TTLCache
+from backend.database import (
+    DATABASE_ASYNC, AsyncSessionLocal, SessionLocal, run_db
+)
+from backend.models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = "idempotency-key"
+REPLAYED_HEADER = "idempotent-replayed"
+
+# Create endpoints that honour the header, as (method, path)
+IDEMPOTENT_ROUTES = frozenset({("POST", "/bookings/"), ("POST", "/lodgings/")})
+
+MAX_KEY_LENGTH = 255
+
+# How long a stored response is replayed for
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+# A request still unanswered after this long is presumed lost (its worker
+# died) and a retry may run it again
+IDEMPOTENCY_LOCK_SECONDS = float(
+    os.getenv("IDEMPOTENCY_LOCK_SECONDS", "60")
+)
+# Retries of a request another worker is serving poll its key this often
+IDEMPOTENCY_POLL_SECONDS = float(
+    os.getenv("IDEMPOTENCY_POLL_SECONDS", "0.05")
+)
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+# Expired keys are deleted once every this many claims
+IDEMPOTENCY_PURGE_EVERY = int(os.getenv("IDEMPOTENCY_PURGE_EVERY", "1000"))
+
+
+@dataclass(frozen=True)
+class StoredResponse:
+    fingerprint: str
+    status_code: int
+    content_type: Optional[str]
+    body: bytes
+
+
+# Front of the idempotency_keys table: completed responses by key
+response_cache = TTLCache(IDEMPOTENCY_CACHE_SIZE, IDEMPOTENCY_TTL_SECONDS)
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _sha256(*parts: Union[str, bytes]) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode() if isinstance(part, str) else part)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _principal(headers: Dict[str, str]) -> Optional[str]:
+    """The user a bearer token belongs to; None if there is no valid one"""
+    scheme, _, token = headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        claims = decode_token(token)
+    except JWTError:
+        return None
+    principal = claims.get("uid", claims.get("sub"))
+    return None if principal is None else str(principal)
+
+
+def _stored(row: IdempotencyKey) -> Optional[StoredResponse]:
+    if row.status_code is None:
+        return None
+    return StoredResponse(row.fingerprint, row.status_code, row.content_type,
+                          row.body)
+
+
+def _claim(db: Session, key: str,
+           fingerprint: str) -> Optional[IdempotencyKey]:
+    """
+    Insert an in-progress row for ``key``. Returns None once the caller
+    owns the key, else the live row that got there first.
+    """
+    now = _now()
+    row = db.get(IdempotencyKey, key)
+    if row is not None:
+        if row.expires_at > now:
+            return row
+        db.delete(row)
+        db.flush()
+    db.add(IdempotencyKey(
+        key=key, fingerprint=fingerprint, created_at=now,
+        expires_at=now + timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS),
+    ))
+    try:
+        db.commit()
+    except IntegrityError:
+        # A request on another worker claimed it in between
+        db.rollback()
+        return db.get(IdempotencyKey, key)
+    return None
+
+
+def _complete(db: Session, key: str, response: StoredResponse):
+    now = _now()
+    db.execute(
+        update(IdempotencyKey)
+        .where(IdempotencyKey.key == key,
+               IdempotencyKey.fingerprint == response.fingerprint,
+               IdempotencyKey.status_code.is_(None))
+        .values(status_code=response.status_code,
+                content_type=response.content_type,
+                body=response.body,
+                expires_at=now + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS))
+    )
+    db.commit()
+
+
+def _release(db: Session, key: str, fingerprint: str):
+    """Drop an unfinished claim so a retry runs the request again"""
+    db.execute(
+        delete(IdempotencyKey)
+        .where(IdempotencyKey.key == key,
+               IdempotencyKey.fingerprint == fingerprint,
+               IdempotencyKey.status_code.is_(None))
+    )
+    db.commit()
+
+
+def purge_expired_keys(db: Session) -> int:
+    """Delete expired keys and claims; returns how many went"""
+    deleted = db.execute(
+        delete(IdempotencyKey).where(IdempotencyKey.expires_at <= _now())
+    ).rowcount
+    db.commit()
+    return deleted
+
+
+async def _in_session(fn, *args):
+    """Run ``fn(session, *args)`` on a session of its own, so the key
+    store commits apart from the request's transaction"""
+    if DATABASE_ASYNC:
+        async with AsyncSessionLocal() as db:
+            return await run_db(db, fn, *args)
+    db = SessionLocal()
+    try:
+        return await run_db(db, fn, *args)
+    finally:
+        db.close()
+
+
+REUSED_KEY = "Idempotency-Key was already used for a different request"
+
+
+def _error(status_code: int, detail: str) -> StoredResponse:
+    return StoredResponse("", status_code, "application/json",
+                          orjson.dumps({"detail": detail}))
+
+
+async def _send(send, response: StoredResponse, replayed: bool = False):
+    headers = [(b"content-length", str(len(response.body)).encode())]
+    if response.content_type is not None:
+        headers.append((b"content-type", response.content_type.encode()))
+    if replayed:
+        headers.append((REPLAYED_HEADER.encode(), b"true"))
+    await send({"type": "http.response.start",
+                "status": response.status_code, "headers": headers})
+    await send({"type": "http.response.body", "body": response.body})
+
+
+async def _replay(send, stored: StoredResponse, fingerprint: str):
+    if stored.fingerprint != fingerprint:
+        await _send(send, _error(422, REUSED_KEY))
+    else:
+        await _send(send, stored, replayed=True)
+
+
+class IdempotencyMiddleware:
+    """
+    Pure ASGI middleware making the create endpoints safe to retry.
+
+    A request to one of IDEMPOTENT_ROUTES with an ``Idempotency-Key``
+    header is keyed by user, route and that key. The first one runs and
+    its successful response is stored (idempotency_keys, fronted by an
+    in-memory cache); later ones get the stored response back with an
+    ``Idempotent-Replayed: true`` header, before routing, so neither
+    validation nor the write path runs again. Duplicates arriving while
+    the first is still running wait for it: on the same worker through
+    a shared future, on other workers by polling its claim row.
+
+    Only 2xx responses are kept. After an error the key is released,
+    and retries, waiting duplicates included, run for real. Reusing a
+    key with a different body is a 422.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._claims = itertools.count(1)
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or (scope["method"], scope["path"]) not in IDEMPOTENT_ROUTES
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        headers = {name.decode("latin-1"): value.decode("latin-1")
+                   for name, value in scope["headers"]}
+        client_key = headers.get(IDEMPOTENCY_HEADER)
+        principal = _principal(headers)
+        if client_key is None or principal is None:
+            # No key, or unauthenticated: the route answers as usual
+            await self.app(scope, receive, send)
+            return
+        if not 0 < len(client_key) <= MAX_KEY_LENGTH:
+            await _send(send, _error(
+                400, f"Idempotency-Key must be 1-{MAX_KEY_LENGTH} characters"
+            ))
+            return
+
+        body = await _read_body(receive)
+        key = _sha256(principal, scope["method"], scope["path"], client_key)
+        fingerprint = _sha256(scope["query_string"], body)
+
+        while True:
+            stored = response_cache.get(key)
+            if stored is None:
+                leader = self._in_flight.get(key)
+                if leader is not None:
+                    stored = await asyncio.shield(leader)
+                elif await self._lead(scope, body, receive, send, key,
+                                      fingerprint):
+                    return
+                else:
+                    stored = response_cache.get(key)
+                if stored is None:
+                    # The first request failed, or another worker is
+                    # still serving it: look again
+                    continue
+            await _replay(send, stored, fingerprint)
+            return
+
+    async def _lead(self, scope, body: bytes, receive, send, key: str,
+                    fingerprint: str) -> bool:
+        """
+        Claim ``key`` and serve the request, with same-worker duplicates
+        waiting on this call. Returns whether the request was answered;
+        if not, a stored response is in the cache or the key is taken.
+
+        The waiters get the response to replay, or None (the request
+        failed, or is running elsewhere) to go through _claim again.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        shared = None
+        try:
+            if next(self._claims) % IDEMPOTENCY_PURGE_EVERY == 0:
+                await _in_session(purge_expired_keys)
+            row = await _in_session(_claim, key, fingerprint)
+            if row is None:
+                shared = await self._serve(scope, body, receive, send, key,
+                                           fingerprint)
+                return True
+            shared = _stored(row)
+            if shared is not None:
+                response_cache.set(key, shared)
+                return False
+            if row.fingerprint != fingerprint:
+                await _send(send, _error(422, REUSED_KEY))
+                return True
+            # Still being served on another worker
+            await asyncio.sleep(IDEMPOTENCY_POLL_SECONDS)
+            return False
+        finally:
+            del self._in_flight[key]
+            future.set_result(shared)
+
+    async def _serve(self, scope, body: bytes, receive, send, key: str,
+                     fingerprint: str) -> Optional[StoredResponse]:
+        """Run the request; returns its response if it was stored"""
+        status_code, content_type, chunks = 500, None, []
+        body_sent = False
+
+        async def replay_body():
+            nonlocal body_sent
+            if body_sent:
+                # Only disconnects are left to wait for
+                return await receive()
+            body_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def capture(message):
+            nonlocal status_code, content_type
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                for name, value in message.get("headers", ()):
+                    if name.lower() == b"content-type":
+                        content_type = value.decode("latin-1")
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, replay_body, capture)
+        except BaseException:
+            await _in_session(_release, key, fingerprint)
+            raise
+
+        if not 200 <= status_code < 300:
+            await _in_session(_release, key, fingerprint)
+            return None
+        response = StoredResponse(fingerprint, status_code, content_type,
+                                  b"".join(chunks))
+        await _in_session(_complete, key, response)
+        response_cache.set(key, response)
+        return response
+
+
+async def _read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            break
+    return b"".join(chunks)
@@ -1,25 +1,78 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
-from backend.database import engine, Base
+from fastapi.responses import ORJSONResponse, PlainTextResponse
+from backend.database import async_engine, engine, pool_status
+from backend.idempotency import IdempotencyMiddleware
+from backend.metrics import MetricsMiddleware, render
 from backend.auth_routes import router as auth_router
 from backend.api.routers.lodging_router import router as lodging_router
 from backend.api.routers.booking_router import router as booking_router
+from backend.api.routers.report_router import router as report_router
+from backend.api.routers.admin_router import router as admin_router
 
-app = FastAPI()
-
-# Include your existing routers
-app.include_router(lodging_router, prefix="", tags=["Lodgings"])
-app.include_router(auth_router)
-app.include_router(booking_router)
 
-# Create DB tables (if not already existing)
-Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Nothing to do on startup: the schema is Alembic's job (``alembic
+    upgrade head`` before deploying) and the pools connect on first use.
+    On shutdown the pooled connections are closed.
+    """
+    yield
+    if async_engine is not None:
+        await async_engine.dispose()
+    engine.dispose()
 
 
-@app.get("/")
 def read_root():
     return {"message": "Welcome to the Workforce Lodging API"}
 
 
-@app.get("/health")
 def health_check():
     return {"status": "ok"}
+
+
+def pool_health():
+    """Live connection pool statistics for sizing pools per worker"""
+    return pool_status()
+
+
+def metrics():
+    """
+    Prometheus metrics: per-route latency, status codes, in-flight
+    requests, SQL statements and time per request, pool usage.
+    """
+    return PlainTextResponse(
+        render(pools=pool_status()),
+        media_type="text/plain; version=0.0.4",
+    )
+
+
+def create_app() -> FastAPI:
+    """
+    Build the API. Cheap and free of I/O, so importing this module or
+    spawning a worker does not touch the database.
+    """
+    # orjson for every JSON response; see backend/serialization.py
+    app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
+    # Replays of create requests are answered here, before routing
+    app.add_middleware(IdempotencyMiddleware)
+    app.add_middleware(MetricsMiddleware)
+
+    # Include your existing routers
+    app.include_router(lodging_router, prefix="", tags=["Lodgings"])
+    app.include_router(auth_router)
+    app.include_router(booking_router)
+    app.include_router(report_router)
+    app.include_router(admin_router)
+
+    app.get("/")(read_root)
+    app.get("/health")(health_check)
+    app.get("/health/pool")(pool_health)
+    app.get("/metrics", response_class=PlainTextResponse)(metrics)
+    return app
+
+
+# ``uvicorn backend.main:app``, or ``--factory backend.main:create_app``
+app = create_app()
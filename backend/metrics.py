@@ -0,0 +1,277 @@
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Upper bounds of the request latency buckets (seconds)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0)
+# Upper bounds of the SQL-statements-per-request buckets; a route whose
+# count grows with the page size is an N+1
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# Route label of requests no route matched (keeps label cardinality flat)
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+class RequestQueries:
+    """SQL statements issued on behalf of one request"""
+
+    __slots__ = ("scope", "count", "seconds")
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.count = 0
+        self.seconds = 0.0
+
+    @property
+    def route(self) -> str:
+        # The router stores the matched route in the shared scope
+        route = self.scope.get("route")
+        return getattr(route, "path", UNMATCHED_ROUTE)
+
+
+# Set by the middleware. Context variables follow the request into
+# run_in_threadpool and run_sync, so the engine events below see it.
+current_queries: ContextVar[Optional[RequestQueries]] = ContextVar(
+    "current_queries", default=None
+)
+
+
+def current_route() -> Optional[str]:
+    """The serving request as "METHOD /route/template", if any"""
+    queries = current_queries.get()
+    if queries is None:
+        return None
+    return f"{queries.scope['method']} {queries.route}"
+
+
+# Start times by cursor: a statement that fails never reaches
+# after_cursor_execute, so handle_error drops its entry instead
+@event.listens_for(Engine, "before_cursor_execute")
+def _query_started(conn, cursor, statement, parameters, context,
+                   executemany):
+    conn.info.setdefault("query_started", {})[id(cursor)] = (
+        time.perf_counter()
+    )
+
+
+def _record_query(started: float):
+    queries = current_queries.get()
+    if queries is not None:
+        queries.count += 1
+        queries.seconds += time.perf_counter() - started
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _query_finished(conn, cursor, statement, parameters, context,
+                    executemany):
+    _record_query(conn.info["query_started"].pop(id(cursor)))
+
+
+def failed_cursor(context):
+    """
+    The cursor of the statement a handle_error event is about, if any
+    (read from the execution context: ExceptionContext.cursor is unset)
+    """
+    execution = context.execution_context
+    if context.connection is None or execution is None:
+        return None
+    return getattr(execution, "cursor", None)
+
+
+@event.listens_for(Engine, "handle_error")
+def _query_failed(context):
+    cursor = failed_cursor(context)
+    if cursor is None:
+        return
+    started = context.connection.info.get("query_started", {}).pop(
+        id(cursor), None
+    )
+    # None: the error came after after_cursor_execute had counted it
+    if started is not None:
+        _record_query(started)
+
+
+class Histogram:
+    """Cumulative Prometheus-style histogram"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+# (method, route) label pairs
+Labels = Tuple[str, str]
+
+
+class MetricsRegistry:
+    """Every metric of the process, guarded by one lock"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.requests: Dict[Tuple[str, str, int], int] = {}
+        self.latency: Dict[Labels, Histogram] = {}
+        self.queries: Dict[Labels, Histogram] = {}
+        self.query_seconds: Dict[Labels, float] = {}
+
+    def started(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def finished(self, method: str, route: str, status: int,
+                 seconds: float, queries: RequestQueries):
+        labels = (method, route)
+        with self._lock:
+            self.in_flight -= 1
+            key = (method, route, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self.latency.setdefault(
+                labels, Histogram(LATENCY_BUCKETS)).observe(seconds)
+            self.queries.setdefault(
+                labels, Histogram(QUERY_COUNT_BUCKETS)).observe(queries.count)
+            self.query_seconds[labels] = (
+                self.query_seconds.get(labels, 0.0) + queries.seconds
+            )
+
+    def reset(self):
+        with self._lock:
+            self.requests.clear()
+            self.latency.clear()
+            self.queries.clear()
+            self.query_seconds.clear()
+
+
+registry = MetricsRegistry()
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware (BaseHTTPMiddleware would hide the context
+    variable from the endpoint and buffer streaming responses).
+    """
+
+    def __init__(self, app, metrics: MetricsRegistry = registry):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        queries = RequestQueries(scope)
+        token = current_queries.set(queries)
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        self.metrics.started()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            current_queries.reset(token)
+            self.metrics.finished(
+                scope["method"],
+                queries.route,
+                status,
+                time.perf_counter() - started,
+                queries,
+            )
+
+
+def _escape(value: str) -> str:
+    return (value.replace("\\", "\\\\").replace('"', '\\"')
+            .replace("\n", "\\n"))
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(
+        f'{name}="{_escape(str(value))}"' for name, value in labels.items()
+    ) + "}"
+
+
+def _histogram_lines(name: str, histograms: Dict[Labels, Histogram]):
+    for (method, route), histogram in sorted(histograms.items()):
+        running = 0
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            running += count
+            yield (f"{name}_bucket"
+                   f"{_labels(method=method, route=route, le=bound)} "
+                   f"{running}")
+        running += histogram.counts[-1]
+        yield (f"{name}_bucket"
+               f"{_labels(method=method, route=route, le='+Inf')} "
+               f"{running}")
+        yield f"{name}_sum{_labels(method=method, route=route)} " \
+              f"{histogram.sum}"
+        yield f"{name}_count{_labels(method=method, route=route)} " \
+              f"{running}"
+
+
+def render(metrics: MetricsRegistry = registry,
+           pools: Optional[dict] = None) -> str:
+    """Prometheus text exposition format (version 0.0.4)"""
+    with metrics._lock:
+        lines = [
+            "# HELP http_requests_in_flight Requests being served.",
+            "# TYPE http_requests_in_flight gauge",
+            f"http_requests_in_flight {metrics.in_flight}",
+            "# HELP http_requests_total Requests served.",
+            "# TYPE http_requests_total counter",
+        ]
+        for (method, route, status), count in sorted(
+            metrics.requests.items()
+        ):
+            lines.append(
+                f"http_requests_total"
+                f"{_labels(method=method, route=route, status=status)} "
+                f"{count}"
+            )
+        lines += [
+            "# HELP http_request_duration_seconds Request latency.",
+            "# TYPE http_request_duration_seconds histogram",
+            *_histogram_lines("http_request_duration_seconds",
+                              metrics.latency),
+            "# HELP db_statements_per_request SQL statements per request.",
+            "# TYPE db_statements_per_request histogram",
+            *_histogram_lines("db_statements_per_request", metrics.queries),
+            "# HELP db_statement_seconds_total Time spent in SQL.",
+            "# TYPE db_statement_seconds_total counter",
+        ]
+        for (method, route), seconds in sorted(
+            metrics.query_seconds.items()
+        ):
+            lines.append(
+                f"db_statement_seconds_total"
+                f"{_labels(method=method, route=route)} {seconds}"
+            )
+
+    for name, help_text, key in (
+        ("db_pool_checked_out", "Connections in use.", "checked_out"),
+        ("db_pool_size", "Configured pool size.", "size"),
+        ("db_pool_overflow", "Overflow connections open.", "overflow"),
+    ):
+        values = [(engine, stats[key]) for engine, stats in
+                  (pools or {}).items() if key in stats]
+        if not values:
+            continue
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+        lines += [f"{name}{_labels(engine=engine)} {value}"
+                  for engine, value in values]
+    return "\n".join(lines) + "\n"
@@ -1,15 +1,34 @@
 from sqlalchemy import (
      Column, Integer, String, Enum,
-     Float, Boolean, Text, DateTime,
-     ForeignKey, func
+     Float, Boolean, Text, Date, DateTime, LargeBinary,
+     ForeignKey, Index, func
 )
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, synonym
 from backend.database import Base
 #  from datetime import datetime
 
 
 class Lodging(Base):
     __tablename__ = "lodgings"
+    __table_args__ = (
+        # Keyset pagination orderings, see backend/pagination.py
+        Index("ix_lodgings_created_at_id", "created_at", "id"),
+        Index("ix_lodgings_price_id", "price_per_night", "id"),
+        # The same orderings behind the availability filter
+        Index(
+            "ix_lodgings_availability_created_at_id",
+            "availability", "created_at", "id",
+        ),
+        Index(
+            "ix_lodgings_availability_price_id",
+            "availability", "price_per_night", "id",
+        ),
+        # Radius and nearest searches seek geohash ranges; see backend/geo.py
+        Index("ix_lodgings_geohash", "geohash"),
+    )
+    # Read the database's created_at/updated_at back with RETURNING
+    # rather than a SELECT once the row is used after a flush
+    __mapper_args__ = {"eager_defaults": True}
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
@@ -17,6 +36,10 @@ class Lodging(Base):
     price_per_night = Column(Float, nullable=False)
     availability = Column(Boolean, default=True)
     description = Column(Text, nullable=True)
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
+    # Derived from latitude/longitude on every write (backend/geo.py)
+    geohash = Column(String(12), nullable=True)
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
 
@@ -41,6 +64,29 @@ class User(Base):
 
 class Booking(Base):
     __tablename__ = "bookings"
+    __table_args__ = (
+        # Availability lookups seek on (lodging, check-in) and read
+        # check-out straight from the index; see backend/availability.py
+        Index(
+            "ix_bookings_lodging_dates",
+            "lodging_id", "check_in_date", "check_out_date",
+        ),
+        # Keyset pagination orderings, see backend/pagination.py
+        Index("ix_bookings_created_at_id", "created_at", "id"),
+        Index("ix_bookings_check_in_id", "check_in_date", "id"),
+        Index("ix_bookings_check_out_id", "check_out_date", "id"),
+        # get_bookings filters, in its default created_at order
+        Index(
+            "ix_bookings_user_created_at_id", "user_id", "created_at", "id"
+        ),
+        Index(
+            "ix_bookings_lodging_created_at_id",
+            "lodging_id", "created_at", "id",
+        ),
+        Index(
+            "ix_bookings_status_created_at_id", "status", "created_at", "id"
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -49,6 +95,10 @@ class Booking(Base):
     check_out_date = Column(DateTime, nullable=False)
     total_price = Column(Float, nullable=False)
 
+    # API-facing names used by the booking schemas
+    start_date = synonym("check_in_date")
+    end_date = synonym("check_out_date")
+
     # Status field: "pending", "confirmed", or "canceled"
     status = Column(
         Enum("pending", "confirmed", "canceled", name="booking_status"),
@@ -63,3 +113,52 @@ class Booking(Base):
     # Relationships
     lodging = relationship("Lodging", back_populates="bookings")
     user = relationship("User", back_populates="bookings")
+
+
+class LodgingDailyStats(Base):
+    """Booked nights and revenue per lodging and day (backend/occupancy.py)"""
+    __tablename__ = "lodging_daily_stats"
+
+    lodging_id = Column(
+        Integer, ForeignKey("lodgings.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    day = Column(Date, primary_key=True)
+    occupied = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0)
+
+
+class LodgingCalendar(Base):
+    """Booked nights of a lodging, one bit per day of ``year``
+    (backend/booking_calendar.py)"""
+    __tablename__ = "lodging_calendars"
+
+    lodging_id = Column(
+        Integer, ForeignKey("lodgings.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    year = Column(Integer, primary_key=True)
+    nights = Column(LargeBinary, nullable=False)
+
+
+class IdempotencyKey(Base):
+    """Stored response of a create request sent with an Idempotency-Key
+    header (backend/idempotency.py)"""
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (
+        # Expired keys are purged in bulk
+        Index("ix_idempotency_keys_expires_at", "expires_at"),
+    )
+
+    # sha256 of user, method, path and the client's key
+    key = Column(String(64), primary_key=True)
+    # sha256 of the request body, so a reused key can't change the request
+    fingerprint = Column(String(64), nullable=False)
+    # NULL while the first request is still being served
+    status_code = Column(Integer)
+    content_type = Column(String)
+    body = Column(LargeBinary)
+    created_at = Column(DateTime, nullable=False)
+    # Claims expire after IDEMPOTENCY_LOCK_SECONDS, responses after
+    # IDEMPOTENCY_TTL_SECONDS
+    expires_at = Column(DateTime, nullable=False)
@@ -0,0 +1,188 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import delete, event, func, inspect, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from backend.availability import INACTIVE_STATUSES, validate_date_range
+from backend.booking_calendar import apply_night_changes
+from backend.models import Booking, Lodging, LodgingDailyStats
+from backend.schemas import OccupancyDay, OccupancyReport
+
+# Booking columns that feed the aggregates
+TRACKED = ("lodging_id", "check_in_date", "check_out_date", "total_price",
+           "status")
+
+# (lodging_id, day) -> [occupied nights, revenue]
+Deltas = Dict[Tuple[int, date], list]
+
+INSERTS = {"postgresql": postgresql_insert, "sqlite": sqlite_insert}
+
+
+def _day(value) -> date:
+    return value.date() if isinstance(value, datetime) else value
+
+
+def add_booking(deltas: Deltas, lodging_id, check_in, check_out,
+                price, status, sign: int = 1):
+    """Spread one booking over its nights: +1 night and price / nights"""
+    if lodging_id is None or status in INACTIVE_STATUSES:
+        return
+    first, last = _day(check_in), _day(check_out)
+    nights = (last - first).days
+    if nights <= 0:
+        return
+    nightly = (price or 0) / nights
+    for offset in range(nights):
+        entry = deltas[(lodging_id, first + timedelta(days=offset))]
+        entry[0] += sign
+        entry[1] += sign * nightly
+
+
+def apply_deltas(connection, deltas: Deltas):
+    """Upsert the deltas into lodging_daily_stats with one executemany"""
+    rows = [
+        {"lodging_id": lodging_id, "day": day,
+         "occupied": occupied, "revenue": revenue}
+        for (lodging_id, day), (occupied, revenue) in deltas.items()
+        if occupied or revenue
+    ]
+    if not rows:
+        return
+    table = LodgingDailyStats.__table__
+    statement = INSERTS[connection.dialect.name](table)
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.lodging_id, table.c.day],
+        set_={
+            "occupied": table.c.occupied + statement.excluded.occupied,
+            "revenue": table.c.revenue + statement.excluded.revenue,
+        },
+    )
+    connection.execute(statement, rows)
+
+
+def _changed(booking: Booking) -> bool:
+    attrs = inspect(booking).attrs
+    return any(attrs[name].history.has_changes() for name in TRACKED)
+
+
+@event.listens_for(Session, "before_flush")
+def _track_bookings(session, flush_context, instances):
+    """
+    Keep lodging_daily_stats and the lodging calendars in step with
+    every flushed booking insert, update (dates, price, status) and
+    delete, in the same transaction.
+    Bulk ``query.update()`` / ``delete()`` on bookings bypass this hook.
+    """
+    added = [obj for obj in session.new if isinstance(obj, Booking)]
+    changed = [obj for obj in session.dirty
+               if isinstance(obj, Booking) and _changed(obj)]
+    removed = [obj for obj in session.deleted if isinstance(obj, Booking)]
+    if not (added or changed or removed):
+        return
+
+    deltas: Deltas = defaultdict(lambda: [0, 0.0])
+    connection = session.connection()
+
+    # The old values are still the ones in the table
+    old_ids = [obj.id for obj in changed + removed]
+    if old_ids:
+        columns = [Booking.__table__.c[name] for name in TRACKED]
+        for row in connection.execute(
+            select(*columns).where(Booking.__table__.c.id.in_(old_ids))
+        ):
+            add_booking(deltas, *row, sign=-1)
+
+    for obj in added + changed:
+        add_booking(deltas, obj.lodging_id, obj.check_in_date,
+                    obj.check_out_date, obj.total_price, obj.status)
+
+    apply_deltas(connection, deltas)
+    apply_night_changes(connection, {
+        key: occupied for key, (occupied, _) in deltas.items()
+    })
+
+
+def rebuild_daily_stats(db: Session, batch_size: int = 1000):
+    """Recompute lodging_daily_stats from scratch (backfills, repairs)"""
+    db.execute(delete(LodgingDailyStats))
+    deltas: Deltas = defaultdict(lambda: [0, 0.0])
+    rows = db.execute(
+        select(*(Booking.__table__.c[name] for name in TRACKED))
+        .where(Booking.status.notin_(INACTIVE_STATUSES))
+        .execution_options(yield_per=batch_size)
+    )
+    for row in rows:
+        add_booking(deltas, *row)
+    apply_deltas(db.connection(), deltas)
+    db.commit()
+
+
+def _daily(db: Session, criteria: Iterable, start: date,
+           end: date) -> list:
+    statement = (
+        select(
+            LodgingDailyStats.day,
+            func.sum(LodgingDailyStats.occupied),
+            func.sum(LodgingDailyStats.revenue),
+        )
+        .where(
+            *criteria,
+            LodgingDailyStats.day >= start,
+            LodgingDailyStats.day < end,
+        )
+        .group_by(LodgingDailyStats.day)
+        .order_by(LodgingDailyStats.day)
+    )
+    return [
+        OccupancyDay(day=day, occupied=occupied, revenue=round(revenue, 2))
+        for day, occupied, revenue in db.execute(statement)
+        if occupied
+    ]
+
+
+def occupancy_report(
+    db: Session,
+    start: date,
+    end: date,
+    lodging_id: Optional[int] = None,
+    location: Optional[str] = None,
+) -> OccupancyReport:
+    """
+    Occupancy and revenue over the nights [start, end) for one lodging
+    or every lodging at ``location``. Reads only the aggregate rows of
+    the range, never the bookings themselves.
+    """
+    validate_date_range(start, end)
+    if lodging_id is not None:
+        lodgings = db.query(Lodging.id).filter(
+            Lodging.id == lodging_id).count()
+        if not lodgings:
+            raise HTTPException(status_code=404, detail="Lodging not found")
+        criteria = [LodgingDailyStats.lodging_id == lodging_id]
+    else:
+        lodgings = db.query(Lodging.id).filter(
+            Lodging.location == location).count()
+        criteria = [LodgingDailyStats.lodging_id.in_(
+            select(Lodging.id).where(Lodging.location == location)
+        )]
+
+    daily = _daily(db, criteria, start, end) if lodgings else []
+    nights = lodgings * (end - start).days
+    occupied = sum(day.occupied for day in daily)
+    return OccupancyReport(
+        lodging_id=lodging_id,
+        location=location,
+        start_date=start,
+        end_date=end,
+        lodgings=lodgings,
+        nights=nights,
+        occupied_nights=occupied,
+        occupancy_rate=round(occupied / nights, 4) if nights else 0.0,
+        revenue=round(sum(day.revenue for day in daily), 2),
+        daily=daily,
+    )
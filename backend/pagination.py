@@ -0,0 +1,116 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from typing import Any, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Query
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def _encode_value(value: Any):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _decode_value(column, value: Any):
+    """``value`` as a bind for ``column``; raises ValueError if it isn't
+    one the column could hold"""
+    if value is None:
+        return None
+    python_type = column.type.python_type
+    if issubclass(python_type, datetime):
+        if not isinstance(value, str):
+            raise ValueError(value)
+        return datetime.fromisoformat(value)
+    if issubclass(python_type, float):
+        python_type = (int, float)
+    # JSON true/false would otherwise pass for numbers
+    if isinstance(value, bool) or not isinstance(value, python_type):
+        raise ValueError(value)
+    return value
+
+
+def encode_cursor(sort_by: str, order: str, value: Any, row_id: int) -> str:
+    """Opaque cursor pointing just past (value, row_id)"""
+    raw = json.dumps([sort_by, order, _encode_value(value), row_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(
+    cursor: str, sort_by: str, order: str, sort_column
+) -> Tuple[Any, int]:
+    """(sort value, id) a cursor points past, typed for ``sort_column``"""
+    invalid = HTTPException(status_code=400, detail="Invalid cursor")
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_sort, cursor_order, value, row_id = json.loads(
+            base64.urlsafe_b64decode(padded.encode())
+        )
+        value = _decode_value(sort_column, value)
+        if isinstance(row_id, bool) or not isinstance(row_id, int):
+            raise ValueError(row_id)
+    except (ValueError, TypeError, binascii.Error):
+        raise invalid
+
+    # A cursor is only meaningful for the ordering that produced it
+    if cursor_sort != sort_by or cursor_order != order:
+        raise invalid
+    return value, row_id
+
+
+def paginate(
+    query: Query,
+    model,
+    sort_by: str,
+    order: str,
+    limit: int,
+    offset: int = 0,
+    cursor: Optional[str] = None,
+    keyset: bool = True,
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    Order ``query`` by ``sort_by`` with ``id`` as tie-breaker and return
+    one page plus the cursor of the next one (None on the last page).
+
+    With a cursor the page starts with a keyset seek on the
+    (sort column, id) index and ``offset`` is ignored; without one the
+    legacy offset paging is used. Pass ``keyset=False`` when the query is
+    already ordered by something a cursor cannot encode (e.g. relevance).
+    """
+    sort_column = getattr(model, sort_by)
+    id_column = model.id
+    descending = order == "desc"
+
+    if cursor is not None and not keyset:
+        raise HTTPException(
+            status_code=400,
+            detail="Cursor paging is not supported for this ordering",
+        )
+    if cursor is not None:
+        value, row_id = decode_cursor(cursor, sort_by, order, sort_column)
+        key = tuple_(sort_column, id_column)
+        bound = tuple_(value, row_id)
+        query = query.filter(key < bound if descending else key > bound)
+        offset = 0
+
+    if descending:
+        query = query.order_by(sort_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(sort_column, id_column)
+
+    # Fetch one extra row to learn whether another page exists
+    rows = query.offset(offset).limit(limit + 1).all()
+    if len(rows) <= limit or not keyset or not limit:
+        return rows[:limit], None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    next_cursor = encode_cursor(
+        sort_by, order, getattr(last, sort_by), last.id
+    )
+    return rows, next_cursor
@@ -0,0 +1,130 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, Optional
+
+from sqlalchemy import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from backend.settings import env_bool
+
+# Upper bounds (seconds) of the checkout wait histogram buckets
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+
+# One pool configuration, shared by the sync and async engines
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+POOL_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+POOL_PRE_PING = env_bool("DB_POOL_PRE_PING", "true")
+
+
+class WaitHistogram:
+    """Cumulative histogram of how long checkouts waited for a connection"""
+
+    def __init__(self, buckets=WAIT_BUCKETS):
+        self.buckets = buckets
+        self._counts = [0] * (len(buckets) + 1)
+        self._sum = 0.0
+        self._timeouts = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            self._counts[bisect_left(self.buckets, seconds)] += 1
+            self._sum += seconds
+            if timed_out:
+                self._timeouts += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts = list(self._counts)
+            total, timeouts = self._sum, self._timeouts
+        cumulative, running = {}, 0
+        for bound, count in zip(self.buckets, counts):
+            running += count
+            cumulative[str(bound)] = running
+        cumulative["+Inf"] = running + counts[-1]
+        return {
+            "buckets": cumulative,
+            "count": cumulative["+Inf"],
+            "sum": total,
+            "timeouts": timeouts,
+        }
+
+
+class _TimedCheckoutMixin:
+    """Times every checkout from the pool, including waits for overflow"""
+
+    wait_histogram: WaitHistogram
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.wait_histogram.observe(time.perf_counter() - start, True)
+            raise
+        self.wait_histogram.observe(time.perf_counter() - start)
+        return connection
+
+    def recreate(self):
+        # Keep the histogram when the engine swaps in a fresh pool
+        pool = super().recreate()
+        pool.wait_histogram = self.wait_histogram
+        return pool
+
+
+class InstrumentedQueuePool(_TimedCheckoutMixin, QueuePool):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_histogram = WaitHistogram()
+
+
+class InstrumentedAsyncQueuePool(_TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_histogram = WaitHistogram()
+
+
+def pool_options(url: str, is_async: bool = False) -> dict:
+    """create_engine keyword arguments for the configured pool"""
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite" and url.database in (
+        None, "", ":memory:"
+    ):
+        # In-memory SQLite lives in a single connection; keep its pool
+        return {}
+
+    return {
+        "poolclass": (
+            InstrumentedAsyncQueuePool if is_async else InstrumentedQueuePool
+        ),
+        "pool_size": POOL_SIZE,
+        "max_overflow": POOL_MAX_OVERFLOW,
+        "pool_timeout": POOL_TIMEOUT,
+        "pool_recycle": POOL_RECYCLE,
+        "pool_pre_ping": POOL_PRE_PING,
+    }
+
+
+def pool_stats(pool) -> Dict[str, Optional[object]]:
+    """Live figures for one engine's pool"""
+    stats = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            # overflow() starts at -size while the pool is filling up
+            overflow=max(pool.overflow(), 0),
+            max_overflow=pool._max_overflow,
+            timeout=pool.timeout(),
+        )
+    histogram = getattr(pool, "wait_histogram", None)
+    if histogram is not None:
+        stats["wait_seconds"] = histogram.snapshot()
+    return stats
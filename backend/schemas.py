@@ -1,6 +1,6 @@
 from __future__ import annotations
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Literal, Optional, Union
 from datetime import datetime, date
 
 
@@ -10,6 +10,8 @@ class LodgingBase(BaseModel):
     price_per_night: float
     availability: bool
     description: str
+    latitude: Optional[float] = Field(default=None, ge=-90, le=90)
+    longitude: Optional[float] = Field(default=None, ge=-180, le=180)
 
 
 class LodgingCreate(LodgingBase):
@@ -23,12 +25,39 @@ class LodgingResponse(BaseModel):
     price_per_night: float
     availability: bool
     description: str
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
     created_at: datetime
     updated_at: datetime
 
+    class Config:
+        from_attributes = True
+
+
+class FacetCount(BaseModel):
+    value: Union[str, bool, None]
+    count: int
+
+
+class PriceBucket(BaseModel):
+    # [min, max) price per night; max is None for the last bucket
+    min: float
+    max: Optional[float] = None
+    count: int
 
-class Config:
-    from_attributes = True
+
+class LodgingFacets(BaseModel):
+    location: Optional[List[FacetCount]] = None
+    price: Optional[List[PriceBucket]] = None
+    availability: Optional[List[FacetCount]] = None
+
+
+class LodgingSearchResponse(BaseModel):
+    """get_lodgings with ``facets``: the page plus the aggregations"""
+    results: List[LodgingResponse]
+    total: int
+    total_is_estimate: bool
+    facets: LodgingFacets
 
 
 class Token(BaseModel):
@@ -62,6 +91,8 @@ class LodgingUpdate(BaseModel):
     price_per_night: Optional[float] = None
     availability: Optional[bool] = None
     description: Optional[str] = None
+    latitude: Optional[float] = Field(default=None, ge=-90, le=90)
+    longitude: Optional[float] = Field(default=None, ge=-180, le=180)
 
 
 class BookingCreate(BaseModel):
@@ -77,3 +108,79 @@ class BookingResponse(BaseModel):
     user_id: int
     start_date: date
     end_date: date
+
+
+class LodgingSummary(BaseModel):
+    id: int
+    name: str
+    location: str
+    price_per_night: float
+
+
+class BookingExpandedResponse(BookingResponse):
+    # Only present when requested through ?expand=
+    lodging: Optional[LodgingSummary] = None
+    user: Optional[UserResponse] = None
+
+
+class BookingStatusUpdate(BaseModel):
+    status: Literal["pending", "confirmed", "canceled"]
+
+
+class BookingBatchItem(BookingCreate):
+    # Defaults to the authenticated user
+    user_id: Optional[int] = None
+
+
+class BookingBatchCreate(BaseModel):
+    bookings: List[BookingBatchItem] = Field(min_length=1, max_length=500)
+    # all_or_nothing: any error rejects the whole batch (409)
+    # partial: valid bookings are created, the rest reported
+    mode: Literal["all_or_nothing", "partial"] = "all_or_nothing"
+
+
+class BookingBatchError(BaseModel):
+    index: int
+    detail: str
+
+
+class BookingBatchResponse(BaseModel):
+    created: List[BookingResponse]
+    errors: List[BookingBatchError]
+
+
+class OccupancyDay(BaseModel):
+    day: date
+    occupied: int
+    revenue: float
+
+
+class CalendarRange(BaseModel):
+    # Booked nights [start_date, end_date), like a booking
+    start_date: date
+    end_date: date
+
+
+class LodgingCalendarResponse(BaseModel):
+    lodging_id: int
+    start_date: date
+    end_date: date
+    booked_nights: int
+    free_nights: int
+    # One character per night from start_date: "1" booked, "0" free
+    nights: str
+    booked: List[CalendarRange]
+
+
+class OccupancyReport(BaseModel):
+    lodging_id: Optional[int] = None
+    location: Optional[str] = None
+    start_date: date
+    end_date: date
+    lodgings: int
+    # lodgings x days in the range
+    nights: int
+    occupied_nights: int
+    occupancy_rate: float
+    revenue: float
+    daily: List[OccupancyDay]
@@ -0,0 +1,121 @@
+from typing import Optional, Set, Tuple
+
+from sqlalchemy import DDL, column, event, func, literal, or_, text
+from sqlalchemy.orm import Session
+
+from backend.database import sqlite_function
+from backend.models import Lodging
+
+# Minimum share of the query's trigrams a location must contain to match
+SIMILARITY_THRESHOLD = 0.5
+
+SQLITE_FTS_TABLE = "lodgings_location_fts"
+
+# SQLite: external-content FTS5 table over lodgings.location, kept in sync
+# by triggers so bulk ``query.update()`` calls are covered too.
+SQLITE_DDL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_FTS_TABLE} USING fts5(
+        location, content='lodgings', content_rowid='id',
+        tokenize='trigram'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS lodgings_location_ai
+    AFTER INSERT ON lodgings BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}(rowid, location)
+        VALUES (new.id, new.location);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS lodgings_location_ad
+    AFTER DELETE ON lodgings BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, location)
+        VALUES ('delete', old.id, old.location);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS lodgings_location_au
+    AFTER UPDATE OF location ON lodgings BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, location)
+        VALUES ('delete', old.id, old.location);
+        INSERT INTO {SQLITE_FTS_TABLE}(rowid, location)
+        VALUES (new.id, new.location);
+    END
+    """,
+]
+
+# Postgres: a trigram GIN index serves ILIKE '%x%' as well as the
+# word-similarity operator used for typo-tolerant matches.
+POSTGRES_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    CREATE INDEX IF NOT EXISTS ix_lodgings_location_trgm
+    ON lodgings USING gin (location gin_trgm_ops)
+    """,
+]
+
+for statement in SQLITE_DDL:
+    event.listen(
+        Lodging.__table__, "after_create",
+        DDL(statement).execute_if(dialect="sqlite"),
+    )
+for statement in POSTGRES_DDL:
+    event.listen(
+        Lodging.__table__, "after_create",
+        DDL(statement).execute_if(dialect="postgresql"),
+    )
+
+
+def trigrams(value: str) -> Set[str]:
+    """Lower-cased character trigrams, as produced by FTS5's tokenizer"""
+    value = value.lower()
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+
+@sqlite_function("trigram_similarity", 2)
+def trigram_similarity(query: Optional[str], value: Optional[str]) -> float:
+    """Share of the query's trigrams found in ``value`` (1.0 = substring)"""
+    if not query or not value:
+        return 0.0
+    wanted = trigrams(query)
+    if not wanted:
+        return 1.0 if query.lower() in value.lower() else 0.0
+    return len(wanted & trigrams(value)) / len(wanted)
+
+
+def _fts_match_expression(query: str) -> str:
+    # Any shared trigram makes a candidate; the similarity threshold
+    # then keeps only close matches
+    quoted = ('"' + gram.replace('"', '""') + '"' for gram in trigrams(query))
+    return " OR ".join(sorted(quoted))
+
+
+def location_search(db: Session, query: str) -> Tuple:
+    """
+    Build the (filter, relevance score) pair for a location search.
+
+    Matches are substrings or near-misses of ``query``; the score orders
+    them best first. Backed by pg_trgm on Postgres and the FTS5 trigram
+    table on SQLite, with a plain ILIKE scan for anything else.
+    """
+    dialect = db.get_bind().dialect.name
+    substring = Lodging.location.ilike(f"%{query}%")
+
+    if dialect == "postgresql":
+        score = func.word_similarity(query, Lodging.location)
+        return or_(substring, literal(query).op("<%")(Lodging.location)), score
+
+    if dialect == "sqlite":
+        score = func.trigram_similarity(query, Lodging.location)
+        if not trigrams(query):
+            # Too short for the trigram index
+            return substring, score
+        candidates = text(
+            f"SELECT rowid FROM {SQLITE_FTS_TABLE} "
+            f"WHERE {SQLITE_FTS_TABLE} MATCH :match"
+        ).bindparams(match=_fts_match_expression(query))
+        criterion = Lodging.id.in_(candidates.columns(column("rowid")))
+        return criterion & (score >= SIMILARITY_THRESHOLD), score
+
+    return substring, literal(1.0)
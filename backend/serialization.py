@@ -0,0 +1,72 @@
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Callable, List, Optional, Sequence, Type
+
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, TypeAdapter
+
+from backend.settings import env_bool
+
+# SERIALIZE_TRUSTED_ROWS=true builds responses straight from ORM
+# attributes. The rows come from our own typed columns, so validating
+# them against the response schema again only costs time.
+SERIALIZE_TRUSTED_ROWS = env_bool("SERIALIZE_TRUSTED_ROWS")
+
+
+@lru_cache(maxsize=None)
+def list_adapter(schema: Type[BaseModel]) -> TypeAdapter:
+    """Compiled once per schema; validates a whole page in one call"""
+    return TypeAdapter(List[schema])
+
+
+def _as_date(value):
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _converter(annotation) -> Optional[Callable]:
+    # DateTime columns behind ``date`` fields (the booking dates)
+    if annotation is date:
+        return _as_date
+    return None
+
+
+@lru_cache(maxsize=None)
+def row_encoder(schema: Type[BaseModel]) -> Callable[[object], dict]:
+    """attribute -> dict function for ``schema``, without validation"""
+    fields = [
+        (name, _converter(info.annotation))
+        for name, info in schema.model_fields.items()
+    ]
+
+    def encode(row) -> dict:
+        data = {}
+        for name, convert in fields:
+            value = getattr(row, name)
+            data[name] = convert(value) if convert else value
+        return data
+
+    return encode
+
+
+def dump_rows(rows: Sequence, schema: Type[BaseModel],
+              trusted: Optional[bool] = None) -> List[dict]:
+    """
+    ORM rows as ``schema`` dicts, ready for ORJSONResponse. Validates
+    the page with one TypeAdapter call, or not at all in trusted mode.
+    """
+    if SERIALIZE_TRUSTED_ROWS if trusted is None else trusted:
+        encode = row_encoder(schema)
+        return [encode(row) for row in rows]
+    adapter = list_adapter(schema)
+    return adapter.dump_python(
+        adapter.validate_python(rows, from_attributes=True)
+    )
+
+
+def json_response(content, headers: Optional[dict] = None) -> ORJSONResponse:
+    """
+    Return already-serialized content as is. FastAPI skips the
+    response_model pass (validate, jsonable_encoder, json.dumps) for
+    Response objects; the response_model then only documents the route.
+    """
+    return ORJSONResponse(content=content, headers=headers)
@@ -0,0 +1,12 @@
+import os
+
+from dotenv import load_dotenv
+
+# The .env file is read once, by whichever module imports this first;
+# every module that reads configuration imports it before os.getenv.
+# Variables already set in the environment win over .env.
+load_dotenv()
+
+
+def env_bool(name: str, default: str = "false") -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
@@ -0,0 +1,171 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from typing import List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from backend.metrics import current_route, failed_cursor
+from backend.settings import env_bool
+
+logger = logging.getLogger(__name__)
+
+# SLOW_QUERY_MS turns the recorder on: statements taking at least this
+# long are logged and kept, with their plan. Unset = off.
+SLOW_QUERY_MS = os.getenv("SLOW_QUERY_MS")
+# EXPLAIN ANALYZE runs the SELECT a second time; Postgres only
+SLOW_QUERY_ANALYZE = env_bool("SLOW_QUERY_ANALYZE")
+SLOW_QUERY_LOG_SIZE = int(os.getenv("SLOW_QUERY_LOG_SIZE", "100"))
+
+# Statements EXPLAIN can describe without running them
+EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+
+# Parameter types shown as is; everything else is redacted
+PLAIN_TYPES = (bool, int, float, Decimal, date, datetime, type(None))
+
+
+def redact(value):
+    """Keep numbers, dates and NULLs; hide strings and blobs"""
+    if isinstance(value, PLAIN_TYPES):
+        return value.isoformat() if isinstance(value, date) else value
+    if isinstance(value, (str, bytes)):
+        return f"<{type(value).__name__}:{len(value)}>"
+    return f"<{type(value).__name__}>"
+
+
+def redact_parameters(parameters):
+    if isinstance(parameters, dict):
+        return {name: redact(value) for name, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [redact(value) for value in parameters]
+    return redact(parameters)
+
+
+class SlowQueryLog:
+    """
+    Engine listener that records statements slower than ``threshold_ms``
+    in a ring buffer, with the route that issued them and their plan.
+    """
+
+    def __init__(self, threshold_ms: float, analyze: bool = False,
+                 size: int = 100):
+        self.threshold_ms = threshold_ms
+        self.analyze = analyze
+        self._entries = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def install(self, engine: Engine):
+        event.listen(engine, "before_cursor_execute", self._started)
+        event.listen(engine, "after_cursor_execute", self._finished)
+        event.listen(engine, "handle_error", self._failed)
+
+    def uninstall(self, engine: Engine):
+        event.remove(engine, "before_cursor_execute", self._started)
+        event.remove(engine, "after_cursor_execute", self._finished)
+        event.remove(engine, "handle_error", self._failed)
+
+    def entries(self) -> List[dict]:
+        """Newest first"""
+        with self._lock:
+            return list(reversed(self._entries))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    # Start times are keyed by cursor, and a failed statement (which never
+    # reaches after_cursor_execute) drops its own in _failed
+    def _started(self, conn, cursor, statement, parameters, context,
+                 executemany):
+        conn.info.setdefault("slow_query_started", {})[id(cursor)] = (
+            time.perf_counter()
+        )
+
+    def _failed(self, context):
+        cursor = failed_cursor(context)
+        if cursor is not None:
+            context.connection.info.get("slow_query_started", {}).pop(
+                id(cursor), None
+            )
+
+    def _finished(self, conn, cursor, statement, parameters, context,
+                  executemany):
+        started = conn.info.get("slow_query_started", {}).pop(id(cursor),
+                                                              None)
+        if started is None:
+            # Installed while this statement was running
+            return
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if elapsed_ms < self.threshold_ms:
+            return
+
+        entry = {
+            "recorded_at": datetime.now(timezone.utc).isoformat(),
+            "duration_ms": round(elapsed_ms, 3),
+            "route": current_route(),
+            "statement": statement,
+            "parameters": (
+                f"<executemany: {len(parameters)} rows>" if executemany
+                else redact_parameters(parameters)
+            ),
+            "plan": None if executemany else self._explain(
+                conn, statement, parameters
+            ),
+        }
+        logger.warning(
+            "Slow query (%.1f ms) from %s: %s | params=%s",
+            entry["duration_ms"], entry["route"] or "-",
+            " ".join(statement.split()), entry["parameters"],
+        )
+        with self._lock:
+            self._entries.append(entry)
+
+    def _explain(self, conn, statement: str,
+                 parameters) -> Optional[List[str]]:
+        verb = statement.lstrip().split(None, 1)[0].upper()
+        if verb not in EXPLAINABLE:
+            return None
+
+        dialect = conn.dialect.name
+        if dialect == "postgresql":
+            # ANALYZE would execute writes again; SELECTs only
+            analyze = self.analyze and verb == "SELECT"
+            prefix = "EXPLAIN (ANALYZE, BUFFERS) " if analyze else "EXPLAIN "
+        elif dialect == "sqlite":
+            prefix = "EXPLAIN QUERY PLAN "
+        else:
+            return None
+
+        # Straight on the DBAPI connection, so the EXPLAIN neither fires
+        # these events again nor disturbs the statement's own cursor. On
+        # Postgres a failed EXPLAIN would abort the request's transaction,
+        # hence the savepoint.
+        cursor = conn.connection.dbapi_connection.cursor()
+        savepoint = dialect == "postgresql"
+        try:
+            if savepoint:
+                cursor.execute("SAVEPOINT slow_query_explain")
+            cursor.execute(prefix + statement, parameters)
+            plan = [str(row[-1]) for row in cursor.fetchall()]
+            if savepoint:
+                cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+            return plan
+        except Exception as exc:
+            if savepoint:
+                try:
+                    cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+                except Exception:
+                    pass
+            return [f"EXPLAIN failed: {exc.__class__.__name__}: {exc}"]
+        finally:
+            cursor.close()
+
+
+slow_query_log = SlowQueryLog(
+    float(SLOW_QUERY_MS or 0), SLOW_QUERY_ANALYZE, SLOW_QUERY_LOG_SIZE
+)
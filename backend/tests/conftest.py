@@ -0,0 +1,37 @@
+import pytest
+from fastapi.testclient import TestClient
+from backend.main import app
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def admin_headers():
+    """Authorization headers of the seeded admin account"""
+    login_response = client.post(
+        "/auth/login",
+        data={"username": "admin@example.com", "password": "adminpassword"},
+    )
+    token = login_response.json().get("access_token")
+    assert token, "No admin token returned!"
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def create_lodging(admin_headers):
+    """Create a lodging as the admin (fields overridable); returns its JSON"""
+    def create(**overrides):
+        payload = {
+            "name": "Test Camp",
+            "location": "Williston, ND",
+            "price_per_night": 100.0,
+            "availability": True,
+            "description": "Crew housing",
+        }
+        payload.update(overrides)
+        response = client.post("/lodgings/", json=payload,
+                               headers=admin_headers)
+        assert response.status_code == 201, response.text
+        return response.json()
+
+    return create
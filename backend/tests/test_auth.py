@@ -1,5 +1,11 @@
+import threading
+
 from fastapi.testclient import TestClient
+from jose import jwt
+from backend import auth
+from backend.database import SessionLocal
 from backend.main import app
+from backend.models import User
 
 client = TestClient(app)
 
@@ -135,3 +141,106 @@ def test_read_users_me_unauthorized():
     """Ensure /users/me fails without a valid token"""
     me_response = client.get("/auth/users/me")
     assert me_response.status_code == 401
+
+
+def test_token_carries_user_claims():
+    """Tokens include the user id and role used by the auth fast path"""
+    login_response = client.post(
+        "/auth/login",
+        data={"username": "admin@example.com", "password": "adminpassword"},
+    )
+    token = login_response.json()["access_token"]
+
+    claims = jwt.get_unverified_claims(token)
+    assert claims["sub"] == "admin@example.com"
+    assert claims["role"] == "admin"
+    assert isinstance(claims["uid"], int)
+
+
+def test_deleted_user_token_is_rejected():
+    """Cached user records are dropped when the user is deleted"""
+    client.post(
+        "/auth/signup",
+        json={
+            "email": "testuser-cache@example.com",
+            "password": "testpassword",
+            "role": "user",
+        },
+    )
+    login_response = client.post(
+        "/auth/login",
+        data={
+            "username": "testuser-cache@example.com",
+            "password": "testpassword",
+        },
+    )
+    headers = {
+        "Authorization": f"Bearer {login_response.json()['access_token']}"
+    }
+    assert client.get("/auth/users/me", headers=headers).status_code == 200
+
+    admin_login = client.post(
+        "/auth/login",
+        data={"username": "admin@example.com", "password": "adminpassword"},
+    )
+    admin_headers = {
+        "Authorization": f"Bearer {admin_login.json()['access_token']}"
+    }
+    delete_response = client.delete(
+        "/auth/delete-test-users", headers=admin_headers
+    )
+    assert delete_response.status_code == 204
+
+    assert client.get("/auth/users/me", headers=headers).status_code == 401
+
+
+def test_deleted_user_token_rejected_after_id_reuse():
+    """A token doesn't follow its user id over to a new account"""
+    client.post(
+        "/auth/signup",
+        json={
+            "email": "testuser-reused@example.com",
+            "password": "testpassword",
+            "role": "user",
+        },
+    )
+    login_response = client.post(
+        "/auth/login",
+        data={
+            "username": "testuser-reused@example.com",
+            "password": "testpassword",
+        },
+    )
+    token = login_response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get("/auth/users/me", headers=headers).status_code == 200
+    user_id = jwt.get_unverified_claims(token)["uid"]
+
+    # Delete the user and hand its id to a new account, as SQLite does
+    # when the freed id was the highest
+    db = SessionLocal()
+    try:
+        db.delete(db.get(User, user_id))
+        db.commit()
+        victim = User(id=user_id, email="testuser-victim@example.com",
+                      hashed_password=auth.hash_password("testpassword"),
+                      role="user")
+        db.add(victim)
+        db.commit()
+    finally:
+        db.close()
+
+    assert client.get("/auth/users/me", headers=headers).status_code == 401
+
+
+def test_login_returns_503_when_password_pool_is_full(monkeypatch):
+    """Logins beyond the password queue limit are shed with Retry-After"""
+    monkeypatch.setattr(auth, "_password_slots", threading.BoundedSemaphore(1))
+    auth._password_slots.acquire()
+
+    response = client.post(
+        "/auth/login",
+        data={"username": "admin@example.com", "password": "adminpassword"},
+    )
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == auth.PASSWORD_HASH_RETRY_AFTER
@@ -0,0 +1,577 @@
+import asyncio
+import csv
+import io
+import json
+import uuid
+
+import httpx
+from fastapi.testclient import TestClient
+from backend.database import async_engine
+from backend.main import app
+
+client = TestClient(app)
+
+
+def test_create_booking(admin_headers, create_lodging):
+    """Admins can book a free date range on a lodging"""
+    lodging = create_lodging()
+
+    response = client.post(
+        "/bookings/",
+        json={
+            "lodging_id": lodging["id"],
+            "start_date": "2030-03-03",
+            "end_date": "2030-03-06",
+        },
+        headers=admin_headers,
+    )
+    assert response.status_code == 201, response.text
+    data = response.json()
+    assert data["lodging_id"] == lodging["id"]
+    assert data["start_date"] == "2030-03-03"
+    assert data["end_date"] == "2030-03-06"
+
+
+def test_overlapping_booking_conflicts(admin_headers, create_lodging):
+    """Overlapping date ranges on one lodging return 409"""
+    lodging = create_lodging()
+
+    def book(start, end):
+        return client.post(
+            "/bookings/",
+            json={
+                "lodging_id": lodging["id"],
+                "start_date": start,
+                "end_date": end,
+            },
+            headers=admin_headers,
+        )
+
+    assert book("2030-03-03", "2030-03-10").status_code == 201
+    assert book("2030-03-12", "2030-03-15").status_code == 201
+
+    assert book("2030-03-09", "2030-03-11").status_code == 409
+    assert book("2030-03-01", "2030-03-04").status_code == 409
+    assert book("2030-03-14", "2030-03-20").status_code == 409
+
+    # Back-to-back stays share only the changeover day
+    assert book("2030-03-10", "2030-03-12").status_code == 201
+    assert book("2030-02-25", "2030-03-03").status_code == 201
+
+
+def test_concurrent_bookings_never_overlap(admin_headers, create_lodging):
+    """Racing requests for the same dates: exactly one gets the lodging"""
+    lodging = create_lodging()
+    payload = {"lodging_id": lodging["id"], "start_date": "2030-04-01",
+               "end_date": "2030-04-05"}
+
+    async def send_all():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport,
+                                     base_url="http://test") as http:
+            try:
+                return await asyncio.gather(*(
+                    http.post("/bookings/", json=payload,
+                              headers=admin_headers)
+                    for _ in range(20)
+                ))
+            finally:
+                # The pooled connections belong to this loop; close them
+                # before it goes
+                if async_engine is not None:
+                    await async_engine.dispose()
+
+    statuses = sorted(response.status_code
+                      for response in asyncio.run(send_all()))
+    assert statuses == [201] + [409] * 19
+
+
+def test_booking_invalid_range_and_missing_lodging(admin_headers,
+                                                   create_lodging):
+    lodging = create_lodging()
+
+    response = client.post(
+        "/bookings/",
+        json={
+            "lodging_id": lodging["id"],
+            "start_date": "2030-03-05",
+            "end_date": "2030-03-05",
+        },
+        headers=admin_headers,
+    )
+    assert response.status_code == 400
+
+    response = client.post(
+        "/bookings/",
+        json={
+            "lodging_id": 999999,
+            "start_date": "2030-03-05",
+            "end_date": "2030-03-06",
+        },
+        headers=admin_headers,
+    )
+    assert response.status_code == 404
+
+
+def test_bookings_cursor_pagination(admin_headers, create_lodging):
+    """Booking pages sorted by start_date follow X-Next-Cursor"""
+    lodging = create_lodging()
+    for day in (1, 5, 9):
+        response = client.post(
+            "/bookings/",
+            json={
+                "lodging_id": lodging["id"],
+                "start_date": f"2031-01-{day:02d}",
+                "end_date": f"2031-01-{day + 2:02d}",
+            },
+            headers=admin_headers,
+        )
+        assert response.status_code == 201
+
+    params = {
+        "lodging_id": lodging["id"],
+        "sort_by": "start_date",
+        "order": "asc",
+        "limit": 2,
+    }
+    first = client.get("/bookings/", params=params)
+    assert [b["start_date"] for b in first.json()] == [
+        "2031-01-01", "2031-01-05"
+    ]
+
+    params["cursor"] = first.headers["X-Next-Cursor"]
+    second = client.get("/bookings/", params=params)
+    assert [b["start_date"] for b in second.json()] == ["2031-01-09"]
+    assert "X-Next-Cursor" not in second.headers
+
+
+def test_batch_booking_all_or_nothing(admin_headers, create_lodging):
+    """One conflicting item rejects the whole batch"""
+    lodging = create_lodging()
+    other = create_lodging()
+    client.post(
+        "/bookings/",
+        json={
+            "lodging_id": lodging["id"],
+            "start_date": "2032-05-10",
+            "end_date": "2032-05-15",
+        },
+        headers=admin_headers,
+    )
+
+    batch = {
+        "bookings": [
+            {"lodging_id": other["id"],
+             "start_date": "2032-05-01", "end_date": "2032-05-05"},
+            {"lodging_id": lodging["id"],
+             "start_date": "2032-05-12", "end_date": "2032-05-20"},
+        ],
+    }
+    response = client.post("/bookings/batch", json=batch,
+                           headers=admin_headers)
+    assert response.status_code == 409
+    assert response.json()["detail"]["errors"] == [
+        {"index": 1, "detail": "Date range not available"}
+    ]
+
+    listed = client.get("/bookings/", params={"lodging_id": other["id"]})
+    assert listed.json() == []
+
+
+def test_batch_booking_partial(admin_headers, create_lodging):
+    """Partial mode creates valid items and reports the rest by index"""
+    lodging = create_lodging()
+    batch = {
+        "mode": "partial",
+        "bookings": [
+            {"lodging_id": lodging["id"],
+             "start_date": "2032-06-01", "end_date": "2032-06-05"},
+            {"lodging_id": lodging["id"],
+             "start_date": "2032-06-04", "end_date": "2032-06-08"},
+            {"lodging_id": lodging["id"],
+             "start_date": "2032-06-05", "end_date": "2032-06-08"},
+            {"lodging_id": 999999,
+             "start_date": "2032-06-01", "end_date": "2032-06-02"},
+            {"lodging_id": lodging["id"],
+             "start_date": "2032-06-09", "end_date": "2032-06-09"},
+        ],
+    }
+    response = client.post("/bookings/batch", json=batch,
+                           headers=admin_headers)
+    assert response.status_code == 201, response.text
+    data = response.json()
+    assert [b["start_date"] for b in data["created"]] == [
+        "2032-06-01", "2032-06-05"
+    ]
+    assert [e["index"] for e in data["errors"]] == [1, 3, 4]
+
+
+def test_export_bookings_ndjson_and_csv(admin_headers, create_lodging):
+    """Exports stream every matching booking with the list filters"""
+    lodging = create_lodging(price_per_night=50.0)
+    for start, end in (("2033-01-01", "2033-01-03"),
+                       ("2033-01-05", "2033-01-06")):
+        client.post(
+            "/bookings/",
+            json={
+                "lodging_id": lodging["id"],
+                "start_date": start,
+                "end_date": end,
+            },
+            headers=admin_headers,
+        )
+
+    params = {"lodging_id": lodging["id"], "sort_by": "start_date",
+              "order": "asc"}
+    response = client.get("/bookings/export", params=params,
+                          headers=admin_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith(
+        "application/x-ndjson"
+    )
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [(row["start_date"], row["end_date"]) for row in rows] == [
+        ("2033-01-01", "2033-01-03"), ("2033-01-05", "2033-01-06")
+    ]
+    assert [row["total_price"] for row in rows] == [100.0, 50.0]
+    assert "T" in rows[0]["created_at"]
+
+    response = client.get("/bookings/export",
+                          params={**params, "format": "csv"},
+                          headers=admin_headers)
+    records = list(csv.DictReader(io.StringIO(response.text)))
+    assert list(records[0]) == list(rows[0])
+    # The same values as the NDJSON export, as text
+    assert records == [
+        {column: "" if value is None else str(value)
+         for column, value in row.items()}
+        for row in rows
+    ]
+
+
+def test_export_bookings_requires_admin():
+    response = client.get("/bookings/export")
+    assert response.status_code == 401
+
+
+def occupancy(lodging_id, headers, start="2033-01-01", end="2033-01-11"):
+    response = client.get(
+        f"/reports/lodgings/{lodging_id}",
+        params={"start_date": start, "end_date": end},
+        headers=headers,
+    )
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_occupancy_follows_booking_changes(admin_headers, create_lodging):
+    """The daily aggregates track create, update, status and delete"""
+    location = "Stats Town, ND"
+    lodging = create_lodging(location=location,
+                             price_per_night=100.0)
+
+    booking = client.post(
+        "/bookings/",
+        json={"lodging_id": lodging["id"],
+              "start_date": "2033-01-02", "end_date": "2033-01-05"},
+        headers=admin_headers,
+    ).json()
+    report = occupancy(lodging["id"], admin_headers)
+    assert report["occupied_nights"] == 3
+    assert report["nights"] == 10
+    assert report["occupancy_rate"] == 0.3
+    assert report["revenue"] == 300.0
+    assert [day["day"] for day in report["daily"]] == [
+        "2033-01-02", "2033-01-03", "2033-01-04"
+    ]
+
+    # Moving the booking moves its nights
+    client.put(
+        f"/bookings/{booking['id']}",
+        json={"lodging_id": lodging["id"],
+              "start_date": "2033-01-09", "end_date": "2033-01-13"},
+        headers=admin_headers,
+    )
+    report = occupancy(lodging["id"], admin_headers)
+    assert [day["day"] for day in report["daily"]] == [
+        "2033-01-09", "2033-01-10"
+    ]
+    assert report["revenue"] == 200.0
+
+    cancel = client.patch(f"/bookings/{booking['id']}/status",
+                          json={"status": "canceled"}, headers=admin_headers)
+    assert cancel.status_code == 200, cancel.text
+    assert occupancy(lodging["id"], admin_headers)["occupied_nights"] == 0
+
+    client.patch(f"/bookings/{booking['id']}/status",
+                 json={"status": "confirmed"}, headers=admin_headers)
+    by_location = client.get(
+        "/reports/locations",
+        params={"location": location, "start_date": "2033-01-01",
+                "end_date": "2033-01-11"},
+        headers=admin_headers,
+    ).json()
+    assert by_location["occupied_nights"] >= 2
+    assert by_location["lodgings"] >= 1
+
+    client.delete(f"/bookings/{booking['id']}", headers=admin_headers)
+    assert occupancy(lodging["id"], admin_headers)["occupied_nights"] == 0
+
+
+def test_occupancy_includes_batch_bookings(admin_headers, create_lodging):
+    lodging = create_lodging()
+    response = client.post(
+        "/bookings/batch",
+        json={"bookings": [
+            {"lodging_id": lodging["id"],
+             "start_date": "2033-01-01", "end_date": "2033-01-03"},
+            {"lodging_id": lodging["id"],
+             "start_date": "2033-01-05", "end_date": "2033-01-06"},
+        ]},
+        headers=admin_headers,
+    )
+    assert response.status_code == 201, response.text
+    report = occupancy(lodging["id"], admin_headers)
+    assert report["occupied_nights"] == 3
+    assert report["revenue"] == 300.0
+
+
+def test_expand_embeds_related_summaries(admin_headers, create_lodging):
+    """?expand= embeds lodging/user summaries without extra requests"""
+    lodging = create_lodging(name="Expand Camp")
+    booking = client.post(
+        "/bookings/",
+        json={"lodging_id": lodging["id"],
+              "start_date": "2034-02-01", "end_date": "2034-02-03"},
+        headers=admin_headers,
+    ).json()
+
+    plain = client.get(f"/bookings/{booking['id']}").json()
+    assert "lodging" not in plain and "user" not in plain
+
+    expanded = client.get(
+        f"/bookings/{booking['id']}", params={"expand": "lodging,user"},
+        headers=admin_headers,
+    ).json()
+    assert expanded["lodging"] == {
+        "id": lodging["id"], "name": "Expand Camp",
+        "location": lodging["location"], "price_per_night": 100.0,
+    }
+    assert expanded["user"]["email"] == "admin@example.com"
+
+    page = client.get(
+        "/bookings/",
+        params={"lodging_id": lodging["id"], "expand": "lodging"},
+    ).json()
+    assert page[0]["lodging"]["name"] == "Expand Camp"
+    assert "user" not in page[0]
+
+
+def test_expand_user_requires_login(admin_headers, create_lodging):
+    """Embedded users (email, role) are only shown to their owner/admins"""
+    lodging = create_lodging()
+    booking = client.post(
+        "/bookings/",
+        json={"lodging_id": lodging["id"],
+              "start_date": "2034-08-01", "end_date": "2034-08-03"},
+        headers=admin_headers,
+    ).json()
+
+    for url in ("/bookings/", f"/bookings/{booking['id']}"):
+        response = client.get(url, params={"expand": "user"})
+        assert response.status_code == 401
+
+    email = f"expand-{uuid.uuid4().hex}@example.com"
+    client.post("/auth/signup", json={"email": email,
+                                      "password": "testpassword"})
+    token = client.post(
+        "/auth/login", data={"username": email, "password": "testpassword"}
+    ).json()["access_token"]
+    user_headers = {"Authorization": f"Bearer {token}"}
+
+    # Someone else's booking is out of reach, alone or in the list
+    response = client.get(f"/bookings/{booking['id']}",
+                          params={"expand": "user"}, headers=user_headers)
+    assert response.status_code == 404
+    response = client.get("/bookings/", params={"expand": "user"},
+                          headers=user_headers)
+    assert response.status_code == 200
+    assert response.json() == []
+    response = client.get(
+        "/bookings/", params={"expand": "user", "user_id": booking["user_id"]},
+        headers=user_headers,
+    )
+    assert response.status_code == 403
+
+
+def test_expand_rejects_unknown_fields():
+    response = client.get("/bookings/", params={"expand": "lodging,payments"})
+    assert response.status_code == 400
+    assert "payments" in response.json()["detail"]
+
+
+def test_fields_narrow_booking_responses(admin_headers, create_lodging):
+    lodging = create_lodging()
+    booking = client.post(
+        "/bookings/",
+        json={"lodging_id": lodging["id"],
+              "start_date": "2034-03-01", "end_date": "2034-03-04"},
+        headers=admin_headers,
+    ).json()
+
+    detail = client.get(f"/bookings/{booking['id']}",
+                        params={"fields": "start_date,end_date"})
+    assert detail.json() == {"start_date": "2034-03-01",
+                             "end_date": "2034-03-04"}
+
+    page = client.get(
+        "/bookings/",
+        params={"lodging_id": lodging["id"], "fields": "id",
+                "expand": "lodging"},
+    ).json()
+    assert page == [{"id": booking["id"], "lodging": {
+        "id": lodging["id"], "name": "Test Camp",
+        "location": lodging["location"], "price_per_night": 100.0,
+    }}]
+
+
+def test_lodgings_free_between_dates(admin_headers, create_lodging):
+    """check_in/check_out drop lodgings with overlapping active bookings"""
+    location = f"Stay Town {uuid.uuid4().hex}"
+    booked, canceled, free = (
+        create_lodging(location=location) for _ in range(3)
+    )
+
+    def book(lodging, start, end):
+        response = client.post("/bookings/", json={
+            "lodging_id": lodging["id"], "start_date": start,
+            "end_date": end,
+        }, headers=admin_headers)
+        assert response.status_code == 201, response.text
+        return response.json()
+
+    # An older stay, then one overlapping the search
+    book(booked, "2034-02-01", "2034-02-10")
+    book(booked, "2034-03-10", "2034-03-20")
+    # A stay ending on the check-in day doesn't block it
+    book(free, "2034-02-25", "2034-03-03")
+    stay = book(canceled, "2034-03-05", "2034-03-08")
+    client.patch(f"/bookings/{stay['id']}/status",
+                 json={"status": "canceled"}, headers=admin_headers)
+
+    params = {"location": location, "check_in": "2034-03-03",
+              "check_out": "2034-03-17", "sort_by": "id", "order": "asc"}
+    response = client.get("/lodgings/", params=params)
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json()] == [
+        canceled["id"], free["id"]
+    ]
+
+    # A new booking changes the filtered list, and its ETag
+    etag = response.headers["ETag"]
+    book(free, "2034-03-16", "2034-03-18")
+    response = client.get("/lodgings/", params=params,
+                          headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json()] == [canceled["id"]]
+
+
+def test_lodgings_free_between_validation():
+    for params in (
+        {"check_in": "2034-03-03"},
+        {"check_in": "2034-03-03", "check_out": "2034-03-03"},
+    ):
+        assert client.get("/lodgings/", params=params).status_code == 400
+
+
+def calendar(lodging_id, **params):
+    response = client.get(f"/lodgings/{lodging_id}/calendar",
+                          params=params)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_calendar_follows_booking_changes(admin_headers, create_lodging):
+    """The bitmap tracks create, move, cancel, reinstate and delete"""
+    lodging = create_lodging()
+
+    # Across new year: nights in both 2035 and 2036
+    booking = client.post("/bookings/", json={
+        "lodging_id": lodging["id"],
+        "start_date": "2035-12-30", "end_date": "2036-01-02",
+    }, headers=admin_headers).json()
+    december = calendar(lodging["id"], year=2035, month=12)
+    assert december["start_date"] == "2035-12-01"
+    assert december["end_date"] == "2036-01-01"
+    assert december["nights"] == "0" * 29 + "11"
+    assert december["booked"] == [
+        {"start_date": "2035-12-30", "end_date": "2036-01-01"}
+    ]
+    year = calendar(lodging["id"], year=2036)
+    assert len(year["nights"]) == 366
+    assert year["booked_nights"] == 1
+    assert year["free_nights"] == 365
+
+    client.put(f"/bookings/{booking['id']}", json={
+        "lodging_id": lodging["id"],
+        "start_date": "2036-02-27", "end_date": "2036-03-02",
+    }, headers=admin_headers)
+    assert calendar(lodging["id"], year=2035)["booked_nights"] == 0
+    assert calendar(lodging["id"], year=2036)["booked"] == [
+        {"start_date": "2036-02-27", "end_date": "2036-03-02"}
+    ]
+    # Leap day included
+    assert calendar(lodging["id"], year=2036, month=2)["nights"].endswith(
+        "111"
+    )
+
+    client.patch(f"/bookings/{booking['id']}/status",
+                 json={"status": "canceled"}, headers=admin_headers)
+    assert calendar(lodging["id"], year=2036)["booked"] == []
+    client.patch(f"/bookings/{booking['id']}/status",
+                 json={"status": "confirmed"}, headers=admin_headers)
+    assert calendar(lodging["id"], year=2036)["booked_nights"] == 4
+
+    client.delete(f"/bookings/{booking['id']}", headers=admin_headers)
+    assert calendar(lodging["id"], year=2036)["booked_nights"] == 0
+
+
+def test_calendar_validation():
+    assert client.get("/lodgings/999999/calendar",
+                      params={"year": 2035}).status_code == 404
+    assert client.get("/lodgings/1/calendar",
+                      params={"year": 2035, "month": 13}).status_code == 422
+
+
+def test_find_overlapping_bookings(create_lodging):
+    """Legacy overlaps (written without the check) are reported"""
+    from datetime import datetime
+    from backend.availability import find_overlapping_bookings
+    from backend.database import SessionLocal
+    from backend.models import Booking
+
+    lodging = create_lodging()
+    db = SessionLocal()
+    try:
+        stays = [
+            Booking(lodging_id=lodging["id"], user_id=1,
+                    start_date=datetime(2035, 1, start),
+                    end_date=datetime(2035, 1, end), total_price=0,
+                    status=status)
+            for start, end, status in (
+                (1, 20, "confirmed"),
+                # Inside the first one, not just its neighbour
+                (5, 6, "confirmed"),
+                (20, 25, "pending"),
+                (21, 22, "canceled"),
+            )
+        ]
+        db.add_all(stays)
+        db.commit()
+        overlaps = [
+            overlap for overlap in find_overlapping_bookings(db, limit=1000)
+            if overlap[0] == lodging["id"]
+        ]
+        assert overlaps == [(lodging["id"], stays[1].id)]
+    finally:
+        db.close()
@@ -0,0 +1,153 @@
+import asyncio
+import uuid
+
+import httpx
+from fastapi.testclient import TestClient
+from backend.database import SessionLocal
+from backend.main import app
+from backend.models import Booking, IdempotencyKey
+from backend.idempotency import response_cache
+
+client = TestClient(app)
+
+
+def keyed(headers, key):
+    return {**headers, "Idempotency-Key": key}
+
+
+def lodging_payload(name="Retry Camp"):
+    return {"name": name, "location": "Minot, ND", "price_per_night": 90.0,
+            "availability": True, "description": "Crew housing"}
+
+
+def count_bookings(lodging_id):
+    db = SessionLocal()
+    try:
+        return db.query(Booking).filter(
+            Booking.lodging_id == lodging_id
+        ).count()
+    finally:
+        db.close()
+
+
+def test_retried_create_is_replayed(admin_headers, create_lodging):
+    """A retry with the same key gets the first response, no new row"""
+    headers = keyed(admin_headers, str(uuid.uuid4()))
+    lodging = create_lodging()
+    payload = {"lodging_id": lodging["id"], "start_date": "2034-05-01",
+               "end_date": "2034-05-04"}
+
+    first = client.post("/bookings/", json=payload, headers=headers)
+    assert first.status_code == 201, first.text
+    assert "idempotent-replayed" not in first.headers
+
+    again = client.post("/bookings/", json=payload, headers=headers)
+    assert again.status_code == 201
+    assert again.headers["idempotent-replayed"] == "true"
+    assert again.json() == first.json()
+
+    # From the table once the in-memory copy is gone
+    response_cache.clear()
+    again = client.post("/bookings/", json=payload, headers=headers)
+    assert again.status_code == 201
+    assert again.json() == first.json()
+    assert count_bookings(lodging["id"]) == 1
+
+    # Without a key, the same body is a new request (and overlaps)
+    assert client.post("/bookings/", json=payload,
+                       headers=admin_headers).status_code == 409
+
+
+def test_replay_skips_validation(admin_headers):
+    """Stored responses are served before the body is looked at"""
+    headers = keyed(admin_headers, str(uuid.uuid4()))
+    first = client.post("/lodgings/", content=b"{}", headers={
+        **headers, "Content-Type": "application/json",
+    })
+    # Invalid, so nothing was stored and the key is free again
+    assert first.status_code == 422
+    assert "idempotent-replayed" not in first.headers
+
+    lodging = client.post("/lodgings/", json=lodging_payload("Key Camp"),
+                          headers=headers)
+    assert lodging.status_code == 201, lodging.text
+
+    # The key now holds that response; a different body can't reuse it
+    reused = client.post("/lodgings/", json={"name": "Other"},
+                         headers=headers)
+    assert reused.status_code == 422
+    assert "different request" in reused.json()["detail"]
+
+
+def test_keys_are_scoped_per_route(admin_headers):
+    key = str(uuid.uuid4())
+    lodging = client.post("/lodgings/", json=lodging_payload("Scoped Camp"),
+                          headers=keyed(admin_headers, key))
+    assert lodging.status_code == 201
+    booking = client.post("/bookings/", json={
+        "lodging_id": lodging.json()["id"], "start_date": "2034-06-01",
+        "end_date": "2034-06-02",
+    }, headers=keyed(admin_headers, key))
+    assert booking.status_code == 201
+    assert "idempotent-replayed" not in booking.headers
+
+
+def test_key_validation(admin_headers):
+    response = client.post("/bookings/", json={},
+                           headers=keyed(admin_headers, "x" * 256))
+    assert response.status_code == 400
+
+
+def test_concurrent_duplicates_are_coalesced(admin_headers, create_lodging):
+    """Duplicates racing the first request get its response"""
+    key = str(uuid.uuid4())
+    headers = keyed(admin_headers, key)
+    lodging = create_lodging()
+    payload = {"lodging_id": lodging["id"], "start_date": "2034-07-01",
+               "end_date": "2034-07-08"}
+
+    async def send_all():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport,
+                                     base_url="http://test") as http:
+            return await asyncio.gather(*(
+                http.post("/bookings/", json=payload, headers=headers)
+                for _ in range(8)
+            ))
+
+    responses = asyncio.run(send_all())
+    assert {response.status_code for response in responses} == {201}
+    assert len({response.json()["id"] for response in responses}) == 1
+    assert sum("idempotent-replayed" in response.headers
+               for response in responses) == 7
+    assert count_bookings(lodging["id"]) == 1
+
+    # The claim row now holds the response
+    db = SessionLocal()
+    try:
+        assert not db.query(IdempotencyKey).filter(
+            IdempotencyKey.status_code.is_(None)
+        ).count()
+    finally:
+        db.close()
+
+
+def test_concurrent_duplicates_of_a_failure_run_again(admin_headers):
+    """A failed first request isn't replayed to the duplicates waiting"""
+    headers = keyed(admin_headers, str(uuid.uuid4()))
+    payload = {"lodging_id": 999999999, "start_date": "2034-07-01",
+               "end_date": "2034-07-08"}
+
+    async def send_all():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport,
+                                     base_url="http://test") as http:
+            return await asyncio.gather(*(
+                http.post("/bookings/", json=payload, headers=headers)
+                for _ in range(4)
+            ))
+
+    responses = asyncio.run(send_all())
+    assert {response.status_code for response in responses} == {404}
+    assert not any("idempotent-replayed" in response.headers
+                   for response in responses)
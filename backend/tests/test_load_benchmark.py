@@ -0,0 +1,47 @@
+import json
+import os
+import subprocess
+import sys
+
+from backend.benchmarks.load import compare, percentile
+
+
+def test_load_benchmark_reports_every_route(tmp_path):
+    """A tiny run end to end, in its own process and scratch database"""
+    env = {key: value for key, value in os.environ.items()
+           if key != "DATABASE_URL"}
+    baseline = tmp_path / "baseline.json"
+    command = [
+        sys.executable, "-m", "backend.benchmarks.load",
+        "--lodgings", "20", "--bookings", "50", "--users", "5",
+        "--requests", "8", "--concurrency", "4",
+        "--route", "GET /lodgings/", "--route", "POST /bookings/",
+    ]
+    first = subprocess.run(command + ["--save-baseline", str(baseline)],
+                           capture_output=True, text=True, env=env)
+    assert first.returncode == 0, first.stderr
+    report = json.loads(first.stdout)
+    assert set(report["routes"]) == {"GET /lodgings/", "POST /bookings/"}
+    lodgings = report["routes"]["GET /lodgings/"]
+    assert lodgings["requests"] == 8
+    assert lodgings["status_codes"] == {"200": 8}
+    assert lodgings["p50_ms"] <= lodgings["p95_ms"] <= lodgings["p99_ms"]
+
+    # Compared against itself with a generous tolerance: no regression
+    second = subprocess.run(
+        command + ["--baseline", str(baseline), "--tolerance", "100"],
+        capture_output=True, text=True, env=env,
+    )
+    assert second.returncode == 0, second.stderr
+    assert json.loads(second.stdout)["regressions"] == []
+
+
+def test_compare_flags_slower_routes():
+    route = {"p95_ms": 10.0, "throughput_rps": 100.0}
+    baseline = {"routes": {"GET /": route}}
+    slower = {"routes": {"GET /": {"p95_ms": 13.0, "throughput_rps": 70.0}}}
+    assert [r["metric"] for r in compare(slower, baseline, 0.2)] == [
+        "p95_ms", "throughput_rps"
+    ]
+    assert compare(baseline, baseline, 0.2) == []
+    assert percentile([1.0, 2.0, 3.0, 4.0], 50) == 2.0
@@ -0,0 +1,432 @@
+import json
+import uuid
+
+from fastapi.testclient import TestClient
+from backend.main import app
+
+client = TestClient(app)
+
+
+def test_cursor_pagination_walks_every_row_once(create_lodging):
+    """Keyset pages cover the result set without gaps or duplicates"""
+    location = f"Cursor Town {uuid.uuid4().hex}"
+    created = [
+        create_lodging(location=location, price_per_night=price)
+        for price in (80.0, 90.0, 90.0, 90.0, 120.0)
+    ]
+
+    seen = []
+    params = {
+        "location": location,
+        "sort_by": "price_per_night",
+        "order": "asc",
+        "limit": 2,
+    }
+    while True:
+        response = client.get("/lodgings/", params=params)
+        assert response.status_code == 200
+        seen.extend(item["id"] for item in response.json())
+        next_cursor = response.headers.get("X-Next-Cursor")
+        if not next_cursor:
+            break
+        params["cursor"] = next_cursor
+
+    assert seen == [lodging["id"] for lodging in created]
+
+
+def test_cursor_must_match_sort():
+    response = client.get("/lodgings/", params={"limit": 1})
+    next_cursor = response.headers.get("X-Next-Cursor")
+    assert next_cursor
+
+    response = client.get(
+        "/lodgings/",
+        params={"cursor": next_cursor, "sort_by": "price_per_night"},
+    )
+    assert response.status_code == 400
+
+    response = client.get("/lodgings/", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+
+def test_cursor_values_are_type_checked():
+    """Decodable cursors with values the sort can't use are a 400"""
+    from backend.pagination import encode_cursor
+
+    for sort_by, value, row_id in (
+        ("created_at", 20310102, 1),
+        ("created_at", "yesterday", 1),
+        ("price_per_night", "cheap", 1),
+        ("price_per_night", True, 1),
+        ("price_per_night", 90.0, "1"),
+    ):
+        cursor = encode_cursor(sort_by, "desc", value, row_id)
+        response = client.get(
+            "/lodgings/", params={"cursor": cursor, "sort_by": sort_by}
+        )
+        assert response.status_code == 400, (sort_by, value, row_id)
+
+    cursor = encode_cursor("price_per_night", "desc", 90, 1)
+    response = client.get(
+        "/lodgings/", params={"cursor": cursor, "sort_by": "price_per_night"}
+    )
+    assert response.status_code == 200
+
+
+def test_limit_bounds(create_lodging):
+    """limit=0 is an empty page, a negative limit a 422"""
+    create_lodging()
+    for path in ("/lodgings/", "/bookings/"):
+        response = client.get(path, params={"limit": 0})
+        assert response.status_code == 200
+        assert response.json() == []
+        assert "X-Next-Cursor" not in response.headers
+        assert client.get(path, params={"limit": -1}).status_code == 422
+
+
+def test_location_search_is_typo_tolerant(create_lodging):
+    """Location search matches substrings and near-miss spellings"""
+    lodging = create_lodging(location="Quillamook Basin, WY")
+
+    def search(term):
+        response = client.get(
+            "/lodgings/",
+            params={"location": term, "sort_by": "relevance", "limit": 100},
+        )
+        assert response.status_code == 200
+        return [item["id"] for item in response.json()]
+
+    assert lodging["id"] in search("amook bas")
+    assert lodging["id"] in search("quilamook")
+    assert lodging["id"] not in search("Zzyzx Springs")
+
+
+def test_location_search_follows_updates(admin_headers, create_lodging):
+    lodging = create_lodging(location="Old Ferrovale Yard")
+
+    response = client.put(
+        f"/lodgings/{lodging['id']}",
+        json={"location": "Brandnew Kettering Flats"},
+        headers=admin_headers,
+    )
+    assert response.status_code == 200
+
+    response = client.get("/lodgings/", params={"location": "Ferrovale"})
+    assert lodging["id"] not in [item["id"] for item in response.json()]
+    response = client.get("/lodgings/", params={"location": "Kettering"})
+    assert lodging["id"] in [item["id"] for item in response.json()]
+
+
+def test_bulk_import_ndjson_reports_bad_rows(admin_headers):
+    """NDJSON import inserts valid rows and reports the rest by row"""
+    location = f"Import Ridge {uuid.uuid4().hex}"
+    rows = [
+        {"name": "A", "location": location, "price_per_night": 70,
+         "availability": True, "description": "first"},
+        {"name": "B", "location": location, "price_per_night": "cheap",
+         "availability": True, "description": "bad price"},
+        {"name": "C", "location": location, "price_per_night": 90,
+         "availability": False, "description": "third"},
+    ]
+    body = "\n".join(json.dumps(row) for row in rows) + "\n{not json\n"
+
+    response = client.post(
+        "/lodgings/import",
+        params={"chunk_size": 2},
+        content=body,
+        headers={**admin_headers, "Content-Type": "application/x-ndjson"},
+    )
+    assert response.status_code == 200, response.text
+    report = response.json()
+    assert report["inserted"] == 2
+    assert [error["row"] for error in report["errors"]] == [2, 4]
+
+    listed = client.get("/lodgings/", params={"location": location})
+    assert sorted(item["name"] for item in listed.json()) == ["A", "C"]
+
+
+def test_bulk_import_csv(admin_headers):
+    location = f"Csv Flats {uuid.uuid4().hex}"
+    body = (
+        "name,location,price_per_night,availability,description\n"
+        f"North,{location},85.5,true,\"Bunks, kitchen\"\n"
+        f"South,{location},99,false,Trailer\n"
+    )
+    response = client.post(
+        "/lodgings/import",
+        content=body,
+        headers={**admin_headers, "Content-Type": "text/csv"},
+    )
+    assert response.status_code == 200, response.text
+    assert response.json() == {"inserted": 2, "failed": 0, "errors": []}
+
+
+def test_bulk_import_csv_blank_cells(admin_headers):
+    """Blank CSV cells are missing values, not empty strings"""
+    location = f"Blank Flats {uuid.uuid4().hex}"
+    body = (
+        "name,location,price_per_night,availability,description,"
+        "latitude,longitude\n"
+        f"b,{location},5,true,d,,\n"
+        f",{location},5,true,d,,\n"
+    )
+    response = client.post(
+        "/lodgings/import",
+        content=body,
+        headers={**admin_headers, "Content-Type": "text/csv"},
+    )
+    assert response.status_code == 200, response.text
+    report = response.json()
+    assert report["inserted"] == 1
+    assert report["errors"] == [
+        {"row": 2, "errors": ["name: Input should be a valid string"]}
+    ]
+    listed = client.get("/lodgings/", params={"location": location})
+    assert [(item["name"], item["latitude"]) for item in listed.json()] == [
+        ("b", None)
+    ]
+
+
+def test_copy_values_keep_empty_strings():
+    """COPY input tells NULL apart from "" (and from a literal \\N)"""
+    from backend.bulk_import import COPY_NULL, _copy_value
+
+    assert _copy_value(None) == COPY_NULL
+    assert _copy_value("") == '""'
+    assert _copy_value("\\N") == '"\\N"'
+    assert _copy_value('say "hi"') == '"say ""hi"""'
+    assert _copy_value(2.5) == "2.5"
+
+
+def test_bulk_import_requires_admin():
+    response = client.post("/lodgings/import", content="{}")
+    assert response.status_code == 401
+
+
+def test_get_lodging_conditional_get(admin_headers, create_lodging):
+    """A matching If-None-Match gets a 304 until the lodging changes"""
+    lodging = create_lodging()
+    url = f"/lodgings/{lodging['id']}"
+
+    first = client.get(url)
+    etag = first.headers["ETag"]
+    assert etag.startswith('"')
+
+    cached = client.get(url, headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.headers["ETag"] == etag
+    assert cached.content == b""
+
+    client.put(url, json={"price_per_night": 150.0}, headers=admin_headers)
+    changed = client.get(url, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert changed.json()["price_per_night"] == 150.0
+
+
+def test_list_lodgings_conditional_get(admin_headers, create_lodging):
+    """List ETags change whenever a row of the page does"""
+    location = f"ETag Town {uuid.uuid4().hex}"
+    url = f"/lodgings/?location={location}"
+
+    etag = client.get(url).headers["ETag"]
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+    # Different query, different representation
+    assert client.get(url + "&limit=1").headers["ETag"] != etag
+
+    lodging = create_lodging(location=location)
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 200
+    etag = client.get(url).headers["ETag"]
+
+    # Writes to lodgings off the page leave it alone
+    create_lodging()
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+    client.put(f"/lodgings/{lodging['id']}", json={"price_per_night": 120},
+               headers=admin_headers)
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 200
+    etag = client.get(url).headers["ETag"]
+
+    client.delete(f"/lodgings/{lodging['id']}", headers=admin_headers)
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_fields_narrow_lodging_responses(create_lodging):
+    """?fields= returns only the requested fields, list and detail"""
+    location = f"Fields Town {uuid.uuid4().hex}"
+    lodging = create_lodging(location=location)
+    wanted = "id,name,location,price_per_night"
+
+    page = client.get("/lodgings/", params={"location": location,
+                                            "fields": wanted})
+    assert page.status_code == 200, page.text
+    assert page.json() == [{
+        "id": lodging["id"], "name": "Test Camp", "location": location,
+        "price_per_night": 100.0,
+    }]
+
+    detail = client.get(f"/lodgings/{lodging['id']}",
+                        params={"fields": "name,updated_at"})
+    assert detail.json() == {"name": "Test Camp",
+                             "updated_at": lodging["updated_at"]}
+    # A fieldset is a separate representation
+    assert detail.headers["ETag"] != client.get(
+        f"/lodgings/{lodging['id']}").headers["ETag"]
+
+
+def test_fields_skip_unselected_columns():
+    """The SELECT itself leaves out columns that weren't asked for"""
+    from sqlalchemy import event
+    from backend.database import async_engine, engine
+
+    target = async_engine.sync_engine if async_engine else engine
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(target, "before_cursor_execute", record)
+    try:
+        client.get("/lodgings/", params={"fields": "id,name"})
+    finally:
+        event.remove(target, "before_cursor_execute", record)
+    page_query = [sql for sql in statements if "FROM lodgings" in sql][-1]
+    assert "lodgings.name" in page_query
+    assert "lodgings.description" not in page_query
+
+
+def test_fields_rejects_unknown_fields():
+    response = client.get("/lodgings/", params={"fields": "id,secret"})
+    assert response.status_code == 400
+    assert "secret" in response.json()["detail"]
+
+
+def test_radius_search_sorted_by_distance(create_lodging):
+    location = f"Geo Town {uuid.uuid4().hex}"
+    # A job site near Watford City, ND, and camps 5, 20, 60 km north
+    site = (47.80, -103.28)
+    far, near, middle = (
+        create_lodging(location=location,
+                       latitude=site[0] + km / 111.2, longitude=site[1],
+                       price_per_night=price)
+        for km, price in ((60, 90.0), (5, 150.0), (20, 110.0))
+    )
+    create_lodging(location=location)  # no coordinates
+
+    params = {"location": location, "near_lat": site[0],
+              "near_lon": site[1], "radius_km": 30}
+    response = client.get("/lodgings/", params=params)
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json()] == [
+        near["id"], middle["id"]
+    ]
+
+    # Combined with the price filter and sorted by price instead
+    response = client.get("/lodgings/", params={
+        **params, "radius_km": 100, "max_price": 120,
+        "sort_by": "price_per_night", "order": "asc",
+    })
+    assert [item["id"] for item in response.json()] == [
+        far["id"], middle["id"]
+    ]
+
+
+def test_nearest_search_and_moves(admin_headers, create_lodging):
+    location = f"Geo Town {uuid.uuid4().hex}"
+    # Near the antimeridian: the closest camp is across it
+    site = (-16.5, 179.6)
+    camps = [
+        create_lodging(location=location, latitude=site[0],
+                       longitude=longitude)
+        for longitude in (-179.9, 176.6, 167.6)
+    ]
+    params = {"location": location, "near_lat": site[0],
+              "near_lon": site[1], "limit": 2}
+    response = client.get("/lodgings/", params=params)
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json()] == [
+        camps[0]["id"], camps[1]["id"]
+    ]
+
+    # Moving a camp moves it in the results (its geohash follows)
+    response = client.put(f"/lodgings/{camps[2]['id']}", json={
+        "longitude": 179.5,
+    }, headers=admin_headers)
+    assert response.json()["longitude"] == 179.5
+    response = client.get("/lodgings/", params=params)
+    assert [item["id"] for item in response.json()] == [
+        camps[2]["id"], camps[0]["id"]
+    ]
+
+
+def test_geo_search_validation():
+    for params in (
+        {"near_lat": 47.8},
+        {"radius_km": 10},
+        {"sort_by": "distance"},
+        {"near_lat": 47.8, "near_lon": -103.3, "sort_by": "price_per_night"},
+    ):
+        response = client.get("/lodgings/", params=params)
+        assert response.status_code == 400, params
+    assert client.get("/lodgings/", params={
+        "near_lat": 91, "near_lon": 0,
+    }).status_code == 422
+
+
+def test_facets_count_the_whole_result_set(create_lodging):
+    town = uuid.uuid4().hex
+    for location, price, available in (
+        (f"Facet North {town}", 45.0, True),
+        (f"Facet North {town}", 120.0, False),
+        (f"Facet South {town}", 125.0, True),
+        (f"Facet South {town}", 320.0, True),
+        (f"Facet South {town}", 99.0, True),
+    ):
+        create_lodging(location=location, price_per_night=price,
+                       availability=available)
+
+    params = {"location": town, "limit": 2,
+              "facets": "location,price,availability"}
+    response = client.get("/lodgings/", params=params)
+    assert response.status_code == 200
+    body = response.json()
+    assert len(body["results"]) == 2
+    assert body["total"] == 5
+    assert body["total_is_estimate"] is False
+    assert body["facets"]["location"] == [
+        {"value": f"Facet South {town}", "count": 3},
+        {"value": f"Facet North {town}", "count": 2},
+    ]
+    assert [bucket["count"] for bucket in body["facets"]["price"]] == [
+        1, 1, 2, 0, 0, 1
+    ]
+    assert body["facets"]["price"][-1] == {"min": 300, "max": None,
+                                           "count": 1}
+    assert body["facets"]["availability"] == [
+        {"value": True, "count": 4}, {"value": False, "count": 1},
+    ]
+
+    # Facets follow the filters, approximate mode is exact on small sets,
+    # and a write invalidates the cached counts
+    response = client.get("/lodgings/", params={
+        **params, "facets": "availability", "min_price": 100,
+        "count": "approximate",
+    })
+    assert response.json()["total"] == 3
+    assert response.json()["total_is_estimate"] is False
+    create_lodging(location=f"Facet North {town}",
+                   price_per_night=150.0)
+    response = client.get("/lodgings/", params={
+        **params, "facets": "availability", "min_price": 100,
+        "count": "approximate",
+    })
+    assert response.json()["total"] == 4
+    assert "location" not in response.json()["facets"]
+
+
+def test_facets_rejects_unknown_names():
+    response = client.get("/lodgings/", params={"facets": "colour"})
+    assert response.status_code == 400
+    assert client.get("/lodgings/", params={
+        "facets": "price", "count": "roughly",
+    }).status_code == 422
@@ -0,0 +1,65 @@
+from fastapi.testclient import TestClient
+
+from backend.main import app
+from backend.metrics import registry
+
+client = TestClient(app)
+
+ROUTE = "/lodgings/{lodging_id}"
+
+
+def statements(method, route):
+    histogram = registry.queries.get((method, route))
+    return (histogram.sum, sum(histogram.counts)) if histogram else (0, 0)
+
+
+def test_metrics_endpoint_reports_routes():
+    client.get("/lodgings/")
+    client.get("/no-such-route")
+    body = client.get("/metrics").text
+
+    assert ('http_requests_total{method="GET",route="/lodgings/",'
+            'status="200"}') in body
+    assert 'route="<unmatched>",status="404"' in body
+    assert ('http_request_duration_seconds_count'
+            '{method="GET",route="/lodgings/"}') in body
+    assert 'db_statements_per_request_sum{method="GET",route="/lodgings/"}' \
+        in body
+    assert "http_requests_in_flight 1" in body
+
+
+def test_update_lodging_statement_count(admin_headers):
+    """SELECT and UPDATE (RETURNING updated_at); no second SELECT"""
+    lodging = client.post("/lodgings/", json={
+        "name": "Metrics Camp", "location": "Minot, ND",
+        "price_per_night": 90.0, "availability": True,
+        "description": "Crew housing",
+    }, headers=admin_headers).json()
+    url = f"/lodgings/{lodging['id']}"
+    # Warm the user cache so authentication adds no statement
+    client.put(url, json={"price_per_night": 91.0}, headers=admin_headers)
+
+    before_sum, before_count = statements("PUT", ROUTE)
+    response = client.put(url, json={"price_per_night": 92.0},
+                          headers=admin_headers)
+    assert response.json()["price_per_night"] == 92.0
+    after_sum, after_count = statements("PUT", ROUTE)
+
+    assert after_count == before_count + 1
+    assert after_sum - before_sum == 2
+
+
+def test_failed_statements_leave_no_timer_behind():
+    """A statement that raises is dropped from the connection's timers"""
+    from sqlalchemy import text
+    from sqlalchemy.exc import OperationalError, ProgrammingError
+    from backend.database import engine
+
+    with engine.connect() as connection:
+        for _ in range(3):
+            try:
+                connection.execute(text("SELECT * FROM no_such_table"))
+            except (OperationalError, ProgrammingError):
+                connection.rollback()
+        assert connection.execute(text("SELECT 1")).scalar() == 1
+        assert connection.info["query_started"] == {}
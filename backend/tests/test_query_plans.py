@@ -0,0 +1,29 @@
+import pytest
+from sqlalchemy import create_engine, inspect
+
+from backend.benchmarks import query_plans
+
+
+def test_list_queries_use_indexes():
+    """Every get_lodgings / get_bookings access path avoids full scans"""
+    report = query_plans.run(
+        lodgings=2000, bookings=20000, users=100, budget_ms=250, repeats=3
+    )
+    failures = {
+        name: result for name, result in report["results"].items()
+        if not result["ok"]
+    }
+    assert not failures, failures
+
+
+def test_refuses_a_database_with_tables(tmp_path):
+    """A given database is only used, and dropped, while it's empty"""
+    url = f"sqlite:///{tmp_path / 'app.db'}"
+    engine = create_engine(url)
+    with engine.begin() as connection:
+        connection.exec_driver_sql("CREATE TABLE lodgings (id INTEGER)")
+
+    with pytest.raises(ValueError):
+        query_plans.run(url, lodgings=10, bookings=10, users=2, repeats=1)
+    assert inspect(engine).get_table_names() == ["lodgings"]
+    engine.dispose()
@@ -0,0 +1,33 @@
+from datetime import datetime
+
+import orjson
+
+from backend.models import Booking, Lodging
+from backend.schemas import BookingResponse, LodgingResponse
+from backend.serialization import dump_rows
+
+
+def test_trusted_rows_match_validated_rows():
+    """Skipping validation must not change a single byte of output"""
+    stamp = datetime(2031, 5, 6, 7, 8, 9, 123456)
+    lodgings = [
+        Lodging(id=n, name=f"Camp {n}", location="Minot, ND",
+                price_per_night=99.5 + n, availability=bool(n % 2),
+                description="Crew housing", created_at=stamp,
+                updated_at=stamp)
+        for n in range(3)
+    ]
+    bookings = [
+        Booking(id=1, lodging_id=2, user_id=3,
+                check_in_date=datetime(2031, 5, 6),
+                check_out_date=datetime(2031, 5, 9), total_price=300.0)
+    ]
+
+    for rows, schema in ((lodgings, LodgingResponse),
+                         (bookings, BookingResponse)):
+        validated = orjson.dumps(dump_rows(rows, schema, trusted=False))
+        trusted = orjson.dumps(dump_rows(rows, schema, trusted=True))
+        assert trusted == validated
+
+    assert dump_rows(bookings, BookingResponse, trusted=True)[0][
+        "start_date"].isoformat() == "2031-05-06"
@@ -0,0 +1,68 @@
+from fastapi.testclient import TestClient
+
+from backend.database import async_engine, engine
+from backend.main import app
+from backend.slow_queries import redact_parameters, slow_query_log
+
+client = TestClient(app)
+
+# The engine the routes actually run on
+ACTIVE_ENGINE = async_engine.sync_engine if async_engine else engine
+
+
+def test_redact_parameters():
+    assert redact_parameters(("Williston, ND", 20, None)) == [
+        "<str:13>", 20, None,
+    ]
+    assert redact_parameters({"email": "a@b.c"}) == {"email": "<str:5>"}
+
+
+def test_slow_queries_are_recorded_with_route_and_plan(admin_headers):
+    threshold = slow_query_log.threshold_ms
+    slow_query_log.threshold_ms = 0
+    slow_query_log.install(ACTIVE_ENGINE)
+    try:
+        client.delete("/admin/slow-queries", headers=admin_headers)
+        response = client.get("/lodgings/?location=Dickinson")
+        assert response.status_code == 200
+    finally:
+        slow_query_log.uninstall(ACTIVE_ENGINE)
+        slow_query_log.threshold_ms = threshold
+
+    entries = client.get("/admin/slow-queries", headers=admin_headers).json()
+    lodging_reads = [
+        entry for entry in entries
+        if entry["route"] == "GET /lodgings/"
+        and "FROM lodgings" in entry["statement"]
+    ]
+    assert lodging_reads
+    entry = lodging_reads[0]
+    assert "Dickinson" not in str(entry["parameters"])
+    assert entry["plan"] and not entry["plan"][0].startswith("EXPLAIN failed")
+
+    assert client.get("/admin/slow-queries?limit=1",
+                      headers=admin_headers).json() == entries[:1]
+    client.delete("/admin/slow-queries", headers=admin_headers)
+    assert client.get("/admin/slow-queries",
+                      headers=admin_headers).json() == []
+
+
+def test_slow_queries_require_admin():
+    assert client.get("/admin/slow-queries").status_code == 401
+
+
+def test_failed_statements_leave_no_timer_behind():
+    from sqlalchemy import text
+    from sqlalchemy.exc import OperationalError, ProgrammingError
+
+    slow_query_log.install(engine)
+    try:
+        with engine.connect() as connection:
+            try:
+                connection.execute(text("SELECT * FROM no_such_table"))
+            except (OperationalError, ProgrammingError):
+                connection.rollback()
+            connection.execute(text("SELECT 1"))
+            assert connection.info["slow_query_started"] == {}
+    finally:
+        slow_query_log.uninstall(engine)
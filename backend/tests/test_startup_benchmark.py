@@ -0,0 +1,10 @@
+from backend.benchmarks.startup import run
+
+
+def test_startup_opens_no_connection():
+    """Importing and starting the app neither connects nor creates tables"""
+    report = run(runs=1, budget_ms=60000)
+    assert report["connections_opened"] == 0
+    assert report["database_created"] is False
+    assert report["ok"] is True
+    assert report["ready_ms"]["median"] >= report["startup_ms"]["median"]